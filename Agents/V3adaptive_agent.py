@@ -119,10 +119,20 @@
 
 import traci
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 import json
 from traci._trafficlight import Logic, Phase
 import copy
-from Testers.performance_testing_AD import gather_performance_data, initialize_metrics
+from Agents.sensors import TrafficSensors
+from Agents.network_cache import load_network_plan
+from Testers.performance_testing_AD import (
+    flush_metrics,
+    gather_performance_data,
+    initialize_metrics,
+    invalidate_program_logics,
+)
 from Testers.random_scenarios import apply_random_scenarios
 
 # Configuration
@@ -131,8 +141,8 @@ import os
 # Ensure file paths are absolute and robust
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sumoBinary = "sumo-gui"
-sumoConfig = os.path.join(script_dir, "CustomNetworks", "twoLaneMap.sumocfg")
-adaptive_phases_file = os.path.join(script_dir, "adaptive_fixed_phases.json")
+sumoConfig = os.path.join(script_dir, "..", "CustomNetworks", "twoLaneMap.sumocfg")
+adaptive_phases_file = os.path.join(script_dir, "..", "adaptive_fixed_phases.json")
 
 # Ensure adaptive phases file exists
 if not os.path.exists(adaptive_phases_file):
@@ -144,8 +154,11 @@ MAX_GREEN = 45
 QUEUE_THRESHOLD = 3
 STEP_INTERVAL = 3
 
-def get_road_queues(tls_id, step):
+def get_road_queues(tls_id, step, sensors=None):
     """Get queue lengths aggregated by road, and print debug information."""
+    if sensors is not None:
+        return sensors.get_road_queues(tls_id)  # Served from subscriptions
+
     queue_lengths = {}
     tl_lanes = traci.trafficlight.getControlledLanes(tls_id)
     seen_lanes = set()  # Avoid duplicate lane processing
@@ -173,18 +186,6 @@ def get_road_queues(tls_id, step):
 
     return queue_lengths
 
-def get_green_roads(state, tls_id):
-    """Identify which roads have green signal in current state."""
-    green_roads = set()
-    controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
-    
-    for i, signal in enumerate(state):
-        if signal in ['G', 'g']:
-            road_id = controlled_lanes[i].split("_")[0]
-            green_roads.add(road_id)
-    
-    return green_roads
-
 def calculate_adaptive_duration(base_duration, green_roads, queue_lengths):
     """Calculate adaptive duration based on queue ratios."""
     total_queue = sum(queue_lengths.values())
@@ -205,14 +206,14 @@ def calculate_adaptive_duration(base_duration, green_roads, queue_lengths):
 def run_adaptive_agent():
     """Main function to run the adaptive traffic control agent."""
     traci.start([sumoBinary, "-c", sumoConfig])
-    initialize_metrics()
 
-    # Load fixed phase data
-    with open(adaptive_phases_file, "r") as f:
-        fixed_phases = json.load(f)
-    
     # Initialize phase programs for each intersection
     tls_ids = traci.trafficlight.getIDList()
+    # Layout and green roads per phase, cached per network and phases file
+    topology, phase_plan, fixed_phases = load_network_plan(sumoConfig, adaptive_phases_file, tls_ids)
+    sensors = TrafficSensors(topology)
+    sensors.subscribe()
+    initialize_metrics(topology, sensors=sensors)
     current_phases = {}
     for tls_id in tls_ids:
         if tls_id in fixed_phases:
@@ -231,7 +232,7 @@ def run_adaptive_agent():
             if tls_id not in fixed_phases:
                 continue  # Skip TLS IDs without fixed phases
             
-            queue_lengths = get_road_queues(tls_id, step)
+            queue_lengths = get_road_queues(tls_id, step, sensors)
             total_queue = sum(queue_lengths.values())
             
             #print (f"Total Queue for traffic light {tls_id} = {total_queue}")
@@ -239,14 +240,14 @@ def run_adaptive_agent():
             if total_queue > QUEUE_THRESHOLD:
                 # Create adaptive phases
                 adaptive_phases = []
-                for phase in fixed_phases[tls_id]:
-                    state = phase["state"]
-                    base_duration = phase["duration"]
+                for phase in phase_plan[tls_id]:
+                    state = phase.state
+                    base_duration = phase.duration
                     
                     if 'y' in state:  # Yellow phase - keep original duration
                         adaptive_phases.append(Phase(base_duration, state))
                     else:
-                        green_roads = get_green_roads(state, tls_id)
+                        green_roads = phase.green_roads
                         # print(f"Green roads: {green_roads} at {tls_id} using base state {state}")
                         new_duration = calculate_adaptive_duration(
                             base_duration, green_roads, queue_lengths)
@@ -255,6 +256,7 @@ def run_adaptive_agent():
                 # Apply adaptive timing
                 logic = Logic("adaptive_program", 0, 0, adaptive_phases)
                 traci.trafficlight.setProgramLogic(tls_id, logic)
+                invalidate_program_logics(tls_id)
                 gather_performance_data()
 
             else:
@@ -265,7 +267,9 @@ def run_adaptive_agent():
                 ]
                 logic = Logic("fixed_program", 0, 0, fixed_phases_data)
                 traci.trafficlight.setProgramLogic(tls_id, logic)
+                invalidate_program_logics(tls_id)
 
+    flush_metrics()  # Write the final performance reports
     traci.close()
 
 if __name__ == "__main__":
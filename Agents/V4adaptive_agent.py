@@ -9,6 +9,9 @@ import sumolib
 import pandas as pd
 from traci._trafficlight import Logic, Phase
 import copy
+from Agents.sensors import TrafficSensors
+from Agents.traffic_recorder import TrafficRecorder
+from Agents.network_cache import load_network_plan
 
 # Configuration
 import os
@@ -30,11 +33,15 @@ QUEUE_THRESHOLD = 5
 STEP_INTERVAL = 3
 EXTRA_GREEN_TIME = 10
 LESS_RED_TIME = 0.7
-rt_traffic_data = {"avg_speed": [], "queue_length": []}
+rt_traffic_data = TrafficRecorder()  # Per-step queue lengths and edge speeds, stored column-wise
 
 #A function that calculates average speed
-def get_average_speed(edge_id):
+def get_average_speed(edge_id, sensors=None):
     
+    # Serve the reading from subscriptions when a sensor layer is active
+    if sensors is not None:
+        return sensors.get_average_speed(edge_id)
+
     try:
         # Retrieve the average speed of vehicles on the edge
         avg_speed = traci.edge.getLastStepMeanSpeed(edge_id)
@@ -49,8 +56,12 @@ def get_average_speed(edge_id):
         return 0
 
 #A function that collects average queue length
-def get_road_queues(tls_id, step):
+def get_road_queues(tls_id, step, sensors=None):
     
+    # Serve the reading from subscriptions when a sensor layer is active
+    if sensors is not None:
+        return sensors.get_road_queues(tls_id)
+
     queue_lengths = {}
     seen_lanes = set()  # Avoid duplicate lane processing
 
@@ -97,9 +108,13 @@ def get_road_queues(tls_id, step):
     return queue_lengths
 
 
-def get_tls_avg_speed(tls_id):
+def get_tls_avg_speed(tls_id, sensors=None):
     # Calculate the average speed for all roads controlled by the given traffic light system (TLS).
    
+    # Serve the reading from subscriptions when a sensor layer is active
+    if sensors is not None:
+        return sensors.get_tls_avg_speed(tls_id)
+
     controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
     controlled_edges = {lane.split("_")[0] for lane in controlled_lanes}  # Get unique edges
     
@@ -158,14 +173,17 @@ def run_adaptive_agent():
     try:
         traci.start([sumoBinary, "-c", sumoConfig])
 
-        # Load fixed phase data
-        with open(adaptive_phases_file, "r") as f:
-            fixed_phases = json.load(f)
-
         # Initialize phase programs for each intersection
         tls_ids = traci.trafficlight.getIDList()
         
-    
+        # Load the static intersection layout and the fixed phases compiled into per-phase
+        # green-road sets, cached per network and phases file
+        topology, phase_plan, fixed_phases = load_network_plan(sumoConfig, adaptive_phases_file, tls_ids)
+
+        # Subscribe to lane, edge and TLS variables once instead of polling them every step
+        sensors = TrafficSensors(topology, traci.edge.getIDList())
+        sensors.subscribe()
+        
         # Track which phases have been adjusted
         adjusted_phases = {tls_id: None for tls_id in tls_ids}
 
@@ -175,36 +193,27 @@ def run_adaptive_agent():
                 traci.simulationStep()
                 step += 1
 
-                # Data collection for each simulation step
-                step_queue_data = {"step": step, "data": []}
-                step_speed_data = {"step": step, "data": []}
-
                 total_vehicles = traci.vehicle.getIDCount() 
 
                 # Collect queue lengths
                 for tls_id in tls_ids:
-                    if tls_id not in fixed_phases:
+                    if tls_id not in phase_plan:
                         print(f"TLS {tls_id} not found in adaptivePhasesdata.json file.")
                         continue
 
                     try:
-                        queue_lengths = get_road_queues(tls_id, step)
+                        queue_lengths = get_road_queues(tls_id, step, sensors)
                         
                         total_queue = sum(queue_lengths.values())
                         # print (f"Total Queue for traffic light {tls_id} = {total_queue}")
                         
-                        for road_id, queue_length in queue_lengths.items():
-                            step_queue_data["data"].append({
-                                "tls_id": tls_id,
-                                "road_id": road_id,
-                                "queue_length": queue_length,
-                            })
+                        rt_traffic_data.record_queues(step, tls_id, queue_lengths)
                     except Exception as e:
                         print(f"Error collecting queue lengths for TLS {tls_id} at step {step}: {e}")
                         traceback.print_exc()
 
                     # Calculate average speed for this TLS
-                    avg_speed_tls = get_tls_avg_speed(tls_id)
+                    avg_speed_tls = get_tls_avg_speed(tls_id, sensors)
                         
                     
                     # Determine whether to optimize
@@ -213,8 +222,8 @@ def run_adaptive_agent():
                         continue
                     
                     # if total_queue > QUEUE_THRESHOLD:
-                    current_phase_index = traci.trafficlight.getPhase(tls_id)
-                    current_phase_state = fixed_phases[tls_id][current_phase_index]["state"]
+                    current_phase_index = sensors.get_phase(tls_id)
+                    current_phase = phase_plan.get_phase(tls_id, current_phase_index)
                     
                     # Detect phase change and reset adjusted phase
                     if adjusted_phases[tls_id] != current_phase_index:
@@ -225,28 +234,17 @@ def run_adaptive_agent():
                     if adjusted_phases[tls_id] == current_phase_index:
                         continue
 
-                    # Identify green roads in the current phase
-                    green_roads = [
-                        road_id
-                        for road_id, lanes in queue_lengths.items()
-                        if any(
-                            current_phase_state[i] == "G"
-                            for i, lane in enumerate(traci.trafficlight.getControlledLanes(tls_id))
-                            if lane.split("_")[0] == road_id
-                        )
-                    ]
-
                     # If the current green roads have the highest queue, extend the phase duration
                     highest_queue_road = max(queue_lengths, key=queue_lengths.get)
                     # print(f"Road with highest queue length: {highest_queue_road}\n")
                     
-                    if highest_queue_road not in green_roads:  
+                    if highest_queue_road not in current_phase.major_green_roads:  
                         #detract red time for the current phase 
                         new_duration = max(
                             MIN_GREEN,
-                            fixed_phases[tls_id][current_phase_index]["duration"] * LESS_RED_TIME
+                            current_phase.duration * LESS_RED_TIME
                         )
-                        detractedTime = fixed_phases[tls_id][current_phase_index]["duration"] - new_duration
+                        detractedTime = current_phase.duration - new_duration
                         if detractedTime:
                             print(f"Detracting red phase for TLS {tls_id} by {detractedTime} seconds due to the highest queue road {highest_queue_road} at sim step {step}\n")
                             traci.trafficlight.setPhaseDuration(tls_id, new_duration)
@@ -256,7 +254,7 @@ def run_adaptive_agent():
                         # Extend the green light for the current phase
                         new_duration = min(
                             MAX_GREEN,
-                            fixed_phases[tls_id][current_phase_index]["duration"] + EXTRA_GREEN_TIME
+                            current_phase.duration + EXTRA_GREEN_TIME
                         )
                         print(f"Extending green phase for TLS {tls_id} by {EXTRA_GREEN_TIME} seconds. for the highest queue road {highest_queue_road} at sim step {step}\n")
                         traci.trafficlight.setPhaseDuration(tls_id, new_duration)
@@ -269,23 +267,15 @@ def run_adaptive_agent():
                                 
                 # Collect average speed for edges
                 try:
-                    edge_ids = traci.edge.getIDList()
-                    for edge_id in edge_ids:
-                        step_speed_data["data"].append({
-                            "edge_id": edge_id,
-                            "avg_speed": get_average_speed(edge_id),
-                        })
+                    rt_traffic_data.record_speeds(
+                        step,
+                        sensors.edge_ids,
+                        [get_average_speed(edge_id, sensors) for edge_id in sensors.edge_ids],
+                    )
                 except Exception as e:
                     print(f"Error collecting average speed at step {step}: {e}")
                     traceback.print_exc()
 
-                # Append step data to traffic data dictionaries
-                rt_traffic_data["queue_length"].append(step_queue_data)
-                rt_traffic_data["avg_speed"].append(step_speed_data)
-
-                # Debug: Print to confirm data is appended
-                # print(f"Appended to rt_traffic_data['queue_length']: {step_queue_data}")
-                # print(f"Appended to rt_traffic_data['avg_speed']: {step_speed_data}")
 
             except Exception as e:
                 print(f"Error during simulation step {step}: {e}")
@@ -306,42 +296,15 @@ def run_adaptive_agent():
 #Writes the traffic data to csv files
 def write_data_to_csv(rt_traffic_data):
     try:
-        # Prepare queue length data for CSV
-        queue_data = []
-        for entry in rt_traffic_data["queue_length"]:
-            for data_point in entry["data"]:  # Correctly iterate over the list
-                queue_data.append({
-                    "Step": entry["step"],  # Add the step value for context
-                    "TLS ID": data_point["tls_id"],
-                    "Road ID": data_point["road_id"],
-                    "Queue Length": data_point["queue_length"]
-                })
-
-        # Debug: Print queue data before writing
-        # print(f"Queue Data for CSV: {queue_data}")
-
-        # Prepare average speed data for CSV
-        speed_data = []
-        for entry in rt_traffic_data["avg_speed"]:
-            for data_point in entry["data"]:  # Correctly iterate over the list
-                speed_data.append({
-                    "Step": entry["step"],  # Add the step value for context
-                    "Edge ID": data_point["edge_id"],
-                    "Avg Speed (m/s)": data_point["avg_speed"]
-                })
-
-        # Debug: Print speed data before writing
-        # print(f"Speed Data for CSV: {speed_data}")
-
-        # Export to CSV
-        if queue_data:
-            pd.DataFrame(queue_data).to_csv("Logs/road_queue_lengths.csv", index=False)
+        # Export to CSV straight from the recorded columns
+        if len(rt_traffic_data.queue_length):
+            rt_traffic_data.queue_frame().to_csv("Logs/road_queue_lengths.csv", index=False)
             # print("Logs/road_queue_lengths.csv successfully written.")
         else:
             print("Queue data is empty. No CSV file was written.")
 
-        if speed_data:
-            pd.DataFrame(speed_data).to_csv("Logs/edge_avg_speeds.csv", index=False)
+        if len(rt_traffic_data.avg_speed):
+            rt_traffic_data.speed_frame().to_csv("Logs/edge_avg_speeds.csv", index=False)
             # print("Logs/edge_avg_speeds.csv successfully written.")
         else:
             print("Speed data is empty. No CSV file was written.")
@@ -8,9 +8,26 @@ import sumolib
 import pandas as pd
 from traci._trafficlight import Logic, Phase
 import copy
-from Agents.incident_handling import block_edge, detect_incidents, is_edge_blocked, random_block_edge  # Import the function
-from Testers.performance_testing_AD import gather_performance_data, initialize_metrics
+from Agents.sensors import TrafficSensors
+from Agents.log_store import new_run_id
+from Agents.traffic_recorder import StreamingTrafficWriter
+from Agents.network_cache import load_network_plan
+from Agents.decision_kernel import DecisionKernel
+from Agents.control_scheduler import ControlScheduler
+from Agents.route_index import RouteIndex
+from Agents.incident_handling import IncidentDetector, IncidentManager, handle_incidents, random_block_edge  # Import the function
+from Agents.replay import TraceRecorder
+from Agents.sharded_control import ShardPool, start_shared_simulation
+from Agents.snapshot import SAVE_STATE_ARGS, load_snapshot, resume_args, save_snapshot
+from Testers.performance_testing_AD import (
+    flush_metrics,
+    gather_performance_data,
+    get_metrics_state,
+    initialize_metrics,
+    set_metrics_state,
+)
 from Testers.random_scenarios import apply_random_scenarios
+from Testers.trip_outputs import trip_output_args, trip_output_files
 
 # Configuration
 import os
@@ -34,13 +51,32 @@ MAX_GREEN_ADDED = 30
 MIN_GREEN_ADDED = 5
 QUEUE_THRESHOLD = 5
 STEP_INTERVAL = 3
+CONTROL_INTERVAL = STEP_INTERVAL  # Seconds between decisions within an undecided phase (1: every step, None: never)
+CONTROL_LOOKAHEAD = STEP_INTERVAL  # Seconds before a phase ends at which it is decided once more (None: disabled)
 # EXTRA_GREEN_TIME = 10
 # LESS_RED_TIME = 0.7
-rt_traffic_data = {"avg_speed": [], "queue_length": []}
+queue_lengths_file = "Logs/road_queue_lengths.csv"
+edge_speeds_file = "Logs/edge_avg_speeds.csv"
+log_format = "csv"  # "csv", or "parquet" / "arrow" for typed, compressed partitions per run and step range
+run_id = None  # Partition name of this run's logs; defaults to the start time
+checkpoint_step = None  # Step to snapshot the simulation and the agent at (None: never)
+checkpoint_dir = "Snapshots/checkpoint"  # Directory the snapshot is written to
+stop_at_checkpoint = False  # End the run once the snapshot is written, e.g. for a warm-up run
+resume_snapshot = None  # Snapshot directory to continue from instead of starting at step 0
+trace_file = None  # Record per-step sensor observations to this .npz trace for replay (None: off)
+num_shards = 1  # Controller processes the intersections are split across (1: decide in this process)
+shard_timing_file = "Logs/shard_timing.csv"  # Per-shard control timing of sharded runs
+trip_output_dir = None  # Read vehicle metrics after the run from SUMO tripinfo/summary files here (None: every step)
+# Per-step queue lengths and edge speeds, streamed to their CSV files in chunks during the run
+rt_traffic_data = StreamingTrafficWriter(queue_lengths_file, edge_speeds_file)
 
 #A function that calculates average speed
-def get_average_speed(edge_id):
+def get_average_speed(edge_id, sensors=None):
     
+    # Serve the reading from subscriptions when a sensor layer is active
+    if sensors is not None:
+        return sensors.get_average_speed(edge_id)
+
     try:
         # Retrieve the average speed of vehicles on the edge
         avg_speed = traci.edge.getLastStepMeanSpeed(edge_id)
@@ -54,145 +90,144 @@ def get_average_speed(edge_id):
         print(f"Unexpected error in get_average_speed for edge {edge_id}: {e}")
         return 0
 
-#A function that collects average queue length
-def get_road_queues(tls_id, step):
-    
-    queue_lengths = {}
-    seen_lanes = set()  # Avoid duplicate lane processing
-
-    try:
-        # Get the lanes controlled by the traffic light system
-        tl_lanes = traci.trafficlight.getControlledLanes(tls_id)
-        # print(f"Step {step} - Traffic light {tls_id} controls lanes: {tl_lanes}")
-
-        for lane in tl_lanes:
-            if lane in seen_lanes:
-                continue  # Skip duplicate lanes
-            seen_lanes.add(lane)
-
-            # Extract road ID from the lane name
-            road_id = lane.split("_")[0]
-
-            # Retrieve the number of halting vehicles in the lane
-            try:
-                halting_vehicles = traci.lane.getLastStepHaltingNumber(lane)
-            except traci.TraCIException as e:
-                print(f"Error retrieving halting number for lane {lane}: {e}")
-                halting_vehicles = 0  # Default to 0 if retrieval fails
-
-            # Aggregate by road ID
-            if road_id not in queue_lengths:
-                queue_lengths[road_id] = 0
-            queue_lengths[road_id] += halting_vehicles
-
-            # Debug: Print lane-specific queue information
-            # print(
-            #     f"  Lane {lane} (road {road_id}): {halting_vehicles} vehicles halting."
-            # )
-
-        # Debug: Print aggregated queue lengths by road
-        # print(f"Aggregated queue lengths at {tls_id}: {queue_lengths}\n")
-
-    except traci.TraCIException as e:
-        print(f"Error retrieving controlled lanes for TLS {tls_id} at step {step}: {e}")
-    except Exception as e:
-        print(
-            f"Unexpected error in get_road_queues for TLS {tls_id} at step {step}: {e}"
+# The optimization heuristics (should_optimize, calculate_dynamic_durations) and their thresholds
+# live in Agents/decision_kernel.py, which applies them to every intersection at once
+
+
+# Decides the new phase durations of the intersections at a decision point and applies the changed ones
+def adjust_due_phases(decision_kernel, scheduler, sensors, queue_lengths, total_vehicles, connection=traci):
+    """
+    Runs one step of the V6 controller over the intersections the scheduler wakes.
+
+    Parameters:
+    - decision_kernel: The DecisionKernel of the running network.
+    - scheduler: The ControlScheduler of the kernel's traffic lights.
+    - sensors: The TrafficSensors the readings come from.
+    - queue_lengths: This step's queues from decision_kernel.read_queues().
+    - total_vehicles: Vehicles in the network.
+    - connection: The traci module, a labelled traci connection or a ReplayConnection.
+
+    Returns:
+    - The kernel rows that were evaluated.
+    """
+    rows, phases = scheduler.due()
+    if len(rows):
+        new_durations, apply = decision_kernel.decide(
+            queue_lengths[rows],
+            decision_kernel.read_avg_speeds(sensors, rows),
+            phases,
+            total_vehicles,
+            rows,
         )
-
-    return queue_lengths
-
-
-def get_tls_avg_speed(tls_id):
-    # Calculate the average speed for all roads controlled by the given traffic light system (TLS).
-   
-    controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
-    controlled_edges = {lane.split("_")[0] for lane in controlled_lanes}  # Get unique edges
-    
-    total_speed = 0
-    total_vehicles = 0
-
-    for edge_id in controlled_edges:
-        try:
-            # Retrieve vehicle count and mean speed on the edge
-            vehicle_count = traci.edge.getLastStepVehicleNumber(edge_id)
-            avg_speed = traci.edge.getLastStepMeanSpeed(edge_id)
-
-            total_speed += avg_speed * vehicle_count  # Weighted sum of speeds
-            total_vehicles += vehicle_count
-        except traci.TraCIException as e:
-            print(f"Error retrieving speed data for edge {edge_id}: {e}")
-            continue
-
-    # Calculate average speed for this TLS
-    if total_vehicles > 0:
-        return total_speed / total_vehicles
-    else:
-        return 0.0  # No vehicles on controlled edges
-
-def should_optimize(tls_id, queue_lengths, total_vehicles, TLS_avg_speed, step):
-    #Heuristic function to determine if there should be optimization
-    
-    # Parameters for biasing towards optimization
-    MIN_VEHICLES_THRESHOLD = 50  # Minimum vehicles in the simulation to consider optimization
-    TLS_QUEUE_THRESHOLD = 5  # High total queue threshold to trigger optimization
-    MIN_AVG_SPEED = 15.0  # Minimum average speed in m/s to justify optimization
-
-    total_queue = sum(queue_lengths.values())
-    avg_queue_per_road = total_queue / len(queue_lengths) if queue_lengths else 0
-
-    # print(f"Step {step}: Heuristic evaluation for TLS {tls_id}")
-    # print(f"  Total vehicles: {total_vehicles} in network ")
-    # print(f"  Total queue: {total_queue} for tls {tls_id} at sim step {step} ")
-    # print(f"  Avg queue per road: {avg_queue_per_road}")
-    # print(f"  Avg speed around TL{tls_id}: {TLS_avg_speed:.2f} m/s")
-
-    # Biased towards allowing optimization
-    if total_vehicles >= MIN_VEHICLES_THRESHOLD and (total_queue > TLS_QUEUE_THRESHOLD or TLS_avg_speed < MIN_AVG_SPEED):
-        # print(f"  Decision: OPTIMIZE (TLS {tls_id})\n")
-        return True
-    else:
-        # print(f"  Decision: DO NOT OPTIMIZE (TLS {tls_id})\n")
-        return False
-
-def calculate_dynamic_durations(queue_length, total_queue):
-    # Calculate dynamic durations for green and red lights based on queue length.
-    # Normalize queue length
-    queue_factor = queue_length / max(total_queue, 1)
-
-    # Scale extra green time based on queue factor
-    extra_green_time = int(
-        queue_factor * (MAX_GREEN_ADDED - MIN_GREEN_ADDED)
-    )
-
-    # Scale less red time based on queue factor
-    less_red_time = max(0.7, 1 - queue_factor * 0.5)  # Between 70% and 100%
-
-    return extra_green_time, less_red_time
-
+        decision_kernel.apply(new_durations, apply, rows, connection)
+        scheduler.reschedule(rows, decision_kernel.settled(phases, rows), apply)
+    return rows
 
 
 #Main function that runs the adaptive agent
 def run_adaptive_agent():
     import traceback  # For detailed error reporting
-    
+    global rt_traffic_data
 
-    try:
-        traci.start([sumoBinary, "-c", sumoConfig])
+    # Start a fresh log stream for this run
+    current_run_id = run_id if run_id is not None else new_run_id()
+    rt_traffic_data = StreamingTrafficWriter(
+        queue_lengths_file, edge_speeds_file, log_format=log_format, run_id=current_run_id
+    )
 
-        # Load fixed phase data
-        with open(adaptive_phases_file, "r") as f:
-            fixed_phases = json.load(f)
+    # Shards keep their scheduling state in their own processes, so it cannot be snapshotted
+    if num_shards > 1 and (checkpoint_step is not None or resume_snapshot is not None):
+        raise ValueError("Checkpoints and resuming are not supported with num_shards > 1")
+    # A resumed SUMO writes only the trips after the snapshot to its tripinfo file
+    if trip_output_dir is not None and resume_snapshot is not None:
+        raise ValueError("Resuming is not supported with trip_output_dir")
+    shard_pool = None
+
+    try:
+        sumo_cmd = [sumoBinary, "-c", sumoConfig]
+        if checkpoint_step is not None:
+            sumo_cmd += SAVE_STATE_ARGS
+        # Continue from a snapshot: SUMO starts at its step, the agent from its saved state
+        resume_state = None
+        if resume_snapshot is not None:
+            sumo_cmd += resume_args(resume_snapshot)
+            resume_state = load_snapshot(resume_snapshot)
+        trip_outputs = None
+        if trip_output_dir is not None:
+            trip_outputs = trip_output_files(trip_output_dir)
+            sumo_cmd += trip_output_args(trip_outputs)
+        if num_shards > 1:
+            # Split the intersections into regions, each decided by its own TraCI client of this simulation
+            shard_pool = ShardPool(
+                sumoConfig,
+                adaptive_phases_file,
+                num_shards,
+                {
+                    "min_green": MIN_GREEN,
+                    "max_green": MAX_GREEN,
+                    "min_green_added": MIN_GREEN_ADDED,
+                    "max_green_added": MAX_GREEN_ADDED,
+                    "interval": CONTROL_INTERVAL,
+                    "lookahead": CONTROL_LOOKAHEAD,
+                },
+            )
+            start_shared_simulation(sumo_cmd, shard_pool.num_clients, shard_pool.start())
+        else:
+            traci.start(sumo_cmd)
 
         # Initialize phase programs for each intersection
         tls_ids = traci.trafficlight.getIDList()
         
-        # Track which phases have been adjusted
-        adjusted_phases = {tls_id: None for tls_id in tls_ids}
+        # Load the static intersection layout and the fixed phases compiled into per-phase
+        # green-road sets, cached per network and phases file
+        topology, phase_plan, fixed_phases = load_network_plan(sumoConfig, adaptive_phases_file, tls_ids)
+
+        # Subscribe to lane, edge and TLS variables once instead of polling them every step
+        sensors = TrafficSensors(topology, traci.edge.getIDList())
+        sensors.subscribe()
         
-        initialize_metrics()
+        # Flatten the control rules over all intersections into one array kernel
+        decision_kernel = DecisionKernel(
+            tls_ids, topology, phase_plan, MIN_GREEN, MAX_GREEN, MIN_GREEN_ADDED, MAX_GREEN_ADDED
+        )
+        missing_tls_ids = [tls_id for tls_id in tls_ids if tls_id not in phase_plan]
+
+        # Wake each intersection only at phase starts, every STEP_INTERVAL seconds of an undecided
+        # phase and STEP_INTERVAL seconds before its phase ends
+        scheduler = ControlScheduler(
+            decision_kernel.tls_ids, sensors, interval=CONTROL_INTERVAL, lookahead=CONTROL_LOOKAHEAD
+        )
+        scheduler.subscribe()
+
+        initialize_metrics(
+            topology, sensors=sensors, log_format=log_format, run_id=current_run_id, trip_outputs=trip_outputs
+        )
+
+        # Index vehicle routes by edge, so closures reroute only the vehicles routed over the closed edge
+        route_index = RouteIndex(sensors)
+        route_index.subscribe()
+
+        # Road closures run step by step alongside the controller
+        incidents = IncidentManager(sensors, route_index=route_index)
+
+        # Watch every edge for surges and closures from subscribed halting counts
+        incident_detector = IncidentDetector(sensors, incident_manager=incidents)
+        incident_detector.subscribe()
 
         step = 0
+        if resume_state is not None:
+            step = resume_state["step"]
+            decision_kernel.set_state(resume_state["decision_kernel"])
+            scheduler.set_state(resume_state["scheduler"])
+            set_metrics_state(resume_state["metrics"])
+            incidents.set_state(resume_state["incidents"])
+            incident_detector.set_state(resume_state["incident_detector"])
+
+        # Record what the controller observes, so its decisions can be replayed without SUMO
+        recorder = None
+        if trace_file is not None:
+            recorder = TraceRecorder(sensors, trace_file)
+            recorder.start()
         while traci.simulation.getMinExpectedNumber() > 0:  # Until simulation ends
             try:
                 
@@ -200,122 +235,40 @@ def run_adaptive_agent():
                 step += 1
                 # apply_random_scenarios(step)
                 gather_performance_data()
-
-                # Data collection for each simulation step
-                step_queue_data = {"step": step, "data": []}
-                step_speed_data = {"step": step, "data": []}
+                incidents.tick(step)
 
                 total_vehicles = traci.vehicle.getIDCount() 
                 
                 # Collect queue lengths
-                for tls_id in tls_ids:
-                    if tls_id not in fixed_phases:
-                        print(f"TLS {tls_id} not found in adaptivePhasesdata.json file.")
-                        continue
-
-                    try:
-                        queue_lengths = get_road_queues(tls_id, step)
-                        
-                        total_queue = sum(queue_lengths.values())
-                        # print (f"Total Queue for traffic light {tls_id} = {total_queue}")
-                        
-                        for road_id, queue_length in queue_lengths.items():
-                            step_queue_data["data"].append({
-                                "tls_id": tls_id,
-                                "road_id": road_id,
-                                "queue_length": queue_length,
-                            })
-                    except Exception as e:
-                        print(f"Error collecting queue lengths for TLS {tls_id} at step {step}: {e}")
-                        traceback.print_exc()
-
-                    # Calculate average speed for this TLS
-                    avg_speed_tls = get_tls_avg_speed(tls_id)
-                        
-                    
-                    # Determine whether to optimize
-                    if not should_optimize(tls_id, queue_lengths, total_vehicles, avg_speed_tls, step):
-                    # if False:
-                        continue
-                    
-                    # if total_queue > QUEUE_THRESHOLD:
-                    current_phase_index = traci.trafficlight.getPhase(tls_id)
-                    current_phase_state = fixed_phases[tls_id][current_phase_index]["state"]
-                    
-                    # Detect phase change and reset adjusted phase
-                    if adjusted_phases[tls_id] != current_phase_index:
-                        # Reset adjustment tracker if phase has changed
-                        adjusted_phases[tls_id] = None
-                        
-                    # Skip if this phase was already adjusted    
-                    if adjusted_phases[tls_id] == current_phase_index:
-                        continue
-
-                    # Identify green roads in the current phase
-                    green_roads = [
-                        road_id
-                        for road_id, lanes in queue_lengths.items()
-                        if any(
-                            current_phase_state[i] == "G"
-                            for i, lane in enumerate(traci.trafficlight.getControlledLanes(tls_id))
-                            if lane.split("_")[0] == road_id
-                        )
-                    ]
-
-                    # If the current green roads have the highest queue, extend the phase duration
-                    highest_queue_road = max(queue_lengths, key=queue_lengths.get)
-                    # print(f"Road with highest queue length: {highest_queue_road}\n")
-                    
-                    if highest_queue_road not in green_roads:  
-                        #detract red time for the current phase 
-                        extra_green_time, less_red_time = calculate_dynamic_durations(
-                            queue_lengths[highest_queue_road],
-                            total_queue
-                        )
-                        new_duration = max(
-                            MIN_GREEN,
-                            fixed_phases[tls_id][current_phase_index]["duration"] * less_red_time
-                        )
-                        detractedTime = fixed_phases[tls_id][current_phase_index]["duration"] - new_duration
-                        if detractedTime > 0:
-                            # print(f"Detracting red phase for TLS {tls_id} by {detractedTime} seconds due to the highest queue road {highest_queue_road} at sim step {step}\n")
-                            traci.trafficlight.setPhaseDuration(tls_id, new_duration)
-                            adjusted_phases[tls_id] = current_phase_index
-
-                    else:      
-                        # Extend the green light for the current phase
-                        extra_green_time, _ = calculate_dynamic_durations(
-                            queue_lengths[highest_queue_road],
-                            total_queue
-                        )
-                        new_duration = min(
-                            MAX_GREEN,
-                            fixed_phases[tls_id][current_phase_index]["duration"] + extra_green_time
-                        )
-                        if(extra_green_time > 3):
-                            # print(f"Extending green phase for TLS {tls_id} by {extra_green_time} seconds. for the highest queue road {highest_queue_road} at sim step {step}\n")
-                            traci.trafficlight.setPhaseDuration(tls_id, new_duration)
-                            adjusted_phases[tls_id] = current_phase_index
-                                    
-                # Collect average speed for edges
+                for tls_id in missing_tls_ids:
+                    print(f"TLS {tls_id} not found in adaptivePhasesdata.json file.")
+
+                queue_lengths = decision_kernel.read_queues(sensors)
                 try:
-                    edge_ids = traci.edge.getIDList()
-                    for edge_id in edge_ids:
-                        step_speed_data["data"].append({
-                            "edge_id": edge_id,
-                            "avg_speed": get_average_speed(edge_id),
-                        })
+                    rt_traffic_data.record_queue_rows(
+                        step,
+                        decision_kernel.row_tls_ids,
+                        decision_kernel.row_road_ids,
+                        decision_kernel.queue_rows(queue_lengths),
+                    )
                 except Exception as e:
-                    print(f"Error collecting average speed at step {step}: {e}")
+                    print(f"Error collecting queue lengths at step {step}: {e}")
                     traceback.print_exc()
 
-                # Append step data to traffic data dictionaries
-                rt_traffic_data["queue_length"].append(step_queue_data)
-                rt_traffic_data["avg_speed"].append(step_speed_data)
+                # Sharded runs decide in the shard processes; this process senses, logs and handles incidents
+                if shard_pool is None:
+                    adjust_due_phases(decision_kernel, scheduler, sensors, queue_lengths, total_vehicles)
 
-                # Debug: Print to confirm data is appended
-                # print(f"Appended to rt_traffic_data['queue_length']: {step_queue_data}")
-                # print(f"Appended to rt_traffic_data['avg_speed']: {step_speed_data}")
+                # Collect average speed for edges
+                try:
+                    rt_traffic_data.record_speeds(
+                        step,
+                        sensors.edge_ids,
+                        [get_average_speed(edge_id, sensors) for edge_id in sensors.edge_ids],
+                    )
+                except Exception as e:
+                    print(f"Error collecting average speed at step {step}: {e}")
+                    traceback.print_exc()
                 
                 # ! Test: block an edge after removing all trips that start and end there
                 test_edge_id = "59"
@@ -326,12 +279,29 @@ def run_adaptive_agent():
                     # for vehicle_id in vehicle_ids:
                     #     traci.vehicle.setParameter(vehicle_id, "device.rerouting.mode", "8")
 
-                    step = block_edge(step, test_edge_id, 25)
+                    if not incidents.is_active(test_edge_id):
+                        incidents.close_edge(test_edge_id, 25, step)
                     
                 # Check if there are any incidents
-                # if(step % 2 == 0):
-                #     detect_incidents()
-                
+                detected_incidents = incident_detector.detect()
+                if detected_incidents:
+                    handle_incidents(detected_incidents, route_index, incidents)
+
+                # Snapshot the simulation and the agent, so variants can continue from here
+                if step == checkpoint_step:
+                    save_snapshot(
+                        checkpoint_dir,
+                        {
+                            "step": step,
+                            "decision_kernel": decision_kernel.get_state(),
+                            "scheduler": scheduler.get_state(),
+                            "metrics": get_metrics_state(),
+                            "incidents": incidents.get_state(),
+                            "incident_detector": incident_detector.get_state(),
+                        },
+                    )
+                    if stop_at_checkpoint:
+                        break
 
 
             except Exception as e:
@@ -341,56 +311,41 @@ def run_adaptive_agent():
         # Debug: Final rt_traffic_data
         # print(f"Final RT Traffic Data: {rt_traffic_data}")
 
+        rt_traffic_data.close()  # Write the last chunk of queue and speed rows
+        if recorder is not None:
+            recorder.close()
+        if shard_pool is not None:
+            shard_pool.stop()
         traci.close()
+        flush_metrics()  # Write the final performance reports, after SUMO has finished its trip outputs
+        if shard_pool is not None:
+            shard_timings = shard_pool.join()
+            print(shard_timings.to_string(index=False))
+            shard_timings.to_csv(shard_timing_file, index=False)
         return rt_traffic_data
 
     except Exception as e:
         print(f"Critical error in run_adaptive_agent: {e}")
         traceback.print_exc()
+        rt_traffic_data.close()
+        if shard_pool is not None:
+            shard_pool.stop()
         traci.close()
+        flush_metrics()
+        if shard_pool is not None:
+            shard_pool.join(timeout=5)
         return None
 
 #Writes the traffic data to csv files
 def write_data_to_csv(rt_traffic_data):
     try:
-        # Prepare queue length data for CSV
-        queue_data = []
-        for entry in rt_traffic_data["queue_length"]:
-            for data_point in entry["data"]:  # Correctly iterate over the list
-                queue_data.append({
-                    "Step": entry["step"],  # Add the step value for context
-                    "TLS ID": data_point["tls_id"],
-                    "Road ID": data_point["road_id"],
-                    "Queue Length": data_point["queue_length"]
-                })
-
-        # Debug: Print queue data before writing
-        # print(f"Queue Data for CSV: {queue_data}")
-
-        # Prepare average speed data for CSV
-        speed_data = []
-        for entry in rt_traffic_data["avg_speed"]:
-            for data_point in entry["data"]:  # Correctly iterate over the list
-                speed_data.append({
-                    "Step": entry["step"],  # Add the step value for context
-                    "Edge ID": data_point["edge_id"],
-                    "Avg Speed (m/s)": data_point["avg_speed"]
-                })
-
-        # Debug: Print speed data before writing
-        # print(f"Speed Data for CSV: {speed_data}")
-
-        # Export to CSV
-        if queue_data:
-            pd.DataFrame(queue_data).to_csv("Logs/road_queue_lengths.csv", index=False)
-            # print("Logs/road_queue_lengths.csv successfully written.")
-        else:
+        # Rows are streamed to disk during the run; write whatever is still buffered
+        rt_traffic_data.close()
+
+        if not rt_traffic_data.rows_written[rt_traffic_data.queue_file]:
             print("Queue data is empty. No CSV file was written.")
 
-        if speed_data:
-            pd.DataFrame(speed_data).to_csv("Logs/edge_avg_speeds.csv", index=False)
-            # print("Logs/edge_avg_speeds.csv successfully written.")
-        else:
+        if not rt_traffic_data.rows_written[rt_traffic_data.speed_file]:
             print("Speed data is empty. No CSV file was written.")
 
     except Exception as e:
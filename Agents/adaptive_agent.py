@@ -1,6 +1,10 @@
 import traci  
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from traci._trafficlight import Logic, Phase
+from Agents.topology import IntersectionTopology
 
 sumoBinary = "sumo-gui"
 sumoConfig = "CustomNetworks/oneLaneMap.sumocfg"  
@@ -32,9 +36,12 @@ def group_lanes_by_direction(controlled_lanes):
     return list(lane_groups.values())
 
 
-def set_adaptive_timing(tls_id):
+def set_adaptive_timing(tls_id, topology=None):
     # Get controlled lanes and group them
-    controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
+    if topology is not None:
+        controlled_lanes = topology.get_controlled_lanes(tls_id)
+    else:
+        controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
     lane_groups = group_lanes_by_direction(controlled_lanes)
     num_lanes = len(controlled_lanes)
 
@@ -75,7 +82,7 @@ def calculate_green_time(controlled_lanes):
     green_time = max(MIN_GREEN_TIME, min(MAX_GREEN_TIME, total_queue * 2))
     return green_time
 
-def collect_metrics():
+def collect_metrics(topology=None):
     global total_waiting_time
 
     for vehicle_id in traci.simulation.getDepartedIDList():
@@ -93,8 +100,10 @@ def collect_metrics():
         except traci.exceptions.TraCIException as e:
             print(f"Warning: Failed to get waiting time for vehicle {vehicle_id}. {e}")
 
-    for tls_id in traci.trafficlight.getIDList():
-        queue_lengths[tls_id] = sum(traci.lane.getLastStepHaltingNumber(lane) for lane in traci.trafficlight.getControlledLanes(tls_id))
+    if topology is None:
+        topology = IntersectionTopology.from_traci()
+    for tls_id in topology:
+        queue_lengths[tls_id] = sum(traci.lane.getLastStepHaltingNumber(lane) for lane in topology.get_controlled_lanes(tls_id))
 
 def calculate_avg_travel_time(): 
     if len(vehicle_travel_times) > 0:
@@ -127,6 +136,7 @@ def run_adaptive():
 
             tls_ids = traci.trafficlight.getIDList()
             log_handle.write(f"Detected Traffic Lights: {tls_ids}\n")
+            topology = IntersectionTopology.from_traci(tls_ids)
 
             simulation_end_time = 700
 
@@ -134,8 +144,8 @@ def run_adaptive():
                    traci.simulation.getMinExpectedNumber() > 0):
                 traci.simulationStep()
                 for tls_id in tls_ids:
-                    set_adaptive_timing(tls_id)
-                collect_metrics()
+                    set_adaptive_timing(tls_id, topology)
+                collect_metrics(topology)
 
             log_handle.write("Simulation ended.\n")
             print(f"Adaptive traffic light operations logged to {log_file}")
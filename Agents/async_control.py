@@ -0,0 +1,341 @@
+import asyncio
+import struct
+import subprocess
+import time
+import traceback
+
+import pandas as pd
+import traci
+import traci.constants as tc
+from sumolib.miscutils import getFreeSocketPort
+from traci.storage import Storage
+
+from Agents import V6adaptive_agent as V6
+from Agents.control_scheduler import ControlScheduler
+from Agents.decision_kernel import DecisionKernel
+from Agents.network_cache import load_network_plan
+from Agents.sensors import TrafficSensors
+
+# One row per simulation in run_farm()'s results
+RESULT_COLUMNS = ["label", "config", "seed", "steps", "decisions", "actions", "mean_queue", "error"]
+
+CONNECT_RETRY_SECONDS = 0.05  # Wait between attempts to connect to a SUMO that is still starting
+
+
+def encode_command(command_id, variable_id=None, object_id="", payload=b""):
+    """
+    Encodes one TraCI command, framed as traci's Connection._sendCmd() frames it.
+
+    Parameters:
+    - command_id: The TraCI command, e.g. tc.CMD_SIMSTEP.
+    - variable_id: The variable of a get or set command, or None.
+    - object_id: The object the variable belongs to.
+    - payload: The already packed values.
+
+    Returns:
+    - The command as bytes, ready to be joined into a message.
+    """
+    body = b""
+    if variable_id is not None:
+        object_id = str(object_id).encode("utf8")
+        body = struct.pack("!Bi", variable_id, len(object_id)) + object_id
+    body += payload
+    length = len(body) + 2
+    if length <= 255:
+        return struct.pack("!BB", length, command_id) + body
+    return struct.pack("!BiB", 0, length + 4, command_id) + body
+
+
+STEP_COMMAND = encode_command(tc.CMD_SIMSTEP, payload=struct.pack("!d", 0.0))
+
+# SUMO runs a message's step after its other commands, so the values the loop needs after
+# the step are subscribed and arrive with the step's reply
+LOOP_SUBSCRIPTIONS = [
+    ("simulation", "", [tc.VAR_MIN_EXPECTED_VEHICLES, tc.VAR_TIME]),
+    ("vehicle", "", [tc.ID_COUNT]),  # The vehicle count; "" subscribes the domain-wide variable
+]
+
+
+class QueuedTrafficLight:
+    """
+    A connection's trafficlight domain whose setPhaseDuration() goes out with the next step.
+    Every other call is passed through to the connection.
+    """
+
+    def __init__(self, pipeline, domain):
+        self._pipeline = pipeline
+        self._domain = domain
+
+    def __getattr__(self, name):
+        return getattr(self._domain, name)
+
+    def setPhaseDuration(self, tlsID, phaseDuration):
+        payload = struct.pack("!Bd", tc.TYPE_DOUBLE, float(phaseDuration))
+        self._pipeline.queue(encode_command(tc.CMD_SET_TL_VARIABLE, tc.TL_PHASE_DURATION, tlsID, payload))
+        self._pipeline.actions += 1
+
+
+class PipelinedConnection:
+    """
+    Wraps a traci connection so a whole control step is one message and one reply.
+
+    Phase duration changes are queued instead of sent, and step() sends them ahead of the
+    simulation step over the non-blocking socket; SUMO applies them before stepping, as if
+    they had been sent one by one. Subscription results in the reply are parsed by traci
+    and the connection's step listeners run, so TrafficSensors and the other components
+    work unchanged. Everything else, such as the subscriptions made before the loop, is
+    passed through to the blocking connection.
+
+    Parameters:
+    - connection: A traci connection, e.g. from traci.connect().
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._commands = []  # Encoded commands of the next message
+        self._command_ids = []
+        self.trafficlight = QueuedTrafficLight(self, connection.trafficlight)
+        self.actions = 0  # Phase durations set
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def queue(self, command):
+        # Adds an encoded command to the next message; command[1] is its ID unless the length is extended
+        self._commands.append(command)
+        self._command_ids.append(command[1] if command[0] else command[5])
+
+    async def step(self):
+        """
+        Sends the queued commands and one simulation step, and waits for the reply without blocking.
+        """
+        self.queue(STEP_COMMAND)
+        message = b"".join(self._commands)
+        command_ids = self._command_ids
+        self._commands, self._command_ids = [], []
+
+        result = await self._exchange(struct.pack("!i", len(message) + 4) + message)
+        for command_id in command_ids:
+            _, response_id, status = result.read("!BBB")
+            error = result.readString()
+            if status or error:
+                # SUMO answers the remaining commands of a message after a failed one
+                if command_id == tc.CMD_SET_TL_VARIABLE:
+                    print(f"Error setting a phase duration: {error}")
+                    continue
+                raise traci.TraCIException(error, response_id)
+            if command_id == tc.CMD_SIMSTEP:
+                self._read_step(result)
+
+    async def _exchange(self, data):
+        # Sends one message and reads the reply, letting other simulations run while SUMO works
+        sock = self._connection._socket
+        if sock is None:
+            raise traci.FatalTraCIError("Connection already closed.")
+        loop = asyncio.get_running_loop()
+        # Non-blocking only while awaiting, so direct traci calls between steps still work
+        sock.setblocking(False)
+        try:
+            await loop.sock_sendall(sock, data)
+            length = struct.unpack("!i", await self._receive(loop, sock, 4))[0]
+            return Storage(await self._receive(loop, sock, length - 4))
+        finally:
+            if self._connection._socket is not None:
+                sock.setblocking(True)
+
+    async def _receive(self, loop, sock, size):
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = await loop.sock_recv_into(sock, view[received:])
+            if not count:
+                sock.close()
+                self._connection._socket = None
+                raise traci.FatalTraCIError("Connection closed by SUMO.")
+            received += count
+        return bytes(buffer)
+
+    def _read_step(self, result):
+        # Parses the step's subscription results as traci's simulationStep() does
+        connection = self._connection
+        for subscription_results in connection._subscriptionMapping.values():
+            subscription_results.reset()
+        for _ in range(result.readInt()):
+            connection._readSubscription(result)
+        connection.manageStepListeners(0)
+
+
+class AsyncSimulation:
+    """
+    One SUMO instance controlled by the V6 decisions from a coroutine.
+
+    Runs V6's sensing, scheduling and adjust_due_phases() like the main loop of
+    V6adaptive_agent, but every step goes through a PipelinedConnection, so an event loop
+    can drive many simulations while each waits on SUMO. Metrics, logging and incident
+    handling stay with run_adaptive_agent(), which keeps them in module globals for one
+    simulation per process; each simulation here reports its decision counts and mean
+    halting vehicles instead.
+
+    Parameters:
+    - label: Name of the simulation in the results.
+    - config: The .sumocfg to simulate.
+    - seed: SUMO random seed, or None for the config's.
+    - sumo_binary: SUMO binary; must be headless "sumo" for farms.
+    - sumo_args: Extra SUMO options, e.g. ["--no-warnings", "true"].
+    - phases_file: The fixed phases JSON.
+    - params: Overrides of V6's control parameters, e.g. {"MIN_GREEN": 10}.
+    - end: Simulation time the run stops at, or None to run until no vehicles are expected.
+      SUMO keeps stepping past --end while a TraCI client drives it, so the loop stops itself.
+    """
+
+    def __init__(
+        self,
+        label,
+        config,
+        seed=None,
+        sumo_binary="sumo",
+        sumo_args=(),
+        phases_file=V6.adaptive_phases_file,
+        params=None,
+        end=None,
+    ):
+        self.label = label
+        self.config = config
+        self.seed = seed
+        self.sumo_binary = sumo_binary
+        self.sumo_args = list(sumo_args)
+        self.phases_file = phases_file
+        self.params = dict(params or {})
+        self.end = end
+
+    def setting(self, name):
+        # Returns a V6 control parameter, overridden by params
+        return self.params.get(name, getattr(V6, name))
+
+    def connect(self):
+        """
+        Starts SUMO, connects and subscribes the controller. Blocking; run in a thread.
+
+        Returns:
+        - connection, sensors, decision_kernel, scheduler
+        """
+        port = getFreeSocketPort()
+        cmd = [self.sumo_binary, "-c", self.config, "--no-step-log", "true"] + self.sumo_args
+        if self.seed is not None:
+            cmd += ["--seed", str(self.seed)]
+        if self.end is not None:
+            cmd += ["--end", str(self.end)]
+        process = subprocess.Popen(cmd + ["--remote-port", str(port)])
+        connection = PipelinedConnection(
+            traci.connect(port, proc=process, waitBetweenRetries=CONNECT_RETRY_SECONDS)
+        )
+
+        tls_ids = connection.trafficlight.getIDList()
+        topology, phase_plan, _ = load_network_plan(self.config, self.phases_file, tls_ids, connection)
+        sensors = TrafficSensors(topology, connection=connection)
+        sensors.subscribe()
+        decision_kernel = DecisionKernel(
+            tls_ids,
+            topology,
+            phase_plan,
+            self.setting("MIN_GREEN"),
+            self.setting("MAX_GREEN"),
+            self.setting("MIN_GREEN_ADDED"),
+            self.setting("MAX_GREEN_ADDED"),
+        )
+        scheduler = ControlScheduler(
+            decision_kernel.tls_ids,
+            sensors,
+            interval=self.setting("CONTROL_INTERVAL"),
+            lookahead=self.setting("CONTROL_LOOKAHEAD"),
+            connection=connection,
+        )
+        scheduler.subscribe()
+        for domain, object_id, variables in LOOP_SUBSCRIPTIONS:
+            sensors.add_subscription(domain, object_id, variables)
+        return connection, sensors, decision_kernel, scheduler
+
+    async def run(self):
+        """
+        Runs the simulation until its end time or until no vehicles are expected.
+
+        Returns:
+        - A dict with the RESULT_COLUMNS of this simulation.
+        """
+        row = {"label": self.label, "config": self.config, "seed": self.seed, "steps": 0, "decisions": 0}
+        row.update(actions=0, mean_queue=0.0, error=None)
+        connection = None
+        queue_sum = 0
+        try:
+            # Starting SUMO and subscribing block, so they run beside the event loop
+            connection, sensors, decision_kernel, scheduler = await asyncio.to_thread(self.connect)
+            min_expected = connection.simulation.getMinExpectedNumber()
+            now = connection.simulation.getTime()
+            while min_expected > 0 and (self.end is None or now < self.end):
+                await connection.step()
+                row["steps"] += 1
+                min_expected = sensors.get_simulation_value(tc.VAR_MIN_EXPECTED_VEHICLES, 0)
+                now = sensors.get_simulation_value(tc.VAR_TIME, now)
+                total_vehicles = sensors.vehicle_results.get("", {}).get(tc.ID_COUNT, 0)
+
+                queue_lengths = decision_kernel.read_queues(sensors)
+                queue_sum += queue_lengths.sum()
+                rows = V6.adjust_due_phases(
+                    decision_kernel, scheduler, sensors, queue_lengths, total_vehicles, connection
+                )
+                row["decisions"] += len(rows)
+        except Exception as e:
+            print(f"Error in simulation {self.label}: {e}")
+            traceback.print_exc()
+            row["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            if connection is not None:
+                row["actions"] = connection.actions
+                try:
+                    await asyncio.to_thread(connection.close)
+                except Exception as e:
+                    print(f"Error closing simulation {self.label}: {e}")
+        row["mean_queue"] = float(queue_sum / max(row["steps"], 1))
+        return row
+
+
+async def run_simulations(simulations, max_concurrent=None):
+    """
+    Runs simulations concurrently on the current event loop.
+
+    Parameters:
+    - simulations: AsyncSimulation instances.
+    - max_concurrent: Most SUMO instances alive at once. None runs all at once.
+
+    Returns:
+    - Their result rows, in the order given.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent or len(simulations) or 1)
+
+    async def run_one(simulation):
+        async with semaphore:
+            return await simulation.run()
+
+    return await asyncio.gather(*(run_one(simulation) for simulation in simulations))
+
+
+def run_farm(simulations, max_concurrent=None):
+    """
+    Drives many simulations from one event loop in this process.
+
+    While one simulation waits for SUMO to compute its step, the controller of another
+    runs, so a core is kept busy with control work instead of blocking on sockets.
+    max_concurrent=1 runs them one after the other, as one process per simulation would.
+
+    Parameters:
+    - simulations: AsyncSimulation instances.
+    - max_concurrent: Most SUMO instances alive at once. None runs all at once.
+
+    Returns:
+    - results: DataFrame with one RESULT_COLUMNS row per simulation.
+    - seconds: Wall time of the whole farm.
+    """
+    started = time.perf_counter()
+    rows = asyncio.run(run_simulations(simulations, max_concurrent))
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS), time.perf_counter() - started
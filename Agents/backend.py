@@ -0,0 +1,218 @@
+import os
+import runpy
+import sys
+import types
+
+import traci
+
+# Backend choices: "auto" runs headless SUMO in-process with libsumo and sumo-gui over TraCI
+BACKENDS = ("auto", "libsumo", "traci")
+
+
+def is_gui_binary(binary):
+    # sumo-gui needs its own process, so it is always driven over TraCI
+    return os.path.basename(binary).lower().startswith("sumo-gui")
+
+
+def load_libsumo():
+    # Returns the libsumo module, or None if it is not installed
+    try:
+        import libsumo
+    except ImportError:
+        return None
+    return libsumo
+
+
+def wrap_libsumo_calls(wrap):
+    """
+    Replaces libsumo's domain functions and simulationStep() with wrapped versions, e.g. to
+    count or time calls into the simulation. libsumo calls never pass through traci's
+    Connection, so this is where they can be observed. Call before the simulation starts.
+
+    Parameters:
+    - wrap: Function taking a libsumo function and returning its replacement.
+
+    Returns:
+    - True if libsumo is installed and was wrapped, False otherwise.
+    """
+    libsumo = load_libsumo()
+    if libsumo is None:
+        return False
+    for name, domain in vars(libsumo).items():
+        # Domains are classes of static functions; simulation is the only one without IDs
+        if not isinstance(domain, type) or not (name == "simulation" or hasattr(domain, "getIDList")):
+            continue
+        for function_name, function in list(vars(domain).items()):
+            if isinstance(function, staticmethod) and not function_name.startswith("_"):
+                setattr(domain, function_name, staticmethod(wrap(function.__func__)))
+    libsumo.simulationStep = wrap(libsumo.simulationStep)
+    return True
+
+
+def to_libsumo_logic(libsumo, logic):
+    # Converts a traci._trafficlight.Logic into the libsumo type its setProgramLogic() accepts
+    if isinstance(logic, libsumo.trafficlight.Logic):
+        return logic
+    phases = [
+        libsumo.trafficlight.Phase(
+            phase.duration,
+            phase.state,
+            phase.minDur,
+            phase.maxDur,
+            tuple(phase.next or ()),
+            phase.name,
+        )
+        for phase in logic.phases
+    ]
+    return libsumo.trafficlight.Logic(
+        logic.programID, logic.type, logic.currentPhaseIndex, phases, dict(logic.subParameter or {})
+    )
+
+
+class LibsumoTrafficLight:
+    """
+    libsumo's trafficlight domain, accepting the traci Logic objects the agents build.
+    """
+
+    def __init__(self, libsumo):
+        self._libsumo = libsumo
+        self._domain = libsumo.trafficlight
+
+    def __getattr__(self, name):
+        return getattr(self._domain, name)
+
+    def setProgramLogic(self, tlsID, logic):
+        return self._domain.setProgramLogic(tlsID, to_libsumo_logic(self._libsumo, logic))
+
+
+class HorizonSimulation:
+    """
+    The active backend's simulation domain, reporting no expected vehicles from the end time on.
+
+    The agents step until getMinExpectedNumber() drops to 0, and SUMO keeps stepping past
+    --end while a client drives it, so this is what ends their loops at a horizon.
+
+    Parameters:
+    - backend: The TraciBackend whose active module and end_time are used.
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self._backend._active_module.simulation, name)
+
+    def getMinExpectedNumber(self):
+        simulation = self._backend._active_module.simulation
+        if simulation.getTime() >= self._backend.end_time:
+            return 0
+        return simulation.getMinExpectedNumber()
+
+
+class TraciBackend(types.ModuleType):
+    """
+    Stand-in for the traci module that sends every call to libsumo or to TraCI.
+
+    The backend is chosen on each start(): with "auto", headless sumo runs in-process
+    through libsumo and sumo-gui runs over a TraCI socket. Everything else - domains,
+    constants, exceptions, step listeners - is looked up on the active backend at call
+    time, so agents keep calling traci.<domain>.<function>() unchanged.
+
+    Setting end_time ends the agents' runs at that simulation time, see HorizonSimulation.
+
+    Parameters:
+    - traci_module: The real traci package.
+    - backend: "auto", "libsumo" or "traci".
+    """
+
+    def __init__(self, traci_module, backend="auto"):
+        super().__init__(traci_module.__name__, traci_module.__doc__)
+        # Keep the package attributes so "import traci.constants" and friends still resolve
+        for attribute in ("__file__", "__path__", "__package__", "__spec__", "__version__"):
+            if hasattr(traci_module, attribute):
+                setattr(self, attribute, getattr(traci_module, attribute))
+        # Internal names must not shadow traci attributes such as _trafficlight
+        self._real_traci = traci_module
+        self._real_libsumo = None
+        self._active_module = traci_module
+        self._tls_adapter = None
+        self._horizon = HorizonSimulation(self)
+        self.end_time = None  # Simulation time the runs end at (None: when no vehicles are expected)
+        self.backend = check_backend(backend)
+
+    def __getattr__(self, name):
+        # Submodules such as constants, exceptions and _trafficlight always come from the traci package
+        value = getattr(self._real_traci, name, None)
+        if isinstance(value, types.ModuleType):
+            return value
+        if name == "trafficlight" and self._tls_adapter is not None:
+            return self._tls_adapter
+        if name == "simulation" and self.end_time is not None:
+            return self._horizon
+        return getattr(self._active_module, name)
+
+    @property
+    def active_backend(self):
+        # "libsumo" or "traci", whichever the last start() chose
+        return "libsumo" if self._active_module is self._real_libsumo else "traci"
+
+    def start(self, cmd, port=None, label="default", **kwargs):
+        """
+        Starts SUMO on the backend chosen for cmd, with traci.start()'s signature.
+        libsumo runs one simulation per process, so port and label only apply to TraCI.
+        """
+        if self.backend != "traci" and not is_gui_binary(cmd[0]):
+            if self._real_libsumo is None:
+                self._real_libsumo = load_libsumo()
+            if self._real_libsumo is not None:
+                self._active_module = self._real_libsumo
+                self._tls_adapter = LibsumoTrafficLight(self._real_libsumo)
+                kwargs = {key: value for key, value in kwargs.items() if key in ("traceFile", "traceGetters", "stdout")}
+                return self._real_libsumo.start(list(cmd), **kwargs)
+            if self.backend == "libsumo":
+                print("Warning: libsumo is not installed, falling back to TraCI.")
+
+        self._active_module = self._real_traci
+        self._tls_adapter = None
+        return self._real_traci.start(cmd, port=port, label=label, **kwargs)
+
+    def simulationStep(self, step=0.0):
+        # Defined here rather than forwarded so wrappers installed on traci.simulationStep follow the backend
+        return self._active_module.simulationStep(step)
+
+
+def check_backend(backend):
+    # Raises a ValueError for unknown backends
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}. Expected one of {BACKENDS}")
+    return backend
+
+
+def install(backend="auto"):
+    """
+    Replaces the traci module with a TraciBackend for every module imported afterwards.
+    Call before importing the agents; modules that already imported traci keep the real one.
+
+    Parameters:
+    - backend: "auto", "libsumo" or "traci".
+
+    Returns:
+    - The installed TraciBackend.
+    """
+    current = sys.modules.get("traci")
+    if isinstance(current, TraciBackend):
+        current.backend = check_backend(backend)
+        return current
+    installed = TraciBackend(traci, backend)
+    sys.modules["traci"] = installed
+    return installed
+
+
+# Runs an agent module with the backend installed, e.g. python -m Agents.backend Agents.V6adaptive_agent
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python -m Agents.backend <agent module> [args...]")
+    install(os.environ.get("TRAFFIC_BACKEND", "auto"))
+    module_name = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    runpy.run_module(module_name, run_name="__main__", alter_sys=True)
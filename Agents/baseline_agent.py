@@ -4,7 +4,8 @@ import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from traci._trafficlight import Logic, Phase
-from Testers.performance_testing_Bl import initialize_metrics, gather_performance_data
+from Agents.topology import IntersectionTopology
+from Testers.performance_testing_Bl import initialize_metrics, gather_performance_data, flush_metrics
 
 # SUMO configuration
 sumoBinary = "sumo-gui"
@@ -112,15 +113,19 @@ fixed_phases_dict = {
 
 
 # Sets fixed timing for each traffic light
-def set_fixed_timing(tls_id):
+def set_fixed_timing(tls_id, topology=None):
     """
     Configures fixed timing for traffic lights based on the number of lanes they control.
 
     Args:
         tls_id (str): Traffic light system ID.
+        topology (IntersectionTopology): Intersection layout built at startup, if any.
     """
     # Get controlled lanes by the traffic light
-    controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
+    if topology is not None:
+        controlled_lanes = topology.get_controlled_lanes(tls_id)
+    else:
+        controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
     num_lanes = len(controlled_lanes)
 
     # Apply predefined phases based on lane count
@@ -145,8 +150,6 @@ def run_baseline():
             # Start SUMO simulation
             traci.start([sumoBinary, "-c", sumoConfig])
 
-            # Initialize metrics and traffic light settings
-            initialize_metrics()
             log_handle.write("Traffic Light Phase Log\n")
             log_handle.write("=" * 40 + "\n")
 
@@ -154,9 +157,13 @@ def run_baseline():
             tls_ids = traci.trafficlight.getIDList()
             log_handle.write(f"Detected Traffic Lights: {tls_ids}\n")
 
+            # Build the intersection layout once and share it with the metrics
+            topology = IntersectionTopology.from_traci(tls_ids)
+            initialize_metrics(topology)
+
             for tls_id in tls_ids:
                 # Set fixed timing for each traffic light
-                set_fixed_timing(tls_id)
+                set_fixed_timing(tls_id, topology)
                 log_handle.write(
                     f"Dynamic fixed timing set for traffic light: {tls_id}\n"
                 )
@@ -166,6 +173,7 @@ def run_baseline():
                 traci.simulationStep()  # Advance the simulation
                 # Run performance tests
                 gather_performance_data()
+            flush_metrics()  # Write the final performance reports
             print("Simulation completed successfully.")
             traci.close()
 
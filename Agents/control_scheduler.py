@@ -0,0 +1,119 @@
+import numpy as np
+import traci
+import traci.constants as tc
+
+# Traffic light variables the scheduler needs, received with the sensors' TLS subscriptions
+SCHEDULE_TLS_VARIABLES = [tc.TL_CURRENT_PHASE, tc.TL_NEXT_SWITCH]
+
+
+class ControlScheduler:
+    """
+    Wakes each traffic light's controller only at its decision points.
+
+    Every TLS has a wake time. When it is due, its current phase and next switch time
+    are read and it gets a new wake time, the earliest of:
+    - the start of its next phase (its getNextSwitch() time),
+    - interval seconds from now, while its current phase is still undecided,
+    - lookahead seconds before its phase ends, while the phase is still undecided.
+    A TLS whose phase has been decided sleeps until the next phase starts. Finding
+    the due lights is one vectorized comparison, so lights that are mid-phase with
+    nothing to decide cost no Python work and no sensor reads that step.
+
+    Parameters:
+    - tls_ids: The traffic lights to schedule, in the controller's row order.
+    - sensors: The TrafficSensors the phase and next switch time are subscribed through.
+    - interval: Seconds between decisions within an undecided phase. None decides only at phase starts and deadlines.
+    - lookahead: Seconds before a phase ends at which it is decided once more. None disables deadline wake-ups.
+    - connection: The traci module or a labelled traci connection.
+    """
+
+    def __init__(self, tls_ids, sensors, interval=1, lookahead=None, connection=traci):
+        self.tls_ids = list(tls_ids)
+        self.sensors = sensors
+        self.interval = interval
+        self.lookahead = lookahead
+        self.connection = connection
+        self.wake_times = np.full(len(self.tls_ids), -np.inf)  # Every light decides on the first step
+        self.next_switch = np.full(len(self.tls_ids), np.inf)
+        self.phases = np.full(len(self.tls_ids), -1, dtype=np.int64)
+        self.wake_ups = 0  # Total TLS wake-ups, to compare against steps x lights
+
+    def __len__(self):
+        return len(self.tls_ids)
+
+    def get_state(self):
+        # Returns the wake times and last readings of every light, e.g. for a snapshot
+        return {
+            "wake_times": self.wake_times.copy(),
+            "next_switch": self.next_switch.copy(),
+            "phases": self.phases.copy(),
+            "wake_ups": self.wake_ups,
+        }
+
+    def set_state(self, state):
+        # Restores the schedule from get_state()
+        self.wake_times[:] = state["wake_times"]
+        self.next_switch[:] = state["next_switch"]
+        self.phases[:] = state["phases"]
+        self.wake_ups = state["wake_ups"]
+
+    def subscribe(self):
+        """
+        Subscribes every scheduled light to its phase and next switch time, and the simulation to its time.
+        """
+        for tls_id in self.tls_ids:
+            self.sensors.add_subscription("trafficlight", tls_id, SCHEDULE_TLS_VARIABLES)
+        self.sensors.add_subscription("simulation", "", [tc.VAR_TIME])
+
+    def now(self):
+        # Returns the current simulation time in seconds
+        time = self.sensors.get_simulation_value(tc.VAR_TIME)
+        return time if time is not None else self.connection.simulation.getTime()
+
+    def due(self):
+        """
+        Finds the lights whose wake time has come and reads their phase and next switch time.
+
+        Returns:
+        - rows: Indices into tls_ids of the due lights.
+        - phases: Their current phase indices.
+        """
+        rows = np.flatnonzero(self.wake_times <= self.now())
+        tls_results = self.sensors.tls_results
+        for row in rows:
+            tls_id = self.tls_ids[row]
+            results = tls_results.get(tls_id)
+            if results is None or tc.TL_NEXT_SWITCH not in results:
+                self.phases[row] = self.connection.trafficlight.getPhase(tls_id)
+                self.next_switch[row] = self.connection.trafficlight.getNextSwitch(tls_id)
+            else:
+                self.phases[row] = results[tc.TL_CURRENT_PHASE]
+                self.next_switch[row] = results[tc.TL_NEXT_SWITCH]
+        self.wake_ups += len(rows)
+        return rows, self.phases[rows]
+
+    def reschedule(self, rows, settled, changed=None):
+        """
+        Sets the next wake time of lights that were just evaluated.
+
+        Parameters:
+        - rows: The rows returned by due().
+        - settled: True per row where nothing is left to decide in the current phase.
+        - changed: True per row where the phase duration was just set. These wake on the
+          next step to pick up their new switch time.
+        """
+        now = self.now()
+        next_switch = self.next_switch[rows]
+        wake_times = next_switch.copy()
+        undecided = ~np.asarray(settled, dtype=bool)
+
+        if self.interval is not None:
+            wake_times = np.where(undecided, np.minimum(wake_times, now + self.interval), wake_times)
+        if self.lookahead is not None:
+            deadline = next_switch - self.lookahead
+            wake_times = np.where(undecided & (deadline > now), np.minimum(wake_times, deadline), wake_times)
+        if changed is not None:
+            wake_times = np.where(changed, now, wake_times)
+
+        # A wake time at or before now means the next step
+        self.wake_times[rows] = np.maximum(wake_times, np.nextafter(now, np.inf))
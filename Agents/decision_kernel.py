@@ -0,0 +1,284 @@
+import numpy as np
+import traci
+import traci.constants as tc
+
+# V6 control parameters (see V6adaptive_agent.py)
+MIN_GREEN = 5
+MAX_GREEN = 45
+MAX_GREEN_ADDED = 30
+MIN_GREEN_ADDED = 5
+# V6's optimization heuristics; this is their only definition, edit them here
+MIN_VEHICLES_THRESHOLD = 50  # Minimum vehicles in the simulation to consider optimization
+TLS_QUEUE_THRESHOLD = 5  # High total queue threshold to trigger optimization
+MIN_AVG_SPEED = 15.0  # Minimum average speed in m/s to justify optimization
+MIN_EXTRA_GREEN = 3  # Green extensions of this many seconds or less are not applied
+MIN_RED_FACTOR = 0.7  # Red phases are shortened to at most 70% of their duration
+
+NOT_ADJUSTED = -1  # Adjusted phase of a TLS whose current phase has not been adjusted
+
+
+def decide_durations(
+    queues,
+    road_mask,
+    major_green,
+    durations,
+    phase_counts,
+    phases,
+    avg_speeds,
+    total_vehicles,
+    adjusted,
+    min_green=MIN_GREEN,
+    max_green=MAX_GREEN,
+    min_green_added=MIN_GREEN_ADDED,
+    max_green_added=MAX_GREEN_ADDED,
+):
+    """
+    Applies V6's per-intersection rules to every traffic light at once.
+
+    For each TLS that should be optimized and whose current phase has not been adjusted
+    yet, the road with the highest queue (the first one on ties) decides: if it has a
+    priority green in the current phase, the phase is extended by up to
+    max_green_added - min_green_added seconds, otherwise the phase is shortened to as
+    little as 70% of its duration. These are V6's should_optimize() and
+    calculate_dynamic_durations() rules, applied to all intersections as arrays.
+
+    Parameters:
+    - queues: (num_tls, max_roads) halting vehicles per road, in topology road order.
+    - road_mask: (num_tls, max_roads) True where a TLS has a road.
+    - major_green: (num_tls, max_phases, max_roads) True where a road has a priority green in a phase.
+    - durations: (num_tls, max_phases) fixed phase durations.
+    - phase_counts: (num_tls,) phases in each fixed program.
+    - phases: (num_tls,) current phase indices.
+    - avg_speeds: (num_tls,) vehicle-weighted mean speeds on the controlled edges.
+    - total_vehicles: Vehicles in the network.
+    - adjusted: (num_tls,) phase index last adjusted per TLS, or NOT_ADJUSTED.
+
+    Returns:
+    - new_durations: (num_tls,) float durations, valid where apply is True.
+    - apply: (num_tls,) True where setPhaseDuration() should be called.
+    - adjusted: (num_tls,) the updated adjusted phase indices.
+    """
+    rows = np.arange(len(phases))
+    valid_phase = phases < phase_counts
+    phase_index = np.where(valid_phase, phases, 0)
+
+    queues = np.where(road_mask, queues, 0)
+    total_queue = queues.sum(axis=1)
+    optimize = (total_vehicles >= MIN_VEHICLES_THRESHOLD) & (
+        (total_queue > TLS_QUEUE_THRESHOLD) | (avg_speeds < MIN_AVG_SPEED)
+    )
+    optimize &= valid_phase & road_mask.any(axis=1)
+
+    # A phase change resets the adjustment; a phase that was already adjusted is skipped
+    candidates = optimize & (adjusted != phases)
+    adjusted = np.where(candidates, NOT_ADJUSTED, adjusted)
+
+    highest_road = np.argmax(np.where(road_mask, queues, -1), axis=1)
+    highest_queue = queues[rows, highest_road]
+    is_green = major_green[rows, phase_index, highest_road]
+    duration = durations[rows, phase_index]
+
+    queue_factor = highest_queue / np.maximum(total_queue, 1)
+    extra_green_time = (queue_factor * (max_green_added - min_green_added)).astype(np.int64)
+    less_red_time = np.maximum(MIN_RED_FACTOR, 1 - queue_factor * 0.5)
+
+    red_duration = np.maximum(min_green, duration * less_red_time)
+    green_duration = np.minimum(max_green, duration + extra_green_time)
+
+    new_durations = np.where(is_green, green_duration, red_duration)
+    apply = candidates & np.where(is_green, extra_green_time > MIN_EXTRA_GREEN, duration - red_duration > 0)
+    adjusted = np.where(apply, phases, adjusted)
+    return new_durations, apply, adjusted
+
+
+class DecisionKernel:
+    """
+    V6 control decisions for every traffic light as one batch of NumPy operations.
+
+    The static layout - which lanes feed which road slot, which edges feed which TLS,
+    phase durations and priority-green roads per phase - is flattened into arrays
+    once. Each step, sensor readings are gathered into (num_tls, num_roads) arrays,
+    decide() runs the rules over all intersections at once, and only the TLS whose
+    duration changes cost a TraCI call.
+
+    Parameters:
+    - tls_ids: The traffic lights to control. Those missing from phase_plan are skipped.
+    - topology: The IntersectionTopology of the running network.
+    - phase_plan: The PhasePlan with the fixed programs.
+    - min_green, max_green, min_green_added, max_green_added: The V6 control parameters.
+    """
+
+    def __init__(
+        self,
+        tls_ids,
+        topology,
+        phase_plan,
+        min_green=MIN_GREEN,
+        max_green=MAX_GREEN,
+        min_green_added=MIN_GREEN_ADDED,
+        max_green_added=MAX_GREEN_ADDED,
+    ):
+        self.tls_ids = [tls_id for tls_id in tls_ids if tls_id in phase_plan]
+        self.min_green = min_green
+        self.max_green = max_green
+        self.min_green_added = min_green_added
+        self.max_green_added = max_green_added
+
+        num_tls = len(self.tls_ids)
+        self.max_roads = max((len(topology[tls_id].roads) for tls_id in self.tls_ids), default=0) or 1
+        max_phases = max((len(phase_plan[tls_id]) for tls_id in self.tls_ids), default=0) or 1
+
+        self.road_mask = np.zeros((num_tls, self.max_roads), dtype=bool)
+        self.major_green = np.zeros((num_tls, max_phases, self.max_roads), dtype=bool)
+        self.durations = np.zeros((num_tls, max_phases), dtype=np.float64)
+        self.phase_counts = np.zeros(num_tls, dtype=np.int64)
+        self.adjusted = np.full(num_tls, NOT_ADJUSTED, dtype=np.int64)
+
+        lane_ids, lane_slots = [], []  # Controlled lanes and the flat road slot each one adds to
+        edge_ids, edge_tls = [], []  # Controlled edges and the TLS row each one belongs to
+        edge_bounds = [0]  # The edges of row r are edge_ids[edge_bounds[r]:edge_bounds[r + 1]]
+        row_tls_ids, row_road_ids, row_slots = [], [], []  # One queue log row per road, in V6's order
+
+        for row, tls_id in enumerate(self.tls_ids):
+            tls_topology = topology[tls_id]
+            road_slot = {road_id: slot for slot, road_id in enumerate(tls_topology.roads)}
+            self.road_mask[row, : len(road_slot)] = True
+            for lane in tls_topology.unique_lanes:
+                lane_ids.append(lane)
+                lane_slots.append(row * self.max_roads + road_slot[tls_topology.lane_to_road[lane]])
+            for edge_id in tls_topology.edges:
+                edge_ids.append(edge_id)
+                edge_tls.append(row)
+            edge_bounds.append(len(edge_ids))
+            # Topology road order is the order get_road_queues() returns and V6 logs them in
+            for road_id in tls_topology.roads:
+                row_tls_ids.append(tls_id)
+                row_road_ids.append(road_id)
+                row_slots.append(row * self.max_roads + road_slot[road_id])
+
+            phases = phase_plan[tls_id]
+            self.phase_counts[row] = len(phases)
+            for phase in phases:
+                self.durations[row, phase.index] = phase.duration
+                for road_id in phase.major_green_roads:
+                    if road_id in road_slot:
+                        self.major_green[row, phase.index, road_slot[road_id]] = True
+
+        self.lane_ids = tuple(lane_ids)
+        self.lane_slots = np.array(lane_slots, dtype=np.int64)
+        self.edge_ids = tuple(edge_ids)
+        self.edge_tls = np.array(edge_tls, dtype=np.int64)
+        self.edge_bounds = np.array(edge_bounds, dtype=np.int64)
+        self.row_tls_ids = tuple(row_tls_ids)
+        self.row_road_ids = tuple(row_road_ids)
+        self.row_slots = np.array(row_slots, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.tls_ids)
+
+    def get_state(self):
+        # Returns the per-run decision state, e.g. for a snapshot
+        return {"adjusted": self.adjusted.copy()}
+
+    def set_state(self, state):
+        # Restores the decision state from get_state()
+        self.adjusted[:] = state["adjusted"]
+
+    def read_queues(self, sensors):
+        # Returns (num_tls, max_roads) halting vehicles per road from the sensors' lane subscriptions
+        lane_results = sensors.lane_results
+        halting = np.fromiter(
+            (lane_results.get(lane, {}).get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0) for lane in self.lane_ids),
+            dtype=np.float64,
+            count=len(self.lane_ids),
+        )
+        queues = np.bincount(self.lane_slots, weights=halting, minlength=len(self) * self.max_roads)
+        return queues.astype(np.int64).reshape(len(self), self.max_roads)
+
+    def queue_rows(self, queues):
+        # Returns the per-road queue lengths in the order V6 logs them
+        return queues.reshape(-1)[self.row_slots]
+
+    def read_avg_speeds(self, sensors, rows=None):
+        """
+        Computes the vehicle-weighted mean speed over each TLS's controlled edges.
+
+        Parameters:
+        - sensors: The TrafficSensors with the edge subscriptions.
+        - rows: TLS rows to read. Defaults to all.
+
+        Returns:
+        - One mean speed per row.
+        """
+        if rows is None:
+            edge_indices = np.arange(len(self.edge_ids))
+            edge_rows = self.edge_tls
+            num_rows = len(self)
+        else:
+            edge_indices = np.concatenate(
+                [np.arange(self.edge_bounds[row], self.edge_bounds[row + 1]) for row in rows] or [np.empty(0, np.int64)]
+            )
+            edge_rows = np.repeat(np.arange(len(rows)), self.edge_bounds[np.asarray(rows) + 1] - self.edge_bounds[rows])
+            num_rows = len(rows)
+
+        edge_results = sensors.edge_results
+        counts = np.zeros(len(edge_indices), dtype=np.float64)
+        speeds = np.zeros(len(edge_indices), dtype=np.float64)
+        for index, edge_index in enumerate(edge_indices):
+            results = edge_results.get(self.edge_ids[edge_index])
+            if results:
+                counts[index] = results[tc.LAST_STEP_VEHICLE_NUMBER]
+                speeds[index] = results[tc.LAST_STEP_MEAN_SPEED]
+        total_speed = np.bincount(edge_rows, weights=speeds * counts, minlength=num_rows)
+        total_vehicles = np.bincount(edge_rows, weights=counts, minlength=num_rows)
+        return np.divide(total_speed, total_vehicles, out=np.zeros(num_rows), where=total_vehicles > 0)
+
+    def read_phases(self, sensors):
+        # Returns (num_tls,) current phase indices
+        return np.fromiter((sensors.get_phase(tls_id) for tls_id in self.tls_ids), dtype=np.int64, count=len(self))
+
+    def decide(self, queues, avg_speeds, phases, total_vehicles, rows=None):
+        """
+        Runs the V6 rules over the traffic lights and records which phases were adjusted.
+
+        Parameters:
+        - queues: Halting vehicles per road and row, from read_queues().
+        - avg_speeds: Mean speed per row, from read_avg_speeds().
+        - phases: Current phase index per row, from read_phases().
+        - total_vehicles: Vehicles in the network.
+        - rows: TLS rows to decide for, e.g. those a ControlScheduler woke. The other
+          inputs then hold one entry per row in rows. Defaults to all traffic lights.
+
+        Returns:
+        - new_durations: Float duration per row, valid where apply is True.
+        - apply: True per row where the duration should be set.
+        """
+        if rows is None:
+            rows = slice(None)
+        new_durations, apply, self.adjusted[rows] = decide_durations(
+            queues,
+            self.road_mask[rows],
+            self.major_green[rows],
+            self.durations[rows],
+            self.phase_counts[rows],
+            phases,
+            avg_speeds,
+            total_vehicles,
+            self.adjusted[rows],
+            self.min_green,
+            self.max_green,
+            self.min_green_added,
+            self.max_green_added,
+        )
+        return new_durations, apply
+
+    def settled(self, phases, rows=None):
+        # Returns True per row where the current phase was already adjusted, so nothing is left to decide in it
+        adjusted = self.adjusted if rows is None else self.adjusted[rows]
+        return adjusted == phases
+
+    def apply(self, new_durations, apply, rows=None, connection=traci):
+        # Sets the new phase durations; one TraCI call per changed TLS
+        for index in np.flatnonzero(apply):
+            row = index if rows is None else rows[index]
+            connection.trafficlight.setPhaseDuration(self.tls_ids[row], float(new_durations[index]))
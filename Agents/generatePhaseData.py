@@ -82,11 +82,8 @@
 
 import json
 
-def create_adaptive_phases_json():
-    # Load the traffic light data
-    with open('traffic_light_data2c.json', 'r') as f:
-        tl_data = json.load(f)
-    
+def adaptive_phases_from(tl_data):
+    # Maps each traffic light's default program to phases with standardized durations
     adaptive_phases = {}
     
     for tl_id, tl_info in tl_data.items():
@@ -112,6 +109,15 @@ def create_adaptive_phases_json():
         
         adaptive_phases[tl_id] = adjusted_phases
     
+    return adaptive_phases
+
+def create_adaptive_phases_json():
+    # Load the traffic light data
+    with open('traffic_light_data2c.json', 'r') as f:
+        tl_data = json.load(f)
+    
+    adaptive_phases = adaptive_phases_from(tl_data)
+    
     # Save to JSON file
     with open('adaptive_fixed_phases.json', 'w') as f:
         json.dump(adaptive_phases, f, indent=2)
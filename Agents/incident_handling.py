@@ -1,9 +1,11 @@
 import traceback
 from Testers.performance_testing_AD import gather_performance_data
 import traci
+import traci.constants as tc
 import os
 import json
 import sumolib
+import numpy as np
 import pandas as pd
 from traci._trafficlight import Logic, Phase
 import random
@@ -20,6 +22,314 @@ RESPONSE_STRATEGIES = {
 
 # Thresholds for incident detection
 SURGE_QUEUE_THRESHOLD = 30  # Queue length above which a sudden surge is suspected
+SURGE_RATE_THRESHOLD = 1.5  # Halting vehicles added per step, averaged over the rate window, that flag a growing queue
+SURGE_RATE_WINDOW = 10  # Steps the queue growth rate is measured over
+
+# Incident states, in the order an incident goes through them
+DRAINING = "draining"  # Closed to new vehicles, waiting for the vehicles on the edge to leave
+CLOSED = "closed"  # Empty and closed for the rest of the incident's duration
+REOPENING = "reopening"  # Being opened again; retried every tick until it succeeds
+
+OPEN_TRAVEL_TIME = 25  # Travel time estimate restored when an edge reopens
+CLOSED_TRAVEL_TIME = 99999  # Travel time estimate that routes vehicles around a closed edge
+
+
+class Incident:
+    """
+    A road closure on one edge, advanced by IncidentManager.tick().
+
+    Parameters:
+    - edge_id: The ID of the closed edge.
+    - duration: Steps the edge stays closed once it has been cleared.
+    - start_step: The simulation step the closure started at.
+    """
+
+    def __init__(self, edge_id, duration, start_step):
+        self.edge_id = edge_id
+        self.duration = duration
+        self.start_step = start_step
+        self.state = DRAINING
+        self.remaining = duration  # Closed steps left
+        self.lane_ids = []
+
+
+class IncidentManager:
+    """
+    Runs road closures as incremental state machines alongside the agent's main loop.
+
+    Each closure goes draining -> closed -> reopening, and tick() advances every active
+    closure by one step, so the controller keeps sensing and adjusting phases during an
+    incident. Several edges can be closed at once; a tick only costs work per active incident.
+
+    Parameters:
+    - sensors: TrafficSensors to read edge vehicle counts from, if any. Falls back to one TraCI call per incident.
+    - connection: The traci module or a labelled traci connection.
+    - route_index: RouteIndex to find the vehicles routed over a closed edge, if any.
+      Falls back to checking the route of every vehicle in the network.
+    """
+
+    def __init__(self, sensors=None, connection=traci, route_index=None):
+        self.sensors = sensors
+        self.connection = connection
+        self.route_index = route_index
+        self.incidents = {}  # Edge ID -> active Incident
+
+    def __len__(self):
+        return len(self.incidents)
+
+    def is_active(self, edge_id):
+        # Returns True while an edge has a closure in progress
+        return edge_id in self.incidents
+
+    def get_state(self):
+        # Returns the active closures, e.g. for a snapshot
+        return {"incidents": dict(self.incidents)}
+
+    def set_state(self, state):
+        """
+        Restores the active closures from get_state() and blocks their edges again.
+        SUMO state files do not keep lane permissions or adapted travel times.
+
+        Parameters:
+        - state: Dict returned by get_state().
+        """
+        self.incidents = dict(state["incidents"])
+        for incident in self.incidents.values():
+            try:
+                for lane_id in incident.lane_ids:
+                    self.connection.lane.setDisallowed(lane_id, ["all"])
+                self.connection.edge.adaptTraveltime(incident.edge_id, CLOSED_TRAVEL_TIME)
+                if self.sensors is not None:
+                    self.sensors.add_subscription("edge", incident.edge_id, [tc.LAST_STEP_VEHICLE_NUMBER])
+            except Exception as e:
+                print(f"Error restoring the closure of edge {incident.edge_id}: {e}")
+                traceback.print_exc()
+
+    def close_edge(self, edge_id, duration, step):
+        """
+        Starts a closure: new vehicles are kept off the edge and vehicles routed over it are rerouted.
+        Vehicles already on the edge may leave before the closed duration starts counting.
+
+        Parameters:
+        - edge_id: The ID of the edge to close.
+        - duration: Steps to keep the edge closed once it has been cleared.
+        - step: The current simulation step.
+
+        Returns:
+        - The Incident, or None if the edge could not be closed.
+        """
+        if edge_id in self.incidents:
+            return self.incidents[edge_id]
+
+        incident = Incident(edge_id, duration, step)
+        try:
+            # 1. Prevent new vehicles from entering the edge
+            num_lanes = self.connection.edge.getLaneNumber(edge_id)
+            incident.lane_ids = [f"{edge_id}_{lane_index}" for lane_index in range(num_lanes)]
+            for lane_id in incident.lane_ids:
+                self.connection.lane.setDisallowed(lane_id, ["all"])  # Block new entries
+            self.connection.edge.adaptTraveltime(edge_id, CLOSED_TRAVEL_TIME)
+
+            print(f"Edge {edge_id} is now restricted to existing vehicles.")
+
+            # 2. Recalculate routes for all vehicles in the network that pass by the edge to be blocked
+            if self.route_index is not None:
+                reroute_vehicles(self.route_index, edge_id)
+            else:
+                for vehicle_id in self.connection.vehicle.getIDList():
+                    current_route = self.connection.vehicle.getRoute(vehicle_id)
+                    if edge_id in current_route:
+                        print(f"Current route for vehicle {vehicle_id}: {current_route}")
+                        self.connection.vehicle.rerouteTraveltime(vehicle_id)
+                        print(f"New route for vehicle {vehicle_id}: {self.connection.vehicle.getRoute(vehicle_id)}")
+
+            # Drain through the sensors' subscriptions instead of polling the edge every step
+            if self.sensors is not None:
+                self.sensors.add_subscription("edge", edge_id, [tc.LAST_STEP_VEHICLE_NUMBER])
+
+        except Exception as e:
+            print(f"Error during blocking edge {edge_id} at step {step}: {e}")
+            traceback.print_exc()
+            return None
+
+        self.incidents[edge_id] = incident
+        return incident
+
+    def tick(self, step):
+        """
+        Advances every active closure by one simulation step. Call once per step, after simulationStep().
+
+        Parameters:
+        - step: The current simulation step.
+
+        Returns:
+        - The incidents that ended this step.
+        """
+        finished = []
+        for incident in list(self.incidents.values()):
+            try:
+                if incident.state == DRAINING:
+                    # 3. Wait until all existing vehicles leave the edge
+                    if self._vehicle_number(incident.edge_id) == 0:
+                        incident.state = CLOSED
+                elif incident.state == CLOSED:
+                    # 4. Keep the edge blocked for the specified duration
+                    incident.remaining -= 1
+                if incident.state == CLOSED and incident.remaining <= 0:
+                    incident.state = REOPENING
+                if incident.state == REOPENING:
+                    # 5. Allow new vehicles to enter the edge again
+                    self._reopen(incident)
+                    del self.incidents[incident.edge_id]
+                    finished.append(incident)
+            except Exception as e:
+                print(f"Error during blocking edge {incident.edge_id} at step {step}: {e}")
+                traceback.print_exc()
+        return finished
+
+    def _vehicle_number(self, edge_id):
+        if self.sensors is not None:
+            vehicle_number = self.sensors.get_vehicle_number(edge_id)
+            if vehicle_number is not None:
+                return vehicle_number
+        return self.connection.edge.getLastStepVehicleNumber(edge_id)
+
+    def _reopen(self, incident):
+        for lane_id in incident.lane_ids:
+            self.connection.lane.setAllowed(lane_id, ["all"])  # Unblock new entries
+        self.connection.edge.adaptTraveltime(incident.edge_id, OPEN_TRAVEL_TIME)
+        print(f"Edge {incident.edge_id} is now open to all vehicles again.")
+
+
+class IncidentDetector:
+    """
+    Network-wide incident detection that is cheap enough to run every step.
+
+    Halting counts come from edge subscriptions and are read into one NumPy vector per
+    step. Surges are flagged with vectorized tests: an edge surges when its queue is
+    above the queue threshold, or above half of it while growing faster than the rate
+    threshold over the rate window. Closed edges are taken from the IncidentManager
+    instead of querying lane permissions. Only onsets are reported, so an incident is
+    handled once rather than every step it lasts.
+
+    Parameters:
+    - sensors: The TrafficSensors the halting counts are subscribed through.
+    - edge_ids: Edges to watch. Defaults to every non-internal edge in the network.
+    - incident_manager: IncidentManager whose active closures are reported as road closures, if any.
+      Pass it to handle_incidents() too, as its closures have already rerouted their vehicles.
+    - queue_threshold: Halting vehicles above which an edge surges.
+    - rate_threshold: Halting vehicles added per step that flag a growing queue.
+    - rate_window: Steps the growth rate is measured over.
+    - connection: The traci module or a labelled traci connection.
+    """
+
+    def __init__(
+        self,
+        sensors,
+        edge_ids=None,
+        incident_manager=None,
+        queue_threshold=SURGE_QUEUE_THRESHOLD,
+        rate_threshold=SURGE_RATE_THRESHOLD,
+        rate_window=SURGE_RATE_WINDOW,
+        connection=traci,
+    ):
+        self.sensors = sensors
+        self.connection = connection
+        if edge_ids is None:
+            edge_ids = [edge_id for edge_id in connection.edge.getIDList() if not edge_id.startswith(":")]
+        self.edge_ids = list(edge_ids)
+        self.incident_manager = incident_manager
+        self.queue_threshold = queue_threshold
+        self.rate_threshold = rate_threshold
+        self.rate_window = max(1, rate_window)
+
+        edges = len(self.edge_ids)
+        self.halting = np.zeros(edges, dtype=np.int32)
+        self.surging = np.zeros(edges, dtype=bool)  # Edges flagged on the previous step
+        self.closed_edges = set()  # Closures already reported
+        self._history = np.zeros((self.rate_window, edges), dtype=np.int32)  # Ring buffer of past halting counts
+        self._steps = 0
+
+    def get_state(self):
+        # Returns the halting history and reported incidents, e.g. for a snapshot
+        return {
+            "halting": self.halting.copy(),
+            "surging": self.surging.copy(),
+            "closed_edges": set(self.closed_edges),
+            "history": self._history.copy(),
+            "steps": self._steps,
+        }
+
+    def set_state(self, state):
+        # Restores the detector from get_state() of a detector watching the same edges
+        self.halting[:] = state["halting"]
+        self.surging[:] = state["surging"]
+        self.closed_edges = set(state["closed_edges"])
+        self._history[:] = state["history"]
+        self._steps = state["steps"]
+
+    def subscribe(self):
+        """
+        Subscribes every watched edge to its halting count. Call once after sensors.subscribe().
+        """
+        for edge_id in self.edge_ids:
+            self.sensors.add_subscription("edge", edge_id, [tc.LAST_STEP_VEHICLE_HALTING_NUMBER])
+
+    def detect(self):
+        """
+        Checks this step's halting counts and closures. Call once per step, after simulationStep().
+
+        Returns:
+        - A list of (incident type, edge ID) for surges and closures that started this step.
+        """
+        edge_results = self.sensors.edge_results
+        self.halting[:] = np.fromiter(
+            (edge_results.get(edge_id, {}).get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0) for edge_id in self.edge_ids),
+            dtype=np.int32,
+            count=len(self.edge_ids),
+        )
+
+        # The oldest row of the ring buffer holds the counts from rate_window steps ago
+        slot = self._steps % self.rate_window
+        if self._steps >= self.rate_window:
+            rate = (self.halting - self._history[slot]) / self.rate_window
+            growing = (rate >= self.rate_threshold) & (self.halting > self.queue_threshold // 2)
+        else:
+            growing = False
+        self._history[slot] = self.halting
+        self._steps += 1
+
+        surging = (self.halting > self.queue_threshold) | growing
+        incidents = [("sudden_surge", self.edge_ids[index]) for index in np.flatnonzero(surging & ~self.surging)]
+        self.surging = surging
+
+        if self.incident_manager is not None:
+            closed_edges = set(self.incident_manager.incidents)
+            incidents.extend(("road_closure", edge_id) for edge_id in closed_edges - self.closed_edges)
+            self.closed_edges = closed_edges
+        return incidents
+
+
+def reroute_vehicles(route_index, edge_id):
+    """
+    Reroutes the vehicles whose remaining route passes an edge, found with one index lookup.
+
+    Parameters:
+    - route_index: The RouteIndex of the running simulation.
+    - edge_id: The ID of the edge to route around.
+
+    Returns:
+    - The IDs of the rerouted vehicles.
+    """
+    vehicle_ids = route_index.vehicles_on(edge_id)
+    for vehicle_id in vehicle_ids:
+        try:
+            print(f"Current route for vehicle {vehicle_id}: {route_index.route_of(vehicle_id)}")
+            print(f"New route for vehicle {vehicle_id}: {route_index.reroute(vehicle_id)}")
+        except traci.TraCIException as e:
+            print(f"Error rerouting vehicle {vehicle_id} around edge {edge_id}: {e}")
+    return vehicle_ids
+
 
 def random_block_edge(step, edge_id='59', duration=50):
     """
@@ -43,48 +353,24 @@ def block_edge(step, edge_id, duration=50):
     Blocks an edge dynamically, allowing existing vehicles to depart first, 
     while preventing new vehicles from entering.
 
+    Steps the simulation itself until the edge reopens. Agents that keep controlling
+    during the closure should use an IncidentManager instead.
+
     Parameters:
     - edge_id (str): The ID of the edge to block.
     - duration (int): Duration (in simulation steps) to keep the edge blocked after clearing.
     """
-    try:
-        # 1. Prevent new vehicles from entering the edge
-        num_lanes = traci.edge.getLaneNumber(edge_id)
-        for lane_index in range(num_lanes):
-            lane_id = f"{edge_id}_{lane_index}"
-            traci.lane.setDisallowed(lane_id, ["all"])  # Block new entries
-            traci.edge.adaptTraveltime(edge_id, 99999)
-
-        print(f"Edge {edge_id} is now restricted to existing vehicles.")
-
-        # 2. Recalculate routes for all vehicles in the network that pass by the edge to be blocked
-        vehicle_ids = traci.vehicle.getIDList()
-        for vehicle_id in vehicle_ids:
-            current_route = traci.vehicle.getRoute(vehicle_id)
-            if edge_id in current_route:
-                print(f"Current route for vehicle {vehicle_id}: {current_route}")
-                traci.vehicle.rerouteTraveltime(vehicle_id)
-                print(f"New route for vehicle {vehicle_id}: {traci.vehicle.getRoute(vehicle_id)}")
-
-        # 3. Wait until all existing vehicles leave the edge
-        while traci.edge.getLastStepVehicleNumber(edge_id) > 0:
-            traci.simulationStep()
-            step += 1
-            gather_performance_data()
+    manager = IncidentManager()
+    if manager.close_edge(edge_id, duration, step) is None:
+        return step
 
-        # 4. Keep the edge blocked for the specified duration
-        for _ in range(duration):
+    try:
+        manager.tick(step)
+        while manager.is_active(edge_id):
             traci.simulationStep()
             step += 1
             gather_performance_data()
-
-        # 5. Allow new vehicles to enter the edge again
-        for lane_index in range(num_lanes):
-            lane_id = f"{edge_id}_{lane_index}"
-            traci.lane.setAllowed(lane_id, ["all"])  # Unblock new entries
-            traci.edge.adaptTraveltime(edge_id, 25)
-
-        print(f"Edge {edge_id} is now open to all vehicles again.")
+            manager.tick(step)
 
     except Exception as e:
         print(f"Error during blocking edge {edge_id} at step {step}: {e}")
@@ -128,7 +414,7 @@ def is_edge_blocked(edge_id):
         return False
 
 # A function for detecting incidents
-def detect_incidents():
+def detect_incidents(route_index=None):
     incidents = []
     for edge_id in traci.edge.getIDList():
         queue_length = traci.edge.getLastStepHaltingNumber(edge_id)
@@ -139,13 +425,19 @@ def detect_incidents():
             incidents.append(('road_closure', edge_id))
     
     if incidents:
-        handle_incidents(incidents)
+        handle_incidents(incidents, route_index)
     else:
         print("No incidents detected.")
 
-def handle_incidents(incidents):
+def handle_incidents(incidents, route_index=None, incident_manager=None):
     for incident_type, edge_id in incidents:
         strategy = RESPONSE_STRATEGIES[incident_type]
         if strategy == 'reroute':
             print(f"!! Detected {incident_type} on edge {edge_id}. !!")
+            # close_edge() already rerouted the vehicles routed over a managed closure
+            if incident_type == "road_closure" and incident_manager is not None and incident_manager.is_active(edge_id):
+                continue
             print("Rerouting...")
+            # Only the vehicles still routed over the edge need new routes
+            if route_index is not None:
+                reroute_vehicles(route_index, edge_id)
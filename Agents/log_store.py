@@ -0,0 +1,174 @@
+import os
+import re
+import time
+
+import pandas as pd
+
+# Supported log formats: plain CSV, or typed, compressed Parquet / Arrow IPC partitions
+LOG_FORMATS = ("csv", "parquet", "arrow")
+LOG_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+DATASET_FORMATS = {".parquet": "parquet", ".arrow": "ipc"}
+COMPRESSION = "zstd"
+
+# Partition files are named after the inclusive step range they hold
+PARTITION_PATTERN = re.compile(r"^steps_(\d+)_(\d+)(\.parquet|\.arrow)$")
+
+# Columns the loader filters on
+TLS_COLUMNS = ("TLS ID", "id")
+EDGE_COLUMN = "Edge ID"
+STEP_COLUMN = "Step"
+
+
+def import_pyarrow():
+    # pyarrow is only needed for the Parquet and Arrow formats
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("The parquet and arrow log formats require pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def check_log_format(log_format):
+    # Raises a ValueError for unknown log formats
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format {log_format!r}. Expected one of {LOG_FORMATS}")
+    return log_format
+
+
+def new_run_id():
+    # Returns a run ID from the current time, e.g. "20250114-093012"
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+def dataset_dir(log_path):
+    # Partitioned logs live in a directory named after the CSV file, e.g. Logs/road_queue_lengths/
+    return os.path.splitext(log_path)[0]
+
+
+def write_partition(frame, log_path, log_format, run_id, first_step, last_step):
+    """
+    Writes one step range of a log as a compressed, typed partition file.
+
+    Parameters:
+    - frame: The rows to write. Categorical columns are stored dictionary-encoded.
+    - log_path: The CSV path the log replaces, e.g. "Logs/road_queue_lengths.csv".
+    - log_format: "parquet" or "arrow".
+    - run_id: The run the rows belong to.
+    - first_step: The first step in the frame.
+    - last_step: The last step in the frame.
+
+    Returns:
+    - The path of the written file.
+    """
+    pyarrow = import_pyarrow()
+    directory = os.path.join(dataset_dir(log_path), f"run={run_id}")
+    os.makedirs(directory, exist_ok=True)
+    file_path = os.path.join(
+        directory, f"steps_{int(first_step):08d}_{int(last_step):08d}{LOG_EXTENSIONS[log_format]}"
+    )
+
+    table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+    if log_format == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, file_path, compression=COMPRESSION)
+    else:
+        import pyarrow.feather as feather
+
+        feather.write_feather(table, file_path, compression=COMPRESSION)
+    return file_path
+
+
+def list_partitions(log_path, run_ids=None, steps=None):
+    """
+    Lists the partition files of a log, skipping runs and step ranges outside the selection.
+
+    Parameters:
+    - log_path: The CSV path the log replaces, or its dataset directory.
+    - run_ids: Runs to include. Defaults to all runs.
+    - steps: Inclusive (first, last) step window. Defaults to all steps.
+
+    Returns:
+    - A list of partition file paths, ordered by run and step.
+    """
+    root = dataset_dir(log_path)
+    if not os.path.isdir(root):
+        return []
+
+    partitions = []
+    for run_dir in sorted(os.listdir(root)):
+        if not run_dir.startswith("run="):
+            continue
+        if run_ids is not None and run_dir[len("run="):] not in run_ids:
+            continue
+        for name in sorted(os.listdir(os.path.join(root, run_dir))):
+            match = PARTITION_PATTERN.match(name)
+            if not match:
+                continue
+            first_step, last_step = int(match.group(1)), int(match.group(2))
+            if steps is not None and (last_step < steps[0] or first_step > steps[1]):
+                continue
+            partitions.append(os.path.join(root, run_dir, name))
+    return partitions
+
+
+def load_log(log_path, run_ids=None, tls_ids=None, edge_ids=None, steps=None, columns=None):
+    """
+    Reads a partitioned Parquet / Arrow log back into a DataFrame.
+
+    Only the partitions overlapping the selected runs and step window are opened, and
+    the TLS, edge and step filters are pushed down to the file readers.
+
+    Parameters:
+    - log_path: The CSV path the log replaces (e.g. "Logs/road_queue_lengths.csv"), or its dataset directory.
+    - run_ids: Runs to read. Defaults to all runs.
+    - tls_ids: TLS IDs to keep, for logs with a "TLS ID" or "id" column.
+    - edge_ids: Edge IDs to keep, for logs with an "Edge ID" column.
+    - steps: Inclusive (first, last) step window.
+    - columns: Columns to read. Defaults to all columns plus the "run" partition column.
+
+    Returns:
+    - A DataFrame with categorical ID columns.
+    """
+    import_pyarrow()
+    import pyarrow.dataset as ds
+
+    partitions = list_partitions(log_path, run_ids, steps)
+    if not partitions:
+        return pd.DataFrame(columns=columns)
+
+    # Parquet and Arrow partitions may be mixed; read each format as its own dataset
+    by_format = {}
+    for path in partitions:
+        by_format.setdefault(DATASET_FORMATS[os.path.splitext(path)[1]], []).append(path)
+
+    frames = []
+    for dataset_format, paths in by_format.items():
+        dataset = ds.dataset(
+            paths,
+            format=dataset_format,
+            partitioning=ds.partitioning(flavor="hive"),
+            partition_base_dir=dataset_dir(log_path),
+        )
+        names = dataset.schema.names
+
+        row_filter = None
+        if steps is not None and STEP_COLUMN in names:
+            row_filter = (ds.field(STEP_COLUMN) >= steps[0]) & (ds.field(STEP_COLUMN) <= steps[1])
+        if tls_ids is not None:
+            tls_column = next((column for column in TLS_COLUMNS if column in names), None)
+            if tls_column is None:
+                raise ValueError(f"{log_path} has no TLS ID column to filter on")
+            tls_filter = ds.field(tls_column).isin(list(tls_ids))
+            row_filter = tls_filter if row_filter is None else row_filter & tls_filter
+        if edge_ids is not None:
+            if EDGE_COLUMN not in names:
+                raise ValueError(f"{log_path} has no {EDGE_COLUMN} column to filter on")
+            edge_filter = ds.field(EDGE_COLUMN).isin(list(edge_ids))
+            row_filter = edge_filter if row_filter is None else row_filter & edge_filter
+
+        frames.append(dataset.to_table(columns=columns, filter=row_filter).to_pandas())
+
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Agents.generatePhaseData import adaptive_phases_from
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cache_dir = os.path.join(repo_dir, ".cache", "net_compiler")
+tls_data_file = "traffic_light_data2c.json"
+adaptive_phases_file = "adaptive_fixed_phases.json"
+
+# Bump when the compiled output changes, so stale cache entries are not reused
+COMPILER_VERSION = 1
+
+
+def file_sha256(path, block_size=1 << 20):
+    # Returns the SHA-256 hex digest of a file's contents
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def resolve_net_file(path):
+    # Returns the network file of a .sumocfg, or path itself if it is a network file
+    if not path.endswith(".sumocfg"):
+        return path
+    root = ET.parse(path).getroot()
+    net_file = root.find("./input/net-file")
+    if net_file is None:
+        raise ValueError(f"{path} has no <net-file> entry")
+    return os.path.join(os.path.dirname(os.path.abspath(path)), net_file.get("value"))
+
+
+def parse_traffic_lights(net_file):
+    """
+    Reads the controlled lanes and default programs of every traffic light from a .net.xml.
+
+    Streams the file, so only <tlLogic> and TLS-controlled <connection> elements are kept.
+    The result matches what gather_TLS_data2c.py collects through TraCI: controlled lanes
+    follow the link indices, and the default program is the first by program ID, as
+    getAllProgramLogics()[0] returns it. Programs from additional files are not included.
+
+    Parameters:
+    - net_file: Path of the SUMO network file.
+
+    Returns:
+    - Dict mapping TLS IDs to the traffic_light_data2c.json entry of each traffic light.
+    """
+    programs = {}  # TLS ID -> {program ID: [phase dicts]}
+    links = {}  # TLS ID -> {link index: incoming lane}
+
+    for _, element in ET.iterparse(net_file, events=("end",)):
+        if element.tag == "tlLogic":
+            phases = [
+                {"duration": float(phase.get("duration")), "state": phase.get("state")}
+                for phase in element.iter("phase")
+            ]
+            programs.setdefault(element.get("id"), {})[element.get("programID")] = phases
+            element.clear()
+        elif element.tag == "connection":
+            tls_id = element.get("tl")
+            if tls_id is not None:
+                lane = f"{element.get('from')}_{element.get('fromLane')}"
+                links.setdefault(tls_id, {})[int(element.get("linkIndex"))] = lane
+            element.clear()
+        elif element.tag in ("edge", "junction"):
+            element.clear()
+
+    tls_data = {}
+    for tls_id, tls_programs in programs.items():
+        tls_links = links.get(tls_id, {})
+        controlled_lanes = [tls_links[index] for index in sorted(tls_links)]
+
+        # Group lanes by their connecting road
+        roads = {}
+        for lane in controlled_lanes:
+            roads.setdefault(lane.rsplit("_", 1)[0], []).append(lane)
+
+        default_phases = tls_programs[min(tls_programs)]
+        tls_data[tls_id] = {
+            "controlled_lanes": controlled_lanes,
+            "roads": roads,
+            "default_program": {
+                "phases": default_phases,
+                "cycle_time": sum(phase["duration"] for phase in default_phases),
+            },
+            "lane_queues": {lane: 0 for lane in controlled_lanes},
+            "road_queues": {road_id: 0 for road_id in roads},
+        }
+    return tls_data
+
+
+def compile_network(net_file, tls_output=tls_data_file, phases_output=adaptive_phases_file, use_cache=True):
+    """
+    Compiles a network's traffic light data and adaptive phases without starting SUMO.
+
+    Results are cached under .cache/net_compiler/ by the SHA-256 of the network file,
+    so an unchanged network is only parsed once.
+
+    Parameters:
+    - net_file: Path of a .net.xml, or a .sumocfg whose network to compile.
+    - tls_output: Where to write the traffic_light_data2c.json artifact. None skips it.
+    - phases_output: Where to write the adaptive_fixed_phases.json artifact. None skips it.
+    - use_cache: Read and write the cache.
+
+    Returns:
+    - (tls_data, adaptive_phases) dicts.
+    """
+    net_file = resolve_net_file(net_file)
+    cache_file = os.path.join(cache_dir, f"{file_sha256(net_file)}-v{COMPILER_VERSION}.json")
+
+    compiled = None
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r") as f:
+                compiled = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable cache entry {cache_file}: {e}")
+
+    if compiled is None:
+        tls_data = parse_traffic_lights(net_file)
+        compiled = {"tls_data": tls_data, "adaptive_phases": adaptive_phases_from(tls_data)}
+        if use_cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_file, "w") as f:
+                json.dump(compiled, f)
+
+    if tls_output is not None:
+        with open(tls_output, "w") as f:
+            json.dump(compiled["tls_data"], f, indent=2)
+    if phases_output is not None:
+        with open(phases_output, "w") as f:
+            json.dump(compiled["adaptive_phases"], f, indent=2)
+    return compiled["tls_data"], compiled["adaptive_phases"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile traffic light data and adaptive phases from a SUMO network.")
+    parser.add_argument("network", help="A .net.xml file or a .sumocfg")
+    parser.add_argument("--tls-output", default=tls_data_file, help="Traffic light data JSON")
+    parser.add_argument("--phases-output", default=adaptive_phases_file, help="Adaptive fixed phases JSON")
+    parser.add_argument("--no-cache", action="store_true", help="Parse the network even if it is cached")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    tls_data, _ = compile_network(args.network, args.tls_output, args.phases_output, not args.no_cache)
+    print(
+        f"Compiled {len(tls_data)} traffic lights in {time.perf_counter() - started:.3f} s: "
+        f"{args.tls_output}, {args.phases_output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
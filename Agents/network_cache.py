@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import pickle
+from collections import namedtuple
+
+import traci
+
+from Agents.net_compiler import file_sha256, parse_traffic_lights, resolve_net_file
+from Agents.phase_plan import PhasePlan
+from Agents.topology import IntersectionTopology
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cache_dir = os.path.join(repo_dir, ".cache", "network_plans")
+
+# Bump when IntersectionTopology, PhasePlan or the cached layout change, so old entries are rebuilt
+CACHE_VERSION = 1
+
+# Everything an agent derives from the network and its fixed phases before the first step
+NetworkPlan = namedtuple(
+    "NetworkPlan",
+    [
+        "topology",  # IntersectionTopology of every traffic light in the network
+        "phase_plan",  # PhasePlan compiled against the topology
+        "fixed_phases",  # The raw {"duration", "state"} phases, as read from the phases file
+    ],
+)
+
+
+def cache_key(net_file, phases_file):
+    # Returns the cache key of a network and phases file pair
+    digest = hashlib.sha256()
+    digest.update(file_sha256(net_file).encode())
+    digest.update(file_sha256(phases_file).encode())
+    digest.update(str(CACHE_VERSION).encode())
+    return digest.hexdigest()
+
+
+def compile_network_plan(net_file, phases_file):
+    # Builds the NetworkPlan from the network and phases files without starting SUMO
+    tls_data = parse_traffic_lights(net_file)
+    topology = IntersectionTopology({tls_id: data["controlled_lanes"] for tls_id, data in tls_data.items()})
+    with open(phases_file, "r") as f:
+        fixed_phases = json.load(f)
+    return NetworkPlan(topology, PhasePlan(fixed_phases, topology), fixed_phases)
+
+
+def load_network_plan(network, phases_file, tls_ids=None, connection=traci, use_cache=True):
+    """
+    Loads the topology and compiled phase plan of a network, from the cache when possible.
+
+    Entries live in .cache/network_plans/ keyed by the SHA-256 of the network file and
+    the phases file, so editing either rebuilds the entry on the next start. A warm start
+    unpickles the ready-built structures and skips the JSON parse, the phase compilation
+    and the getControlledLanes() round trip per traffic light.
+
+    Parameters:
+    - network: The .sumocfg the run loads, or its .net.xml.
+    - phases_file: The fixed phases JSON, e.g. adaptive_fixed_phases.json.
+    - tls_ids: The traffic lights of the running simulation. If they differ from the
+      network file's, the plan is built through TraCI instead and not cached.
+    - connection: The traci module or a labelled traci connection.
+    - use_cache: Read and write the cache.
+
+    Returns:
+    - A NetworkPlan.
+    """
+    net_file = resolve_net_file(network)
+    cache_file = os.path.join(cache_dir, f"{cache_key(net_file, phases_file)}.pickle")
+
+    plan = None
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                plan = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            print(f"Rebuilding unreadable network cache entry {cache_file}: {e}")
+
+    if plan is None:
+        plan = compile_network_plan(net_file, phases_file)
+        if use_cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to a temporary file first, so concurrent runs never read a partial entry
+            temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(temporary_file, "wb") as f:
+                pickle.dump(plan, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file, cache_file)
+
+    if tls_ids is not None and set(tls_ids) != set(plan.topology.tls_ids):
+        print(f"Traffic lights of the running simulation differ from {net_file}; reading them through TraCI.")
+        topology = IntersectionTopology.from_traci(tls_ids, connection)
+        plan = NetworkPlan(topology, PhasePlan(plan.fixed_phases, topology), plan.fixed_phases)
+    return plan
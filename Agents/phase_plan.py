@@ -0,0 +1,128 @@
+import json
+from collections import namedtuple
+
+import numpy as np
+
+# Signal characters of a SUMO phase state grouped by colour
+GREEN_SIGNALS = "Gg"
+YELLOW_SIGNALS = "yYu"
+RED_SIGNALS = "rRs"
+
+# One phase of a traffic light's fixed program, with its green roads precomputed
+CompiledPhase = namedtuple(
+    "CompiledPhase",
+    [
+        "index",
+        "state",
+        "duration",
+        "green_roads",  # Roads with any green ('G' or 'g') signal
+        "major_green_roads",  # Roads with any priority green ('G') signal
+        "green_mask",  # Boolean array over signal indices
+        "yellow_mask",
+        "red_mask",
+    ],
+)
+
+
+def signal_mask(state, signals):
+    # Returns a read-only boolean array marking the signal indices whose state is in signals
+    mask = np.array([signal in signals for signal in state], dtype=bool)
+    mask.flags.writeable = False
+    return mask
+
+
+def compile_phase(index, phase, tls_topology):
+    """
+    Precomputes the green roads and signal masks of one phase.
+
+    Parameters:
+    - index: The phase index within the program.
+    - phase: Dict with the phase "state" and "duration".
+    - tls_topology: The TLSTopology of the traffic light the phase belongs to.
+
+    Returns:
+    - A CompiledPhase.
+    """
+    state = phase["state"]
+
+    green_roads = set()
+    major_green_roads = set()
+    for road_id, signal_indices in tls_topology.road_to_signal_indices.items():
+        # Signal indices beyond the state string belong to no phase signal
+        signals = [state[i] for i in signal_indices if i < len(state)]
+        if any(signal in GREEN_SIGNALS for signal in signals):
+            green_roads.add(road_id)
+        if "G" in signals:
+            major_green_roads.add(road_id)
+
+    return CompiledPhase(
+        index=index,
+        state=state,
+        duration=phase["duration"],
+        green_roads=frozenset(green_roads),
+        major_green_roads=frozenset(major_green_roads),
+        green_mask=signal_mask(state, GREEN_SIGNALS),
+        yellow_mask=signal_mask(state, YELLOW_SIGNALS),
+        red_mask=signal_mask(state, RED_SIGNALS),
+    )
+
+
+class PhasePlan:
+    """
+    Fixed phase programs compiled per traffic light and phase index.
+
+    Agents answer "is this road green in the current phase?" with a set lookup on the
+    compiled phase instead of scanning the phase state against the controlled lanes.
+
+    Parameters:
+    - fixed_phases: Dict mapping TLS IDs to their list of {"duration", "state"} phases,
+      as stored in adaptive_fixed_phases.json.
+    - topology: The IntersectionTopology of the running network. Traffic lights it does
+      not contain are skipped.
+    """
+
+    def __init__(self, fixed_phases, topology):
+        self._phases = {}
+        for tls_id, phases in fixed_phases.items():
+            if tls_id not in topology:
+                continue
+            self._phases[tls_id] = tuple(
+                compile_phase(index, phase, topology[tls_id]) for index, phase in enumerate(phases)
+            )
+
+    @classmethod
+    def from_file(cls, phases_file, topology):
+        # Loads and compiles a fixed phases JSON file
+        with open(phases_file, "r") as f:
+            return cls(json.load(f), topology)
+
+    def __getitem__(self, tls_id):
+        return self._phases[tls_id]
+
+    def __contains__(self, tls_id):
+        return tls_id in self._phases
+
+    def __iter__(self):
+        return iter(self._phases)
+
+    def __len__(self):
+        return len(self._phases)
+
+    def get_phase(self, tls_id, phase_index):
+        # Returns the compiled phase of a TLS at the given index
+        return self._phases[tls_id][phase_index]
+
+    def is_green(self, tls_id, phase_index, road_id, major_only=True):
+        """
+        Checks whether a road has a green signal in the given phase.
+
+        Parameters:
+        - tls_id: The ID of the traffic light.
+        - phase_index: The phase index within its program.
+        - road_id: The road to check.
+        - major_only: Only count priority green ('G') signals, as V4-V6 do.
+        """
+        phase = self._phases[tls_id][phase_index]
+        if major_only:
+            return road_id in phase.major_green_roads
+        return road_id in phase.green_roads
@@ -0,0 +1,351 @@
+import json
+from operator import itemgetter
+
+import numpy as np
+import traci
+
+# Domains whose subscription results are recorded; their objects are fixed for a whole run
+TRACE_DOMAINS = ("lane", "edge", "trafficlight", "simulation")
+
+
+class TraceRecorder(traci.StepListener):
+    """
+    Records the sensors' per-step subscription results into a compact binary trace.
+
+    Every numeric subscription value of the lane, edge, traffic light and simulation
+    domains becomes one column of a (steps, columns) matrix, integers and floats kept
+    apart so replayed values have TraCI's types. The vehicle count and simulation time
+    are recorded per step, and the network layout once, so a ReplayConnection can serve
+    the whole run without SUMO. Vehicle results and ID lists are not recorded.
+
+    Parameters:
+    - sensors: The TrafficSensors whose results are recorded. Register after sensors.subscribe().
+    - trace_file: Path of the .npz trace written by close().
+    - connection: The traci module or a labelled traci connection.
+    """
+
+    def __init__(self, sensors, trace_file, connection=traci):
+        self.sensors = sensors
+        self.trace_file = trace_file
+        self.connection = connection
+        self.columns = {}  # (domain, object ID, variable) -> column index
+        self.integer_columns = {}  # Column index -> True if its values are integers
+        self.frames = []  # One (column indices, values) pair per step
+        self.times = []
+        self.vehicle_counts = []
+        self._listener_id = None
+
+    def start(self):
+        # Records every simulation step from now on
+        if self._listener_id is None:
+            self._listener_id = self.connection.addStepListener(self)
+
+    def step(self, t):
+        self.record()
+        return True
+
+    def record(self):
+        # Appends the current step's subscription results to the trace
+        sensors = self.sensors
+        indices, values = [], []
+        for domain, results in (
+            ("lane", sensors.lane_results),
+            ("edge", sensors.edge_results),
+            ("trafficlight", sensors.tls_results),
+            ("simulation", {"": sensors.simulation_results}),
+        ):
+            for object_id, variables in results.items():
+                for variable, value in variables.items():
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    key = (domain, object_id, variable)
+                    column = self.columns.get(key)
+                    if column is None:
+                        column = self.columns[key] = len(self.columns)
+                        self.integer_columns[column] = isinstance(value, int)
+                    indices.append(column)
+                    values.append(value)
+        self.frames.append((indices, values))
+        self.times.append(self.connection.simulation.getTime())
+        self.vehicle_counts.append(self.connection.vehicle.getIDCount())
+
+    def close(self):
+        """
+        Writes the trace and stops recording.
+
+        Returns:
+        - The number of recorded steps.
+        """
+        if self._listener_id is not None:
+            self.connection.removeStepListener(self._listener_id)
+            self._listener_id = None
+
+        keys = list(self.columns)
+        is_integer = np.array([self.integer_columns[column] for column in range(len(keys))], dtype=bool)
+        # Missing readings are NaN in the float matrix and flagged in the presence mask
+        present = np.zeros((len(self.frames), len(keys)), dtype=bool)
+        values = np.full((len(self.frames), len(keys)), np.nan)
+        for step, (indices, step_values) in enumerate(self.frames):
+            present[step, indices] = True
+            values[step, indices] = step_values
+
+        topology = self.sensors.topology
+        layout = {
+            "columns": [[domain, object_id, variable] for domain, object_id, variable in keys],
+            "controlled_lanes": {tls_id: list(topology.get_controlled_lanes(tls_id)) for tls_id in topology},
+            "edge_ids": list(self.connection.edge.getIDList()),
+        }
+        np.savez_compressed(
+            self.trace_file,
+            layout=np.array(json.dumps(layout)),
+            present=present,
+            integers=np.where(present[:, is_integer], values[:, is_integer], 0).astype(np.int64),
+            floats=values[:, ~is_integer],
+            is_integer=is_integer,
+            times=np.array(self.times, dtype=np.float64),
+            vehicle_counts=np.array(self.vehicle_counts, dtype=np.int64),
+        )
+        return len(self.frames)
+
+
+class ReplayDomain:
+    # One traci domain (lane, edge, ...) served from a trace
+    def __init__(self, replay, name):
+        self.replay = replay
+        self.name = name
+        self.subscriptions = {}  # Object ID -> subscribed variables
+
+    def subscribe(self, object_id, variables):
+        self.subscriptions[object_id] = list(variables)
+        self.replay.invalidate(self.name)
+
+    def getAllSubscriptionResults(self):
+        return self.replay.results(self.name)
+
+    def getSubscriptionResults(self, object_id):
+        return self.replay.results(self.name).get(object_id, {})
+
+
+class ReplaySimulation(ReplayDomain):
+    def subscribe(self, variables):
+        self.subscriptions[""] = list(variables)
+        self.replay.invalidate(self.name)
+
+    def getTime(self):
+        return self.replay.time()
+
+    def getMinExpectedNumber(self):
+        # Keeps the agents' "while vehicles are expected" loops running until the trace ends
+        return 1 if self.replay.step_index + 1 < self.replay.num_steps else 0
+
+
+class ReplayEdge(ReplayDomain):
+    def getIDList(self):
+        return tuple(self.replay.layout["edge_ids"])
+
+
+class ReplayTrafficLight(ReplayDomain):
+    def getIDList(self):
+        return tuple(self.replay.layout["controlled_lanes"])
+
+    def getControlledLanes(self, tls_id):
+        return tuple(self.replay.layout["controlled_lanes"][tls_id])
+
+    def getPhase(self, tls_id):
+        return self.replay.value("trafficlight", tls_id, traci.constants.TL_CURRENT_PHASE)
+
+    def getNextSwitch(self, tls_id):
+        return self.replay.value("trafficlight", tls_id, traci.constants.TL_NEXT_SWITCH)
+
+    def setPhaseDuration(self, tls_id, duration):
+        # Open loop: the action is logged, the recorded observations do not change
+        self.replay.actions.append((self.replay.time(), "setPhaseDuration", tls_id, duration))
+
+
+class ReplayVehicle(ReplayDomain):
+    def getIDCount(self):
+        return int(self.replay.vehicle_counts[self.replay.step_index]) if self.replay.step_index >= 0 else 0
+
+
+class ReplayConnection:
+    """
+    Stands in for the traci module, serving a recorded trace instead of a running SUMO.
+
+    Pass it as the connection of TrafficSensors, DecisionKernel.apply(), ControlScheduler
+    and the other components that take one. Each simulationStep() moves to the next
+    recorded step and runs the step listeners, so sensors refresh as they do under TraCI.
+    Replay is open loop: actions such as setPhaseDuration() are collected in actions but
+    do not change what is observed.
+
+    Parameters:
+    - trace_file: A trace written by TraceRecorder.
+    """
+
+    def __init__(self, trace_file):
+        with np.load(trace_file) as trace:
+            self.layout = json.loads(str(trace["layout"]))
+            present = trace["present"]
+            is_integer = trace["is_integer"]
+            integers = trace["integers"]
+            floats = trace["floats"]
+            self.times = trace["times"]
+            self.vehicle_counts = trace["vehicle_counts"]
+        self.num_steps = len(self.times)
+
+        # Per domain: the object ID and variable of each column, in column order
+        self._columns = {domain: ([], [], []) for domain in TRACE_DOMAINS}
+        integer_index = float_index = 0
+        for domain, object_id, variable in self.layout["columns"]:
+            column = integer_index + float_index
+            if is_integer[column]:
+                source = ("integers", integer_index)
+                integer_index += 1
+            else:
+                source = ("floats", float_index)
+                float_index += 1
+            self._columns[domain][0].append(object_id)
+            self._columns[domain][1].append(variable)
+            self._columns[domain][2].append((column, source))
+
+        # Python values per domain and step, so a step is served without per-value conversions
+        self._steps = {}
+        for domain, (object_ids, variables, sources) in self._columns.items():
+            columns = [column for column, _ in sources]
+            domain_values = np.empty((self.num_steps, len(sources)), dtype=object)
+            for position, (_, (matrix, index)) in enumerate(sources):
+                domain_values[:, position] = (integers if matrix == "integers" else floats)[:, index].tolist()
+            self._steps[domain] = (present[:, columns], domain_values.tolist())
+        self._plans = {}  # Domain -> subscribed columns grouped by object, rebuilt when subscriptions change
+
+        self.step_index = -1
+        self.actions = []  # (time, action, object ID, value) per call a controller made
+        self._listeners = {}
+        self._next_listener_id = 0
+        self._frame = {}
+        self._frame_index = None
+
+        self.lane = ReplayDomain(self, "lane")
+        self.edge = ReplayEdge(self, "edge")
+        self.trafficlight = ReplayTrafficLight(self, "trafficlight")
+        self.simulation = ReplaySimulation(self, "simulation")
+        self.vehicle = ReplayVehicle(self, "vehicle")
+
+    def __len__(self):
+        return self.num_steps
+
+    def start(self, cmd=None, port=None, label="default", **kwargs):
+        # Rewinds to before the first recorded step; the command is ignored
+        self.step_index = -1
+        self.actions = []
+        self._frame_index = None
+
+    def isLoaded(self):
+        return True
+
+    def close(self, wait=True):
+        self._listeners.clear()
+
+    def simulationStep(self, step=0.0):
+        """
+        Moves to the next recorded step and runs the step listeners.
+        """
+        if self.step_index + 1 >= self.num_steps:
+            raise traci.FatalTraCIError("The trace has no more steps.")
+        self.step_index += 1
+        for listener_id, listener in list(self._listeners.items()):
+            if not listener.step(self.time()):
+                self.removeStepListener(listener_id)
+
+    def addStepListener(self, listener):
+        listener_id = self._next_listener_id
+        self._next_listener_id += 1
+        self._listeners[listener_id] = listener
+        return listener_id
+
+    def removeStepListener(self, listener_id):
+        return self._listeners.pop(listener_id, None) is not None
+
+    def time(self):
+        # Returns the recorded simulation time of the current step
+        return float(self.times[self.step_index]) if self.step_index >= 0 else 0.0
+
+    def results(self, domain):
+        """
+        Returns the current step's subscription results of a domain, restricted to subscribed objects.
+
+        Parameters:
+        - domain: "lane", "edge", "trafficlight", "simulation" or "vehicle".
+
+        Returns:
+        - Dict mapping object IDs to {variable: value}, as getAllSubscriptionResults() returns it.
+        """
+        if self._frame_index != self.step_index:
+            self._frame = {}
+            self._frame_index = self.step_index
+        frame = self._frame.get(domain)
+        if frame is None:
+            frame = self._frame[domain] = self._build_frame(domain)
+        return frame
+
+    def invalidate(self, domain):
+        # Drops the cached results of a domain after its subscriptions changed
+        self._plans.pop(domain, None)
+        self._frame.pop(domain, None)
+
+    def value(self, domain, object_id, variable):
+        # Returns one recorded value of the current step, or raises like TraCI for unknown objects
+        try:
+            return self.results(domain)[object_id][variable]
+        except KeyError:
+            raise traci.TraCIException(f"No recorded {domain} variable {variable:#x} for {object_id!r}")
+
+    def _plan(self, domain):
+        # Groups the recorded columns of subscribed objects by object, with one getter per object
+        plan = self._plans.get(domain)
+        if plan is None:
+            subscriptions = getattr(self, domain).subscriptions
+            object_ids, variables, _ = self._columns[domain]
+            grouped = {}
+            for position, object_id in enumerate(object_ids):
+                subscribed = subscriptions.get(object_id)
+                if subscribed is not None and variables[position] in subscribed:
+                    grouped.setdefault(object_id, []).append(position)
+            # Objects with one subscribed variable, the common case, skip the getter call
+            single = [
+                (object_id, variables[positions[0]], positions[0])
+                for object_id, positions in grouped.items()
+                if len(positions) == 1
+            ]
+            multiple = [
+                (object_id, tuple(variables[p] for p in positions), itemgetter(*positions), positions)
+                for object_id, positions in grouped.items()
+                if len(positions) > 1
+            ]
+            positions = np.array([p for object_positions in grouped.values() for p in object_positions], dtype=np.int64)
+            present = self._steps[domain][0]
+            plan = self._plans[domain] = (single, multiple, present[:, positions].all(axis=1))
+        return plan
+
+    def _build_frame(self, domain):
+        if self.step_index < 0 or domain not in self._steps:
+            return {}
+        single, multiple, complete = self._plan(domain)
+        present, domain_values = self._steps[domain]
+        step_values = domain_values[self.step_index]
+        if complete[self.step_index]:
+            frame = {object_id: {variable: step_values[position]} for object_id, variable, position in single}
+            for object_id, variables, getter, _ in multiple:
+                frame[object_id] = dict(zip(variables, getter(step_values)))
+            return frame
+
+        # Some subscribed values were not recorded this step, e.g. an edge subscribed mid-run
+        step_present = present[self.step_index]
+        frame = {}
+        for object_id, variable, position in single:
+            if step_present[position]:
+                frame[object_id] = {variable: step_values[position]}
+        for object_id, variables, _, positions in multiple:
+            results = {variables[i]: step_values[p] for i, p in enumerate(positions) if step_present[p]}
+            if results:
+                frame[object_id] = results
+        return frame
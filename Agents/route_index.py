@@ -0,0 +1,149 @@
+import traci
+import traci.constants as tc
+
+# Vehicle variables the index needs every step, received with the sensors' vehicle subscriptions
+ROUTE_VARIABLES = [tc.VAR_ROUTE_ID, tc.VAR_ROUTE_INDEX]
+
+
+class RouteIndexRefresh(traci.StepListener):
+    # Updates a route index after every simulation step, after the sensors it reads from
+    def __init__(self, route_index):
+        self.route_index = route_index
+
+    def step(self, t):
+        self.route_index.update()
+        return True
+
+
+def edge_positions(edges):
+    # Maps each edge of a route to the last position it appears at
+    return {edge_id: position for position, edge_id in enumerate(edges)}
+
+
+class RouteIndex:
+    """
+    Inverted index from edges to the vehicles routed over them.
+
+    Vehicles are indexed when they first appear in the sensors' vehicle results and
+    dropped when they arrive or otherwise leave the network. Route edges are fetched once per route ID, and a vehicle
+    is re-indexed when its route ID changes or when it is rerouted through reroute().
+    Finding the vehicles affected by a closure is then one dict lookup instead of a
+    getRoute() round trip per vehicle in the network.
+
+    Parameters:
+    - sensors: The TrafficSensors whose vehicle subscriptions feed the index.
+    - connection: The traci module or a labelled traci connection.
+    """
+
+    def __init__(self, sensors, connection=traci):
+        self.sensors = sensors
+        self.connection = connection
+        self.vehicles_by_edge = {}  # Edge ID -> IDs of the vehicles whose route contains it
+        self.route_ids = {}  # Vehicle ID -> the route ID it was indexed under
+        self.positions = {}  # Vehicle ID -> {edge ID: last position in its route}
+        self.routes = {}  # Vehicle ID -> route edges
+        self._route_cache = {}  # Route ID -> (route edges, edge positions)
+        self._listener_id = None
+
+    def subscribe(self):
+        """
+        Subscribes every vehicle to its route ID and route index and indexes the vehicles already in the network.
+        Call once after sensors.subscribe(), so the index refreshes after the sensors.
+        """
+        self.sensors.track_vehicles(ROUTE_VARIABLES)
+        if self._listener_id is None:
+            self._listener_id = self.connection.addStepListener(RouteIndexRefresh(self))
+        self.update()
+
+    def update(self):
+        """
+        Applies this step's arrivals, departures and route changes. Runs automatically after each simulationStep().
+        """
+        for vehicle_id in self.sensors.get_simulation_value(tc.VAR_ARRIVED_VEHICLES_IDS, ()):
+            self._remove(vehicle_id)
+        # Vehicles removed through TraCI or ended without arriving never show up as arrived
+        for vehicle_id in self.sensors.vanished_vehicles:
+            self._remove(vehicle_id)
+
+        for vehicle_id, results in self.sensors.vehicle_results.items():
+            route_id = results.get(tc.VAR_ROUTE_ID)
+            if route_id is None or self.route_ids.get(vehicle_id, "") == route_id:
+                continue
+            if vehicle_id in self.route_ids and self.route_ids[vehicle_id] is None:
+                # Rerouted through reroute(); the new edges are already indexed
+                self.route_ids[vehicle_id] = route_id
+                self._route_cache[route_id] = (self.routes[vehicle_id], self.positions[vehicle_id])
+                continue
+            try:
+                edges, positions = self._route(route_id)
+            except traci.TraCIException as e:
+                print(f"Error indexing the route of vehicle {vehicle_id}: {e}")
+                continue
+            self._index(vehicle_id, route_id, edges, positions)
+
+    def vehicles_on(self, edge_id):
+        """
+        Lists the vehicles whose remaining route contains an edge, including vehicles on it.
+
+        Parameters:
+        - edge_id: The ID of the edge.
+
+        Returns:
+        - A list of vehicle IDs.
+        """
+        vehicles = []
+        vehicle_results = self.sensors.vehicle_results
+        for vehicle_id in self.vehicles_by_edge.get(edge_id, ()):
+            route_index = vehicle_results.get(vehicle_id, {}).get(tc.VAR_ROUTE_INDEX, 0)
+            if self.positions[vehicle_id][edge_id] >= route_index:
+                vehicles.append(vehicle_id)
+        return vehicles
+
+    def route_of(self, vehicle_id):
+        # Returns the indexed route edges of a vehicle
+        return self.routes.get(vehicle_id, ())
+
+    def reroute(self, vehicle_id):
+        """
+        Reroutes a vehicle by travel time and re-indexes its new route.
+
+        Parameters:
+        - vehicle_id: The ID of the vehicle.
+
+        Returns:
+        - The vehicle's new route edges.
+        """
+        self.connection.vehicle.rerouteTraveltime(vehicle_id)
+        edges = tuple(self.connection.vehicle.getRoute(vehicle_id))
+        # The new route ID arrives with the next step's subscription results
+        self._index(vehicle_id, None, edges, edge_positions(edges))
+        return edges
+
+    def _route(self, route_id):
+        route = self._route_cache.get(route_id)
+        if route is None:
+            edges = tuple(self.connection.route.getEdges(route_id))
+            route = (edges, edge_positions(edges))
+            self._route_cache[route_id] = route
+        return route
+
+    def _index(self, vehicle_id, route_id, edges, positions):
+        self._remove(vehicle_id)
+        self.route_ids[vehicle_id] = route_id
+        self.routes[vehicle_id] = edges
+        self.positions[vehicle_id] = positions
+        for edge_id in positions:
+            self.vehicles_by_edge.setdefault(edge_id, set()).add(vehicle_id)
+
+    def _remove(self, vehicle_id):
+        positions = self.positions.pop(vehicle_id, None)
+        if positions is None:
+            return
+        del self.route_ids[vehicle_id]
+        del self.routes[vehicle_id]
+        for edge_id in positions:
+            vehicles = self.vehicles_by_edge.get(edge_id)
+            if vehicles is not None:
+                vehicles.discard(vehicle_id)
+                if not vehicles:
+                    del self.vehicles_by_edge[edge_id]
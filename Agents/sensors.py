@@ -0,0 +1,200 @@
+import traci
+import traci.constants as tc
+
+# Variables each sensor needs from SUMO every step
+LANE_VARIABLES = [tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+EDGE_VARIABLES = [tc.LAST_STEP_MEAN_SPEED]
+CONTROLLED_EDGE_VARIABLES = [tc.LAST_STEP_MEAN_SPEED, tc.LAST_STEP_VEHICLE_NUMBER]
+TLS_VARIABLES = [tc.TL_CURRENT_PHASE]
+VEHICLE_EVENT_VARIABLES = [tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS]
+
+
+class SensorRefresh(traci.StepListener):
+    # Refreshes a sensors instance after every simulation step, including steps taken outside the agent loop
+    def __init__(self, sensors):
+        self.sensors = sensors
+
+    def step(self, t):
+        self.sensors.update()
+        return True
+
+
+class TrafficSensors:
+    """
+    Serves per-step lane, edge and traffic light readings from TraCI subscriptions.
+
+    Subscriptions are registered once after traci.start(). SUMO then sends every
+    subscribed value back with the simulationStep() response, and a step listener
+    calls update() to read the whole step from memory instead of one round trip
+    per lane or edge.
+
+    Parameters:
+    - topology: The IntersectionTopology whose controlled lanes and edges are sensed.
+    - edge_ids: Extra edges to sense network-wide (e.g. for speed logging).
+    - connection: The traci module or a labelled traci connection.
+    """
+
+    def __init__(self, topology, edge_ids=None, connection=traci):
+        self.connection = connection
+        self.topology = topology
+        self.edge_ids = list(edge_ids) if edge_ids is not None else []
+        self.lane_results = {}
+        self.edge_results = {}
+        self.tls_results = {}
+        self.vehicle_results = {}
+        self.simulation_results = {}
+        self.vehicle_variables = []  # Variables subscribed for every vehicle in the network
+        self.vanished_vehicles = ()  # Subscribed vehicles that left this step without arriving
+        self._subscriptions = {}  # (domain, object ID) -> subscribed variable IDs
+        self._vehicle_ids = set()  # Vehicles with a subscription
+        self._listener_id = None
+
+    def subscribe(self):
+        """
+        Registers lane, edge and TLS variable subscriptions. Call once after traci.start().
+        """
+        for tls_id in self.topology:
+            self.add_subscription("trafficlight", tls_id, TLS_VARIABLES)
+        for lane_id in self.topology.all_lanes():
+            self.add_subscription("lane", lane_id, LANE_VARIABLES)
+        for edge_id in self.topology.all_edges():
+            self.add_subscription("edge", edge_id, CONTROLLED_EDGE_VARIABLES)
+        for edge_id in self.edge_ids:
+            self.add_subscription("edge", edge_id, EDGE_VARIABLES)
+
+        if self._listener_id is None:
+            self._listener_id = self.connection.addStepListener(SensorRefresh(self))
+        self.update()
+
+    def close(self):
+        """
+        Stops refreshing after each step. Call before closing the connection: libsumo keeps
+        step listeners across simulations, so a stale one would refresh on every later step.
+        """
+        if self._listener_id is not None:
+            self.connection.removeStepListener(self._listener_id)
+            self._listener_id = None
+
+    def track_vehicles(self, variables):
+        """
+        Subscribes every vehicle in the network to the given variables, including vehicles that depart later.
+
+        Parameters:
+        - variables: The TraCI vehicle variable IDs to receive every step.
+        """
+        missing = [var for var in variables if var not in self.vehicle_variables]
+        if not missing:
+            return
+        self.vehicle_variables = self.vehicle_variables + missing
+        self.add_subscription("simulation", "", VEHICLE_EVENT_VARIABLES)
+        for vehicle_id in self.connection.vehicle.getIDList():
+            self.add_subscription("vehicle", vehicle_id, self.vehicle_variables)
+        self.update()
+
+    def add_subscription(self, domain, object_id, variables):
+        """
+        Subscribes an object to the given variables, keeping any variables it is already subscribed to.
+
+        TraCI replaces an object's subscription on every subscribe call, so components sharing
+        one connection must register through the same sensors instance.
+
+        Parameters:
+        - domain: The traci domain name, e.g. "lane", "edge", "vehicle".
+        - object_id: The ID of the object to subscribe.
+        - variables: The TraCI variable IDs to receive every step.
+        """
+        key = (domain, object_id)
+        subscribed = self._subscriptions.get(key, [])
+        missing = [var for var in variables if var not in subscribed]
+        if not missing:
+            return True
+        try:
+            if domain == "simulation":
+                # The simulation domain has a single, unnamed object
+                self.connection.simulation.subscribe(subscribed + missing)
+            else:
+                getattr(self.connection, domain).subscribe(object_id, subscribed + missing)
+        except traci.TraCIException as e:
+            print(f"Error subscribing to {domain} {object_id}: {e}")
+            return False
+        self._subscriptions[key] = subscribed + missing
+        if domain == "vehicle" and object_id:
+            self._vehicle_ids.add(object_id)
+        return True
+
+    def update(self):
+        """
+        Fetches this step's subscription results. Runs automatically after each simulationStep().
+        """
+        self.lane_results = self.connection.lane.getAllSubscriptionResults()
+        self.edge_results = self.connection.edge.getAllSubscriptionResults()
+        self.tls_results = self.connection.trafficlight.getAllSubscriptionResults()
+        self.simulation_results = self.connection.simulation.getAllSubscriptionResults().get("", {})
+
+        if self.vehicle_variables:
+            # SUMO drops the subscriptions of arrived vehicles; subscribe the newly departed ones
+            arrived = set(self.simulation_results.get(tc.VAR_ARRIVED_VEHICLES_IDS, ()))
+            for vehicle_id in arrived:
+                self._subscriptions.pop(("vehicle", vehicle_id), None)
+                self._vehicle_ids.discard(vehicle_id)
+            for vehicle_id in self.simulation_results.get(tc.VAR_DEPARTED_VEHICLES_IDS, ()):
+                if vehicle_id not in arrived:
+                    self.add_subscription("vehicle", vehicle_id, self.vehicle_variables)
+        self.vehicle_results = self.connection.vehicle.getAllSubscriptionResults()
+
+        # Vehicles removed through TraCI or ended by SUMO without arriving are in no arrived list;
+        # they only drop out of the subscription results
+        vanished = self._vehicle_ids.difference(self.vehicle_results)
+        for vehicle_id in vanished:
+            self._subscriptions.pop(("vehicle", vehicle_id), None)
+        self._vehicle_ids -= vanished
+        self.vanished_vehicles = tuple(vanished)
+
+    def get_simulation_value(self, variable, default=None):
+        # Returns a subscribed simulation variable, e.g. the departed vehicle IDs
+        return self.simulation_results.get(variable, default)
+
+    def get_halting_number(self, lane_id):
+        # Returns the number of halting vehicles on a subscribed lane
+        return self.lane_results.get(lane_id, {}).get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0)
+
+    def get_road_queues(self, tls_id):
+        # Returns halting vehicles aggregated by road for the lanes a TLS controls
+        queue_lengths = {}
+        lane_to_road = self.topology[tls_id].lane_to_road
+        for lane in self.topology[tls_id].unique_lanes:
+            road_id = lane_to_road[lane]
+            queue_lengths[road_id] = queue_lengths.get(road_id, 0) + self.get_halting_number(lane)
+        return queue_lengths
+
+    def get_average_speed(self, edge_id):
+        # Returns the mean speed on a subscribed edge
+        avg_speed = self.edge_results.get(edge_id, {}).get(tc.LAST_STEP_MEAN_SPEED)
+        return avg_speed if avg_speed is not None else 0
+
+    def get_vehicle_number(self, edge_id):
+        # Returns the number of vehicles on an edge subscribed to LAST_STEP_VEHICLE_NUMBER, or None
+        return self.edge_results.get(edge_id, {}).get(tc.LAST_STEP_VEHICLE_NUMBER)
+
+    def get_tls_avg_speed(self, tls_id):
+        # Returns the vehicle-weighted mean speed over the edges a TLS controls
+        total_speed = 0
+        total_vehicles = 0
+        for edge_id in self.topology[tls_id].edges:
+            results = self.edge_results.get(edge_id)
+            if not results:
+                continue
+            vehicle_count = results[tc.LAST_STEP_VEHICLE_NUMBER]
+            total_speed += results[tc.LAST_STEP_MEAN_SPEED] * vehicle_count
+            total_vehicles += vehicle_count
+
+        if total_vehicles > 0:
+            return total_speed / total_vehicles
+        return 0.0
+
+    def get_phase(self, tls_id):
+        # Returns the current phase index of a TLS
+        results = self.tls_results.get(tls_id)
+        if results is None:
+            return self.connection.trafficlight.getPhase(tls_id)
+        return results[tc.TL_CURRENT_PHASE]
@@ -0,0 +1,360 @@
+import multiprocessing as mp
+import time
+import traceback
+import xml.etree.ElementTree as ET
+from collections import deque
+
+import pandas as pd
+import traci
+from sumolib.miscutils import getFreeSocketPort
+
+from Agents.control_scheduler import ControlScheduler
+from Agents.decision_kernel import DecisionKernel
+from Agents.net_compiler import resolve_net_file
+from Agents.network_cache import load_network_plan
+from Agents.sensors import TrafficSensors
+
+COORDINATOR_ORDER = 1  # TraCI client order of the process that started SUMO; shard i has order i + 2
+
+# Per-shard timing report, one row per controller process
+TIMING_COLUMNS = [
+    "shard",
+    "tls",
+    "lanes",
+    "steps",
+    "decisions",
+    "control_s",
+    "control_ms_per_step",
+    "max_control_ms",
+    "step_s",
+    "tls_ids",
+]
+
+
+def tls_neighbours(net_file):
+    """
+    Finds the traffic lights that are next to each other in a network file.
+
+    Two traffic lights are neighbours if a road leads from one to the other, directly or
+    through junctions without a traffic light.
+
+    Parameters:
+    - net_file: Path of the SUMO network file.
+
+    Returns:
+    - Dict mapping each TLS ID to the set of its neighbouring TLS IDs.
+    """
+    edge_nodes = {}  # Edge ID -> (from junction, to junction)
+    tls_edges = {}  # TLS ID -> incoming edges of its controlled connections
+
+    for _, element in ET.iterparse(net_file, events=("end",)):
+        if element.tag == "edge":
+            if element.get("function") != "internal":
+                edge_nodes[element.get("id")] = (element.get("from"), element.get("to"))
+            element.clear()
+        elif element.tag == "connection":
+            tls_id = element.get("tl")
+            if tls_id is not None:
+                tls_edges.setdefault(tls_id, set()).add(element.get("from"))
+            element.clear()
+        elif element.tag in ("junction", "tlLogic"):
+            element.clear()
+
+    # Undirected junction graph, and the traffic lights at each junction
+    adjacent = {}
+    for from_node, to_node in edge_nodes.values():
+        adjacent.setdefault(from_node, set()).add(to_node)
+        adjacent.setdefault(to_node, set()).add(from_node)
+    node_tls = {}
+    tls_nodes = {}
+    for tls_id, edges in tls_edges.items():
+        tls_nodes[tls_id] = {edge_nodes[edge][1] for edge in edges if edge in edge_nodes}
+        for node in tls_nodes[tls_id]:
+            node_tls.setdefault(node, set()).add(tls_id)
+
+    # Walk out from each traffic light, stopping at the junctions of other traffic lights
+    neighbours = {}
+    for tls_id, nodes in tls_nodes.items():
+        found = set()
+        seen = set(nodes)
+        queue = deque(nodes)
+        while queue:
+            node = queue.popleft()
+            for next_node in adjacent.get(node, ()):
+                if next_node in seen:
+                    continue
+                seen.add(next_node)
+                others = node_tls.get(next_node, set()) - {tls_id}
+                if others:
+                    found |= others
+                else:
+                    queue.append(next_node)
+        neighbours[tls_id] = found
+    return neighbours
+
+
+def partition_tls(tls_ids, num_shards, neighbours, weights=None):
+    """
+    Splits traffic lights into shards of similar load, keeping neighbouring lights together.
+
+    The lights are ordered breadth-first over the neighbour graph, starting each connected
+    group at a peripheral light, and the order is cut into num_shards contiguous pieces
+    of about equal weight. Each shard is then a compact region of the network.
+
+    Parameters:
+    - tls_ids: The traffic lights to split.
+    - num_shards: Number of shards.
+    - neighbours: Dict from tls_neighbours().
+    - weights: Dict of per-TLS control cost, e.g. controlled lanes. Defaults to 1 per TLS.
+
+    Returns:
+    - A list of TLS ID lists, one per shard. Shards that would be empty are left out.
+    """
+    tls_ids = list(tls_ids)
+    members = set(tls_ids)
+    graph = {tls_id: sorted(set(neighbours.get(tls_id, ())) & members) for tls_id in tls_ids}
+
+    def breadth_first(start):
+        order, seen = [start], {start}
+        for tls_id in order:
+            for neighbour in graph[tls_id]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    order.append(neighbour)
+        return order
+
+    ordered = []
+    visited = set()
+    for tls_id in tls_ids:
+        if tls_id in visited:
+            continue
+        # The light reached last from any start is at the edge of its group
+        component = breadth_first(breadth_first(tls_id)[-1])
+        visited.update(component)
+        ordered.extend(component)
+
+    weights = {tls_id: (weights or {}).get(tls_id, 1) for tls_id in ordered}
+    total = sum(weights.values()) or 1
+    shards = [[] for _ in range(num_shards)]
+    cumulative = 0
+    for tls_id in ordered:
+        # A light goes to the shard its weight's midpoint falls into
+        index = min(num_shards - 1, int((cumulative + weights[tls_id] / 2) * num_shards / total))
+        shards[index].append(tls_id)
+        cumulative += weights[tls_id]
+    return [shard for shard in shards if shard]
+
+
+def start_shared_simulation(cmd, num_clients, port, connection=traci):
+    """
+    Starts SUMO for several TraCI clients and connects to it as the coordinating client.
+
+    Parameters:
+    - cmd: The SUMO command.
+    - num_clients: Number of clients, including this one.
+    - port: The port the other clients connect to.
+    - connection: The traci module. A backend installed with Agents.backend is switched to
+      TraCI for this start, as libsumo cannot serve other processes.
+    """
+    backend = getattr(connection, "backend", None)
+    if backend is not None:
+        connection.backend = "traci"
+    try:
+        connection.start(list(cmd) + ["--num-clients", str(num_clients)], port=port)
+    finally:
+        if backend is not None:
+            connection.backend = backend
+    connection.setOrder(COORDINATOR_ORDER)
+
+
+def run_shard(pipe, stop, port, order, tls_ids, config, phases_file, settings):
+    """
+    Controls one shard of traffic lights as an extra TraCI client of a running simulation.
+
+    Runs V6's sensing, scheduling and adjust_due_phases() over the shard's lights only,
+    stepping with the other clients until the coordinator stops it or no vehicles are
+    expected, and sends its timing row back through the pipe.
+
+    Parameters:
+    - pipe: The worker's end of a pipe to the coordinator.
+    - stop: Event the coordinator sets when it stops stepping. SUMO keeps running past --end
+      while clients keep stepping it, so only the coordinator knows when the run is over.
+    - port: The port SUMO listens on.
+    - order: This client's TraCI order.
+    - tls_ids: The traffic lights of the shard.
+    - config: The .sumocfg the simulation runs.
+    - phases_file: The fixed phases JSON.
+    - settings: Dict with min_green, max_green, min_green_added, max_green_added,
+      interval and lookahead, as in V6.
+    """
+    from Agents.V6adaptive_agent import adjust_due_phases
+
+    timing = {"shard": order - COORDINATOR_ORDER - 1, "tls": len(tls_ids), "tls_ids": " ".join(tls_ids)}
+    try:
+        traci.init(port)
+        traci.setOrder(order)
+
+        topology, phase_plan, _ = load_network_plan(config, phases_file)
+        topology = topology.subset(tls_ids)
+        # The shard subscribes to its own lights only; subscriptions are per client
+        sensors = TrafficSensors(topology)
+        sensors.subscribe()
+        decision_kernel = DecisionKernel(
+            tls_ids,
+            topology,
+            phase_plan,
+            settings["min_green"],
+            settings["max_green"],
+            settings["min_green_added"],
+            settings["max_green_added"],
+        )
+        scheduler = ControlScheduler(
+            decision_kernel.tls_ids, sensors, interval=settings["interval"], lookahead=settings["lookahead"]
+        )
+        scheduler.subscribe()
+        timing["lanes"] = len(topology.all_lanes())
+
+        steps = decisions = 0
+        control_seconds = max_control = step_seconds = 0.0
+        while not stop.is_set() and traci.simulation.getMinExpectedNumber() > 0:
+            started = time.perf_counter()
+            traci.simulationStep()
+            stepped = time.perf_counter()
+            steps += 1
+
+            total_vehicles = traci.vehicle.getIDCount()
+            queue_lengths = decision_kernel.read_queues(sensors)
+            rows = adjust_due_phases(decision_kernel, scheduler, sensors, queue_lengths, total_vehicles)
+            decisions += len(rows)
+
+            finished = time.perf_counter()
+            step_seconds += stepped - started
+            control_seconds += finished - stepped
+            max_control = max(max_control, finished - stepped)
+    except traci.FatalTraCIError:
+        # SUMO went away before the coordinator stopped the shards, e.g. it was killed
+        pass
+    except Exception as e:
+        print(f"Error in controller shard {timing['shard']}: {e}")
+        traceback.print_exc()
+    finally:
+        try:
+            traci.close()
+        except Exception:
+            pass
+
+    if "lanes" in timing:
+        timing.update(
+            steps=steps,
+            decisions=decisions,
+            control_s=control_seconds,
+            control_ms_per_step=1000 * control_seconds / max(steps, 1),
+            max_control_ms=1000 * max_control,
+            step_s=step_seconds,
+        )
+    pipe.send(timing)
+    pipe.close()
+
+
+class ShardPool:
+    """
+    Controller processes that each run the V6 decisions for one region of the network.
+
+    The traffic lights are partitioned with partition_tls(), weighted by their controlled
+    lanes, and every shard runs in its own process as a TraCI client of the same SUMO
+    instance. SUMO only advances once every client has asked for the step, so the shards
+    and the coordinator stay in lock-step, and each shard's decisions for a step are made
+    on that step's readings, as in a single process. Shards use TraCI sockets, never libsumo.
+
+    Parameters:
+    - config: The .sumocfg the simulation runs.
+    - phases_file: The fixed phases JSON.
+    - num_shards: Number of controller processes.
+    - settings: The control settings passed to run_shard().
+    """
+
+    def __init__(self, config, phases_file, num_shards, settings):
+        self.config = config
+        self.phases_file = phases_file
+        self.settings = dict(settings)
+
+        topology, phase_plan, _ = load_network_plan(config, phases_file)
+        tls_ids = [tls_id for tls_id in topology.tls_ids if tls_id in phase_plan]
+        weights = {tls_id: len(topology[tls_id].unique_lanes) for tls_id in tls_ids}
+        self.partitions = partition_tls(tls_ids, num_shards, tls_neighbours(resolve_net_file(config)), weights)
+        self.port = None
+        self.stop_event = None
+        self.processes = []
+        self.pipes = []
+
+    @property
+    def num_clients(self):
+        # The shards and the coordinator
+        return len(self.partitions) + 1
+
+    def start(self):
+        """
+        Starts the shard processes, which wait for SUMO on a free port.
+
+        Returns:
+        - The port to start SUMO with, e.g. through start_shared_simulation().
+        """
+        self.port = getFreeSocketPort()
+        # Spawned workers import traci fresh, so they never inherit an installed libsumo backend
+        context = mp.get_context("spawn")
+        self.stop_event = context.Event()
+        for index, tls_ids in enumerate(self.partitions):
+            parent_pipe, worker_pipe = context.Pipe(duplex=False)
+            process = context.Process(
+                target=run_shard,
+                args=(
+                    worker_pipe,
+                    self.stop_event,
+                    self.port,
+                    COORDINATOR_ORDER + 1 + index,
+                    tls_ids,
+                    self.config,
+                    self.phases_file,
+                    self.settings,
+                ),
+                daemon=True,
+            )
+            process.start()
+            worker_pipe.close()
+            self.processes.append(process)
+            self.pipes.append(parent_pipe)
+        return self.port
+
+    def stop(self):
+        """
+        Tells the shards to stop stepping. Call before the coordinator closes its connection:
+        the shards would otherwise keep SUMO running, and the close waiting, until no vehicles
+        are expected.
+        """
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def join(self, timeout=60):
+        """
+        Waits for the shards to finish and collects their timing.
+
+        Parameters:
+        - timeout: Seconds to wait for each shard after the simulation ended.
+
+        Returns:
+        - A DataFrame with one TIMING_COLUMNS row per shard.
+        """
+        self.stop()
+        rows = []
+        for pipe, process in zip(self.pipes, self.processes):
+            try:
+                if pipe.poll(timeout):
+                    rows.append(pipe.recv())
+            except EOFError:
+                print(f"Controller shard process {process.pid} exited without reporting its timing.")
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.pipes = []
+        self.processes = []
+        return pd.DataFrame(rows, columns=TIMING_COLUMNS)
@@ -0,0 +1,60 @@
+import os
+import pickle
+import random
+
+import traci
+
+SUMO_STATE_FILE = "sumo_state.xml.gz"  # SUMO's saveState() output: vehicles, routes, signal states
+AGENT_STATE_FILE = "agent_state.pickle"  # The agent's own state at the same step
+
+# SUMO options for a run that saves snapshots, so forks continue with the same random numbers
+SAVE_STATE_ARGS = ["--save-state.rng", "true", "--save-state.precision", "17"]
+
+
+def save_snapshot(snapshot_dir, agent_state, connection=traci):
+    """
+    Saves the simulation and the agent's state at the current step.
+
+    Parameters:
+    - snapshot_dir: Directory to write the snapshot to. Created if missing.
+    - agent_state: Picklable dict of everything the agent needs to continue, e.g. from the
+      get_state() methods of its kernel, scheduler and incident components.
+    - connection: The traci module or a labelled traci connection.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    connection.simulation.saveState(os.path.join(snapshot_dir, SUMO_STATE_FILE))
+    agent_state = dict(agent_state, random_state=random.getstate())
+    with open(os.path.join(snapshot_dir, AGENT_STATE_FILE), "wb") as f:
+        pickle.dump(agent_state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Snapshot saved to {snapshot_dir}")
+
+
+def resume_args(snapshot_dir):
+    """
+    Returns the SUMO options that start a simulation at a snapshot.
+
+    SUMO loads the state before the first step and skips the route file vehicles that
+    departed before it; traci.simulation.loadState() on a running simulation would insert
+    them a second time.
+
+    Parameters:
+    - snapshot_dir: Directory written by save_snapshot().
+    """
+    return ["--load-state", os.path.join(snapshot_dir, SUMO_STATE_FILE)]
+
+
+def load_snapshot(snapshot_dir):
+    """
+    Returns the agent state saved with a snapshot and restores Python's random number generator.
+    Start SUMO with resume_args() of the same snapshot to continue the simulation.
+
+    Parameters:
+    - snapshot_dir: Directory written by save_snapshot().
+
+    Returns:
+    - The agent state dict.
+    """
+    with open(os.path.join(snapshot_dir, AGENT_STATE_FILE), "rb") as f:
+        agent_state = pickle.load(f)
+    random.setstate(agent_state["random_state"])
+    return agent_state
@@ -0,0 +1,140 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+import traci
+
+# Static layout of one traffic light, derived from its controlled lanes
+TLSTopology = namedtuple(
+    "TLSTopology",
+    [
+        "tls_id",
+        "controlled_lanes",  # One lane per signal index, as returned by getControlledLanes
+        "unique_lanes",  # Controlled lanes without duplicates, in signal order
+        "roads",  # Unique road IDs, in signal order
+        "lane_to_road",  # Lane ID -> road ID
+        "road_to_signal_indices",  # Road ID -> signal indices of its lanes
+        "road_to_lanes",  # Road ID -> unique lanes on the road
+        "edges",  # Unique edge IDs the controlled lanes belong to
+    ],
+)
+
+
+def get_road_id(lane_id):
+    # Road IDs follow the agents' convention of the lane ID up to the first underscore
+    return lane_id.split("_")[0]
+
+
+def get_edge_id(lane_id):
+    # SUMO lane IDs are "<edge ID>_<lane index>"
+    return lane_id.rsplit("_", 1)[0]
+
+
+def build_tls_topology(tls_id, controlled_lanes):
+    """
+    Derives the static layout of a traffic light from its controlled lanes.
+
+    Parameters:
+    - tls_id: The ID of the traffic light.
+    - controlled_lanes: The lanes it controls, one per signal index.
+
+    Returns:
+    - A TLSTopology.
+    """
+    controlled_lanes = tuple(controlled_lanes)
+    unique_lanes = tuple(dict.fromkeys(controlled_lanes))
+    lane_to_road = {lane: get_road_id(lane) for lane in unique_lanes}
+
+    road_to_signal_indices = {}
+    for index, lane in enumerate(controlled_lanes):
+        road_to_signal_indices.setdefault(lane_to_road[lane], []).append(index)
+
+    road_to_lanes = {}
+    for lane in unique_lanes:
+        road_to_lanes.setdefault(lane_to_road[lane], []).append(lane)
+
+    return TLSTopology(
+        tls_id=tls_id,
+        controlled_lanes=controlled_lanes,
+        unique_lanes=unique_lanes,
+        roads=tuple(road_to_signal_indices),
+        lane_to_road=MappingProxyType(lane_to_road),
+        road_to_signal_indices=MappingProxyType(
+            {road: tuple(indices) for road, indices in road_to_signal_indices.items()}
+        ),
+        road_to_lanes=MappingProxyType({road: tuple(lanes) for road, lanes in road_to_lanes.items()}),
+        edges=tuple(dict.fromkeys(get_edge_id(lane) for lane in unique_lanes)),
+    )
+
+
+class IntersectionTopology:
+    """
+    Controlled lanes, roads and signal indices of every traffic light, built once per run.
+
+    The lanes a traffic light controls do not change during a simulation, so agents and
+    testers read them from here instead of calling getControlledLanes() and splitting
+    lane IDs every step.
+
+    Parameters:
+    - controlled_lanes: Dict mapping each TLS ID to its controlled lanes.
+    """
+
+    def __init__(self, controlled_lanes):
+        self._controlled_lanes = {tls_id: tuple(lanes) for tls_id, lanes in controlled_lanes.items()}
+        self._tls = {
+            tls_id: build_tls_topology(tls_id, lanes)
+            for tls_id, lanes in self._controlled_lanes.items()
+        }
+        self.tls_ids = tuple(self._tls)
+
+    @classmethod
+    def from_traci(cls, tls_ids=None, connection=traci):
+        """
+        Builds the topology from a running simulation. Call once after traci.start().
+
+        Parameters:
+        - tls_ids: The traffic lights to include. Defaults to all traffic lights.
+        - connection: The traci module or a labelled traci connection.
+        """
+        if tls_ids is None:
+            tls_ids = connection.trafficlight.getIDList()
+
+        controlled_lanes = {}
+        for tls_id in tls_ids:
+            try:
+                controlled_lanes[tls_id] = connection.trafficlight.getControlledLanes(tls_id)
+            except traci.TraCIException as e:
+                print(f"Error retrieving controlled lanes for TLS {tls_id}: {e}")
+                controlled_lanes[tls_id] = ()
+        return cls(controlled_lanes)
+
+    def __reduce__(self):
+        # Pickle only the source data; the derived tables are cheap to rebuild
+        return (self.__class__, (self._controlled_lanes,))
+
+    def __getitem__(self, tls_id):
+        return self._tls[tls_id]
+
+    def __contains__(self, tls_id):
+        return tls_id in self._tls
+
+    def __iter__(self):
+        return iter(self.tls_ids)
+
+    def __len__(self):
+        return len(self._tls)
+
+    def subset(self, tls_ids):
+        # Returns the topology of only the given traffic lights, e.g. one controller shard
+        return self.__class__({tls_id: self._controlled_lanes[tls_id] for tls_id in tls_ids})
+
+    def get_controlled_lanes(self, tls_id):
+        # Returns the lanes a TLS controls, one per signal index
+        return self._tls[tls_id].controlled_lanes
+
+    def all_lanes(self):
+        # Returns every controlled lane in the network once
+        return tuple(dict.fromkeys(lane for tls in self._tls.values() for lane in tls.unique_lanes))
+
+    def all_edges(self):
+        # Returns every edge with a controlled lane once
+        return tuple(dict.fromkeys(edge for tls in self._tls.values() for edge in tls.edges))
@@ -0,0 +1,153 @@
+import os
+
+import numpy as np
+import traci
+
+from Agents.decision_kernel import DecisionKernel
+from Agents.network_cache import load_network_plan
+from Agents.sensors import TrafficSensors
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+default_config = os.path.join(repo_dir, "CustomNetworks", "twoLaneMap.sumocfg")
+default_phases_file = os.path.join(repo_dir, "adaptive_fixed_phases.json")
+
+DECISION_INTERVAL = 3  # Simulation steps per env step, as V6's STEP_INTERVAL
+
+
+class TrafficEnv:
+    """
+    Reset/step environment over one SUMO simulation, for training traffic light controllers.
+
+    Follows the Gymnasium API without depending on it. Sensing is V6's: per-road queues and
+    vehicle-weighted speeds on the controlled edges from the TrafficSensors subscriptions,
+    gathered by a DecisionKernel. Actuation is setPhaseDuration(), as in V6.
+
+    Observations are float32 arrays of shape (num_tls, max_roads + 2): the halting vehicles
+    per road (zero for roads a TLS does not have), the mean speed, and the current phase
+    index. Actions are one phase duration in seconds per TLS, set on its current phase;
+    NaN or values <= 0 leave a TLS alone. Rewards are per TLS, the negative number of
+    halting vehicles on its roads averaged over the env step.
+
+    The traci module is the one imported when this module was first imported, so install a
+    backend (Agents.backend.install) before importing it to run on libsumo.
+
+    Parameters:
+    - config: The .sumocfg to simulate.
+    - phases_file: The fixed phases JSON the intersection layout is built from.
+    - sumo_binary: SUMO binary. Use "sumo" for headless runs.
+    - sumo_args: Extra SUMO options.
+    - decision_interval: Simulation steps per env step.
+    - max_steps: Simulation steps after which an episode is truncated. None runs until no vehicles are expected.
+    - label: TraCI connection label, to run several environments in one process over TraCI.
+    """
+
+    def __init__(
+        self,
+        config=default_config,
+        phases_file=default_phases_file,
+        sumo_binary="sumo",
+        sumo_args=(),
+        decision_interval=DECISION_INTERVAL,
+        max_steps=None,
+        label="default",
+    ):
+        self.config = config
+        self.phases_file = phases_file
+        self.sumo_binary = sumo_binary
+        self.sumo_args = list(sumo_args)
+        self.decision_interval = decision_interval
+        self.max_steps = max_steps
+        self.label = label
+        self.connection = None
+        self.sensors = None
+        self.decision_kernel = None
+        self.steps = 0  # Simulation steps in the current episode
+
+    @property
+    def tls_ids(self):
+        # The controlled traffic lights, in observation row order
+        return self.decision_kernel.tls_ids if self.decision_kernel is not None else ()
+
+    @property
+    def observation_shape(self):
+        return (len(self.tls_ids), self.decision_kernel.max_roads + 2)
+
+    def __len__(self):
+        return len(self.tls_ids)
+
+    def reset(self, seed=None):
+        """
+        Starts a new episode in a fresh simulation.
+
+        Parameters:
+        - seed: SUMO random seed of the episode. Defaults to the config's seed.
+
+        Returns:
+        - observation: The initial observation.
+        - info: Dict with the simulation time and vehicle count.
+        """
+        self.close()
+        cmd = [self.sumo_binary, "-c", self.config, "--no-step-log", "true"] + self.sumo_args
+        if seed is not None:
+            cmd += ["--seed", str(seed)]
+        traci.start(cmd, label=self.label)
+        self.connection = traci.getConnection(self.label) if self.label != "default" else traci
+
+        tls_ids = self.connection.trafficlight.getIDList()
+        topology, phase_plan, _ = load_network_plan(self.config, self.phases_file, tls_ids, self.connection)
+        self.sensors = TrafficSensors(topology, connection=self.connection)
+        self.sensors.subscribe()
+        self.decision_kernel = DecisionKernel(tls_ids, topology, phase_plan)
+        self.steps = 0
+        return self._observe(self.decision_kernel.read_queues(self.sensors)), self._info()
+
+    def step(self, action):
+        """
+        Applies one phase duration per TLS and advances decision_interval simulation steps.
+
+        Parameters:
+        - action: Array of shape (num_tls,) with the new duration of each TLS's current phase.
+
+        Returns:
+        - observation, reward, terminated, truncated, info, as in Gymnasium.
+        """
+        durations = np.asarray(action, dtype=np.float64).reshape(len(self))
+        self.decision_kernel.apply(durations, np.isfinite(durations) & (durations > 0), connection=self.connection)
+
+        queue_sum = np.zeros(len(self))
+        terminated = False
+        simulated = 0
+        for _ in range(self.decision_interval):
+            self.connection.simulationStep()
+            self.steps += 1
+            simulated += 1
+            queues = self.decision_kernel.read_queues(self.sensors)
+            queue_sum += queues.sum(axis=1)
+            if self.connection.simulation.getMinExpectedNumber() <= 0:
+                terminated = True
+                break
+        truncated = not terminated and self.max_steps is not None and self.steps >= self.max_steps
+
+        reward = (-queue_sum / simulated).astype(np.float32)
+        return self._observe(queues), reward, terminated, truncated, self._info()
+
+    def close(self):
+        # Ends the running simulation, if any
+        if self.connection is not None:
+            try:
+                self.sensors.close()
+                self.connection.close()
+            except Exception as e:
+                print(f"Error closing the simulation: {e}")
+            self.connection = None
+
+    def _observe(self, queues):
+        phases = self.decision_kernel.read_phases(self.sensors)
+        avg_speeds = self.decision_kernel.read_avg_speeds(self.sensors)
+        return np.concatenate([queues, avg_speeds[:, None], phases[:, None]], axis=1).astype(np.float32)
+
+    def _info(self):
+        return {
+            "time": self.connection.simulation.getTime(),
+            "vehicles": self.connection.vehicle.getIDCount(),
+        }
@@ -0,0 +1,322 @@
+import atexit
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+from Agents.log_store import check_log_format, new_run_id, write_partition
+
+INITIAL_CAPACITY = 4096  # Rows preallocated per table; tables double when full
+CHUNK_ROWS = 50000  # Rows buffered by a streaming writer before they are handed to its thread
+MAX_PENDING_CHUNKS = 4  # Chunks waiting for the writer thread before recording blocks
+
+# Column headers of the exported CSV files
+QUEUE_COLUMNS = ["Step", "TLS ID", "Road ID", "Queue Length"]
+SPEED_COLUMNS = ["Step", "Edge ID", "Avg Speed (m/s)"]
+
+
+class IdInterner:
+    """
+    Maps string IDs to dense integer codes, so tables store one int32 per ID.
+    """
+
+    def __init__(self):
+        self.codes = {}  # ID -> code
+        self.ids = []  # Code -> ID
+        self._last_ids = None  # The last tuple passed to codes_for() and its codes
+        self._last_codes = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def code(self, object_id):
+        # Returns the code of an ID, assigning the next free code to unseen IDs
+        code = self.codes.get(object_id)
+        if code is None:
+            code = len(self.ids)
+            self.codes[object_id] = code
+            self.ids.append(object_id)
+        return code
+
+    def codes_for(self, object_ids):
+        # Returns the codes of several IDs as an int32 array; a tuple passed again reuses its codes
+        if object_ids is self._last_ids:
+            return self._last_codes
+        codes = np.fromiter((self.code(object_id) for object_id in object_ids), dtype=np.int32, count=len(object_ids))
+        if isinstance(object_ids, tuple):
+            self._last_ids, self._last_codes = object_ids, codes
+        return codes
+
+    def decode(self, codes):
+        # Returns a categorical view of codes; the ID strings are stored once, not per row
+        return pd.Categorical.from_codes(codes, categories=pd.Index(self.ids, dtype=object))
+
+
+class ColumnTable:
+    """
+    Equal-length NumPy columns with amortized O(1) appends.
+
+    Parameters:
+    - dtypes: Dict mapping column names to NumPy dtypes.
+    - capacity: Rows to preallocate.
+    """
+
+    def __init__(self, dtypes, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.capacity = max(1, capacity)
+        self.columns = {name: np.empty(self.capacity, dtype=dtype) for name, dtype in dtypes.items()}
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, rows):
+        # Grows every column geometrically until rows more rows fit
+        needed = self.size + rows
+        if needed <= self.capacity:
+            return
+        while self.capacity < needed:
+            self.capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.empty(self.capacity, dtype=column.dtype)
+            grown[: self.size] = column[: self.size]
+            self.columns[name] = grown
+
+    def append(self, rows, **values):
+        """
+        Appends a block of rows.
+
+        Parameters:
+        - rows: Number of rows in the block.
+        - values: One value per column, either a scalar broadcast to every row or a sequence of length rows.
+        """
+        if rows <= 0:
+            return
+        self.reserve(rows)
+        end = self.size + rows
+        for name, value in values.items():
+            self.columns[name][self.size : end] = value
+        self.size = end
+
+    def view(self, name):
+        # Returns the filled part of a column without copying it
+        return self.columns[name][: self.size]
+
+
+class TrafficRecorder:
+    """
+    Per-step queue lengths and edge speeds of an adaptive agent run, stored column-wise.
+
+    Each row costs a few bytes in preallocated NumPy arrays instead of one Python dict,
+    and TLS, road and edge IDs are interned to integer codes.
+
+    Parameters:
+    - capacity: Rows to preallocate per table.
+    - interners: (TLS, road, edge) IdInterners to share with another recorder, if any.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY, interners=None):
+        if interners is None:
+            interners = (IdInterner(), IdInterner(), IdInterner())
+        self.tls_ids, self.road_ids, self.edge_ids = interners
+        self.queue_length = ColumnTable(
+            {"step": np.int32, "tls": np.int32, "road": np.int32, "queue_length": np.int32}, capacity
+        )
+        self.avg_speed = ColumnTable({"step": np.int32, "edge": np.int32, "avg_speed": np.float64}, capacity)
+
+    def record_queues(self, step, tls_id, queue_lengths):
+        """
+        Records the queue length of every road at a traffic light.
+
+        Parameters:
+        - step: The simulation step.
+        - tls_id: The ID of the traffic light.
+        - queue_lengths: Dict mapping road IDs to queue lengths.
+        """
+        rows = len(queue_lengths)
+        self.queue_length.append(
+            rows,
+            step=step,
+            tls=self.tls_ids.code(tls_id),
+            road=self.road_ids.codes_for(list(queue_lengths)),
+            queue_length=np.fromiter(queue_lengths.values(), dtype=np.int32, count=rows),
+        )
+
+    def record_queue_rows(self, step, tls_ids, road_ids, queue_lengths):
+        """
+        Records a block of queue lengths, one row per (TLS, road) pair.
+
+        Parameters:
+        - step: The simulation step.
+        - tls_ids: The TLS ID of each row. Pass the same tuple every step to intern it once.
+        - road_ids: The road ID of each row, likewise.
+        - queue_lengths: The queue length of each row.
+        """
+        self.queue_length.append(
+            len(tls_ids),
+            step=step,
+            tls=self.tls_ids.codes_for(tls_ids),
+            road=self.road_ids.codes_for(road_ids),
+            queue_length=queue_lengths,
+        )
+
+    def record_speeds(self, step, edge_ids, avg_speeds):
+        """
+        Records the average speed of several edges.
+
+        Parameters:
+        - step: The simulation step.
+        - edge_ids: The IDs of the edges.
+        - avg_speeds: Their average speeds, in the same order.
+        """
+        self.avg_speed.append(
+            len(edge_ids),
+            step=step,
+            edge=self.edge_ids.codes_for(edge_ids),
+            avg_speed=avg_speeds,
+        )
+
+    def queue_frame(self):
+        # Returns the queue lengths as a DataFrame over views of the recorded columns
+        return pd.DataFrame(
+            {
+                "Step": self.queue_length.view("step"),
+                "TLS ID": self.tls_ids.decode(self.queue_length.view("tls")),
+                "Road ID": self.road_ids.decode(self.queue_length.view("road")),
+                "Queue Length": self.queue_length.view("queue_length"),
+            },
+            columns=QUEUE_COLUMNS,
+            copy=False,
+        )
+
+    def speed_frame(self):
+        # Returns the edge speeds as a DataFrame over views of the recorded columns
+        return pd.DataFrame(
+            {
+                "Step": self.avg_speed.view("step"),
+                "Edge ID": self.edge_ids.decode(self.avg_speed.view("edge")),
+                "Avg Speed (m/s)": self.avg_speed.view("avg_speed"),
+            },
+            columns=SPEED_COLUMNS,
+            copy=False,
+        )
+
+    def memory_usage(self):
+        # Returns the bytes held by the recorded columns, including unused capacity
+        tables = (self.queue_length, self.avg_speed)
+        return sum(column.nbytes for table in tables for column in table.columns.values())
+
+
+class StreamingTrafficWriter:
+    """
+    Streams queue and speed rows to their log files in bounded chunks during the run.
+
+    Rows are recorded into a TrafficRecorder chunk. Once a chunk holds chunk_rows rows,
+    its DataFrames are queued for a background thread that appends them to the files,
+    and recording continues into a fresh chunk. Memory stays bounded by the chunk size
+    and the number of pending chunks, and the files hold every flushed chunk if the
+    run stops early. With the parquet or arrow log format, each chunk becomes one
+    partition file per log under <log name>/run=<run ID>/.
+
+    Parameters:
+    - queue_file: Path of the queue lengths CSV.
+    - speed_file: Path of the edge speeds CSV.
+    - chunk_rows: Rows buffered before a chunk is handed to the writer thread.
+    - max_pending: Chunks that may wait for the writer thread before recording blocks.
+    - log_format: "csv", "parquet" or "arrow".
+    - run_id: The run the partitions belong to. Defaults to the current time.
+    """
+
+    def __init__(
+        self,
+        queue_file,
+        speed_file,
+        chunk_rows=CHUNK_ROWS,
+        max_pending=MAX_PENDING_CHUNKS,
+        log_format="csv",
+        run_id=None,
+    ):
+        self.queue_file = queue_file
+        self.speed_file = speed_file
+        self.chunk_rows = chunk_rows
+        self.log_format = check_log_format(log_format)
+        self.run_id = run_id if run_id is not None else new_run_id()
+        self.interners = (IdInterner(), IdInterner(), IdInterner())
+        self.chunk = TrafficRecorder(min(chunk_rows, INITIAL_CAPACITY), self.interners)
+        self.rows_written = {queue_file: 0, speed_file: 0}
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._registered = False
+
+    def record_queues(self, step, tls_id, queue_lengths):
+        # Records the queue length of every road at a traffic light
+        self.chunk.record_queues(step, tls_id, queue_lengths)
+        self._flush_if_full()
+
+    def record_queue_rows(self, step, tls_ids, road_ids, queue_lengths):
+        # Records a block of queue lengths, one row per (TLS, road) pair
+        self.chunk.record_queue_rows(step, tls_ids, road_ids, queue_lengths)
+        self._flush_if_full()
+
+    def record_speeds(self, step, edge_ids, avg_speeds):
+        # Records the average speed of several edges
+        self.chunk.record_speeds(step, edge_ids, avg_speeds)
+        self._flush_if_full()
+
+    def _flush_if_full(self):
+        if len(self.chunk.queue_length) + len(self.chunk.avg_speed) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Hands the buffered rows to the writer thread and starts a new chunk.
+        """
+        chunk = self.chunk
+        if not len(chunk.queue_length) and not len(chunk.avg_speed):
+            return
+        self.chunk = TrafficRecorder(min(self.chunk_rows, INITIAL_CAPACITY), self.interners)
+        frames = []
+        if len(chunk.queue_length):
+            frames.append((self.queue_file, chunk.queue_frame()))
+        if len(chunk.avg_speed):
+            frames.append((self.speed_file, chunk.speed_frame()))
+        self._start()
+        self._pending.put(frames)  # Blocks while max_pending chunks are still being written
+
+    def close(self):
+        """
+        Writes the buffered rows and waits for the writer thread to finish. Safe to call more than once.
+        """
+        self.flush()
+        if self._thread is not None:
+            self._pending.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _start(self):
+        # Starts the writer thread on the first flush
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._write_chunks, name="traffic-writer", daemon=True)
+        self._thread.start()
+        if not self._registered:
+            # Write pending chunks even if the agent exits without closing the writer
+            atexit.register(self.close)
+            self._registered = True
+
+    def _write_chunks(self):
+        while True:
+            frames = self._pending.get()
+            if frames is None:
+                return
+            for path, frame in frames:
+                try:
+                    if self.log_format == "csv":
+                        first_chunk = not self.rows_written[path]
+                        frame.to_csv(path, mode="w" if first_chunk else "a", header=first_chunk, index=False)
+                    else:
+                        steps = frame["Step"]
+                        write_partition(frame, path, self.log_format, self.run_id, steps.min(), steps.max())
+                    self.rows_written[path] += len(frame)
+                except Exception as e:
+                    print(f"Error writing {path}: {e}")
@@ -0,0 +1,162 @@
+import multiprocessing as mp
+import os
+import traceback
+
+import numpy as np
+
+# Agents modules that import traci are only imported in the workers, after the worker's backend is installed
+
+
+def env_worker(pipe, backend, env_kwargs, index=0, num_envs=1):
+    """
+    Runs one TrafficEnv in a worker process and serves reset/step/close commands from a pipe.
+
+    Parameters:
+    - pipe: The worker's end of the command pipe.
+    - backend: Backend to install before the environment is imported, e.g. "auto" for libsumo.
+    - env_kwargs: Keyword arguments of TrafficEnv.
+    - index: The worker's environment index.
+    - num_envs: Number of environments. Each auto-reset advances the seed by this much, so no
+      two episodes of the vector environment share a seed.
+    """
+    from Agents.backend import install
+
+    install(backend)
+    from Agents.traffic_env import TrafficEnv
+
+    env = TrafficEnv(**env_kwargs)
+    seed = None  # Seed of the current episode; None while it runs on the config's seed
+    try:
+        while True:
+            command, data = pipe.recv()
+            try:
+                if command == "reset":
+                    seed = data
+                    observation, info = env.reset(seed=seed)
+                    pipe.send(("ok", (observation, info, list(env.tls_ids))))
+                elif command == "step":
+                    observation, reward, terminated, truncated, info = env.step(data)
+                    if terminated or truncated:
+                        # Start the next episode right away, as Gymnasium's vector environments do
+                        info["final_info"] = dict(info)
+                        info["final_observation"] = observation
+                        seed = (index if seed is None else seed) + num_envs
+                        observation, reset_info = env.reset(seed=seed)
+                        info.update(reset_info)
+                    pipe.send(("ok", (observation, reward, terminated, truncated, info)))
+                elif command == "close":
+                    break
+            except Exception as e:
+                traceback.print_exc()
+                pipe.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        env.close()
+        pipe.close()
+
+
+class VectorTrafficEnv:
+    """
+    Runs N TrafficEnv simulations in worker processes and batches their observations and rewards.
+
+    Every worker runs its own headless SUMO, in-process through libsumo when the backend is
+    "auto" and libsumo is installed, so the simulations step in parallel across cores. All
+    environments must use the same network, so their observations stack. Episodes that end
+    are reset inside step() with the environment's seed advanced by num_envs, so every episode
+    gets a seed of its own; the last observation of the ended episode is returned in that
+    environment's info["final_observation"].
+
+    Parameters:
+    - num_envs: Number of simulations. Defaults to the number of cores.
+    - backend: "auto" (libsumo when installed) or "traci".
+    - **env_kwargs: Keyword arguments of TrafficEnv, shared by all environments.
+    """
+
+    def __init__(self, num_envs=None, backend="auto", **env_kwargs):
+        self.num_envs = num_envs or os.cpu_count()
+        self.tls_ids = ()
+        # Spawned workers import the agents' modules fresh, after their backend is installed
+        context = mp.get_context("spawn")
+        self.pipes = []
+        self.processes = []
+        for index in range(self.num_envs):
+            parent_pipe, worker_pipe = context.Pipe()
+            process = context.Process(
+                target=env_worker, args=(worker_pipe, backend, env_kwargs, index, self.num_envs), daemon=True
+            )
+            process.start()
+            worker_pipe.close()
+            self.pipes.append(parent_pipe)
+            self.processes.append(process)
+
+    def __len__(self):
+        return self.num_envs
+
+    def reset(self, seed=None):
+        """
+        Starts a new episode in every environment.
+
+        Parameters:
+        - seed: Base seed; environment i is seeded with seed + i, and its k-th auto-reset with
+          seed + i + k * num_envs. None uses the config's seed, then counts up from i + num_envs.
+
+        Returns:
+        - observations: Array of shape (num_envs, num_tls, max_roads + 2).
+        - infos: One info dict per environment.
+        """
+        for index, pipe in enumerate(self.pipes):
+            pipe.send(("reset", None if seed is None else seed + index))
+        results = self._receive()
+        self.tls_ids = tuple(results[0][2])
+        return np.stack([observation for observation, _, _ in results]), [info for _, info, _ in results]
+
+    def step(self, actions):
+        """
+        Steps every environment with its row of actions, in parallel.
+
+        Parameters:
+        - actions: Array of shape (num_envs, num_tls) with one phase duration per TLS.
+
+        Returns:
+        - observations: (num_envs, num_tls, max_roads + 2) float32.
+        - rewards: (num_envs, num_tls) float32.
+        - terminated, truncated: (num_envs,) bool.
+        - infos: One info dict per environment.
+        """
+        actions = np.asarray(actions, dtype=np.float64)
+        for pipe, action in zip(self.pipes, actions):
+            pipe.send(("step", action))
+        results = self._receive()
+        observations, rewards, terminated, truncated, infos = zip(*results)
+        return (
+            np.stack(observations),
+            np.stack(rewards),
+            np.array(terminated, dtype=bool),
+            np.array(truncated, dtype=bool),
+            list(infos),
+        )
+
+    def close(self):
+        # Stops every worker and its simulation
+        for pipe in self.pipes:
+            try:
+                pipe.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.pipes = []
+        self.processes = []
+
+    def _receive(self):
+        # Collects one reply per worker, raising if any worker failed
+        results, errors = [], []
+        for index, pipe in enumerate(self.pipes):
+            status, result = pipe.recv()
+            if status == "error":
+                errors.append(f"env {index}: {result}")
+            results.append(result)
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return results
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_dir)
+from Agents.async_control import AsyncSimulation, run_farm
+from Testers.batch_runner import SCENARIOS
+
+
+def build_simulations(scenarios, seeds, end=None, sumo_args=(), params=None):
+    """
+    Creates one AsyncSimulation per scenario and seed.
+
+    Parameters:
+    - scenarios: Scenario names from SCENARIOS.
+    - seeds: SUMO random seeds.
+    - end: Simulation time each run stops at. Defaults to running until no vehicles are expected.
+    - sumo_args: Extra SUMO options for every simulation.
+    - params: Overrides of V6's control parameters.
+
+    Returns:
+    - A list of AsyncSimulation.
+    """
+    simulations = []
+    for scenario in scenarios:
+        config, scenario_args = SCENARIOS[scenario]
+        args = list(scenario_args) + list(sumo_args)
+        for seed in seeds:
+            simulations.append(
+                AsyncSimulation(f"{scenario}-{seed}", config, seed, sumo_args=args, params=params, end=end)
+            )
+    return simulations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run many small V6 simulations from one asyncio event loop and report the throughput."
+    )
+    parser.add_argument("--scenarios", nargs="+", default=["twoLane"], choices=list(SCENARIOS))
+    parser.add_argument("--seeds", nargs="+", type=int, default=list(range(8)))
+    parser.add_argument("--end", type=float, default=None, help="Simulation time each run stops at")
+    parser.add_argument(
+        "--concurrency", type=int, default=None, help="Most simulations running at once (default: all; 1: one by one)"
+    )
+    parser.add_argument("--output", default=None, help="Write the per-simulation results to this CSV")
+    args = parser.parse_args(argv)
+
+    simulations = build_simulations(args.scenarios, args.seeds, args.end, ["--no-warnings", "true"])
+    results, seconds = run_farm(simulations, args.concurrency)
+    steps = results["steps"].sum()
+    print(results.drop(columns=["config"]).to_string(index=False))
+    print(
+        f"{len(results)} simulations, {steps} steps in {seconds:.2f} s "
+        f"({steps / max(seconds, 1e-9):.0f} steps/s, {results['error'].notna().sum()} failed)"
+    )
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
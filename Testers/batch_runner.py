@@ -0,0 +1,366 @@
+import argparse
+import contextlib
+import importlib
+import itertools
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+import traceback
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from multiprocessing.connection import wait
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_dir)
+import pandas as pd
+
+# SUMO configurations in the scenario matrix. Extra SUMO options are applied on top of the config.
+Scenario = namedtuple("Scenario", ["config", "sumo_args"])
+SCENARIOS = {
+    "oneLane": Scenario(os.path.join(repo_dir, "CustomNetworks", "oneLaneMap.sumocfg"), []),
+    "twoLane": Scenario(os.path.join(repo_dir, "CustomNetworks", "twoLaneMap.sumocfg"), []),
+    "threeLane": Scenario(os.path.join(repo_dir, "CustomNetworks", "threeLaneMap.sumocfg"), []),
+    # basemap.sumocfg points at a basemap.net.xml that is not checked in, and at port 3131, on which
+    # in-process libsumo would wait for a client forever; SUMO rejects a second --remote-port, so
+    # the port cannot be overridden here. The simplified OSM net has neither connections nor
+    # traffic lights, so basemap.connected.sumocfg runs that net rebuilt by netconvert with its
+    # connections computed and lights at the 75 junctions of 3+ approaches, without a remote port,
+    # and random_routes.rou.xml from randomTrips.py --validate on it
+    "basemap": Scenario(os.path.join(repo_dir, "basemap", "Simplified", "basemap.connected.sumocfg"), []),
+}
+
+# Agents in the matrix: module, entry point and the tester module holding its metrics engine
+AgentSpec = namedtuple("AgentSpec", ["module", "entry_point", "metrics_module"])
+AGENTS = {
+    "baseline": AgentSpec("Agents.baseline_agent", "run_baseline", "Testers.performance_testing_Bl"),
+    "adaptive": AgentSpec("Agents.adaptive_agent", "run_adaptive", None),
+    "V3": AgentSpec("Agents.V3adaptive_agent", "run_adaptive_agent", "Testers.performance_testing_AD"),
+    "V4": AgentSpec("Agents.V4adaptive_agent", "run_adaptive_agent", None),
+    "V5": AgentSpec("Agents.V5adaptive_agent", "run_adaptive_agent", "Testers.performance_testing_AD"),
+    "V6": AgentSpec("Agents.V6adaptive_agent", "run_adaptive_agent", "Testers.performance_testing_AD"),
+}
+
+# One cell of the matrix. backend is "auto" (libsumo in-process when installed) or "traci";
+# params maps agent module globals to the values this run overrides them with
+RunTask = namedtuple(
+    "RunTask",
+    ["scenario", "agent", "seed", "run_dir", "port", "end", "sumo_args", "backend", "params"],
+    defaults=["auto", None],
+)
+
+results_file = "results.csv"  # Written to the batch output directory
+TASK_TIMEOUT = 3600  # Seconds a run may take before its worker is terminated
+
+
+def build_tasks(scenarios, agents, seeds, output_dir, base_port=None, end=None, sumo_args=(), backend="auto"):
+    """
+    Expands the scenario x seed x agent matrix into run tasks.
+
+    Parameters:
+    - scenarios: Scenario names from SCENARIOS.
+    - agents: Agent names from AGENTS.
+    - seeds: SUMO random seeds.
+    - output_dir: Directory the per-run directories are created in.
+    - base_port: First TraCI port. Defaults to a free port chosen by each run.
+    - end: Simulation time each run ends at. Defaults to running until no vehicles are expected.
+    - sumo_args: Extra SUMO options for every run.
+    - backend: "auto" to run SUMO in-process through libsumo when it is installed, or "traci".
+
+    Returns:
+    - A list of RunTask.
+    """
+    tasks = []
+    for index, (scenario, seed, agent) in enumerate(itertools.product(scenarios, seeds, agents)):
+        if scenario not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {scenario!r}. Expected one of {list(SCENARIOS)}")
+        if agent not in AGENTS:
+            raise ValueError(f"Unknown agent {agent!r}. Expected one of {list(AGENTS)}")
+        tasks.append(
+            RunTask(
+                scenario=scenario,
+                agent=agent,
+                seed=seed,
+                run_dir=os.path.abspath(os.path.join(output_dir, scenario, agent, f"seed_{seed}")),
+                port=base_port + index if base_port is not None else None,
+                end=end,
+                sumo_args=list(sumo_args),
+                backend=backend,
+            )
+        )
+    return tasks
+
+
+# Statistics SUMO sums up per finished trip and does not save in a state: a run resumed from a
+# snapshot only counts the trips that ended after it, while the vehicle counts include the warm-up
+TRIP_STATISTICS = ("vehicleTripStatistics", "pedestrianStatistics", "rideStatistics", "transportStatistics")
+post_fork_prefix = "post_fork."
+
+
+def read_statistics(statistics_file):
+    # Flattens SUMO's --statistic-output into {"<element>.<attribute>": value}
+    statistics = {}
+    try:
+        root = ET.parse(statistics_file).getroot()
+    except (OSError, ET.ParseError):
+        return statistics
+    for element in root:
+        for attribute, value in element.attrib.items():
+            try:
+                statistics[f"{element.tag}.{attribute}"] = float(value)
+            except ValueError:
+                statistics[f"{element.tag}.{attribute}"] = value
+    return statistics
+
+
+def prepare_run_dir(task, log_name="run.log"):
+    """
+    Moves the worker process into the task's run directory and sends its console output to a log there.
+    Only call in a worker process dedicated to the task.
+
+    Parameters:
+    - task: The RunTask being run.
+    - log_name: File in the run directory that receives agent and SUMO console output.
+    """
+    os.makedirs(os.path.join(task.run_dir, "Logs"), exist_ok=True)
+    os.chdir(task.run_dir)  # Agents write their logs relative to the working directory
+    random.seed(task.seed)
+
+    log_handle = open(log_name, "w")
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(log_handle.fileno(), 1)
+    os.dup2(log_handle.fileno(), 2)
+
+
+def patch_traci_start(task, sumo_args=()):
+    """
+    Makes the agents' own traci.start() calls headless and adds the run's SUMO options.
+    Installs the task's backend first, so call before load_agent().
+
+    SUMO keeps stepping past --end while a TraCI client drives it, so the task's end time is
+    also set on the backend, which ends the agents' loops there.
+
+    Parameters:
+    - task: The RunTask being run.
+    - sumo_args: SUMO options on top of the scenario's, the task's and the seed.
+    """
+    from Agents.backend import install
+
+    traci = install(task.backend)
+    scenario = SCENARIOS[task.scenario]
+    sumo_args = (
+        scenario.sumo_args
+        + ["--seed", str(task.seed), "--no-step-log", "true"]
+        + list(sumo_args)
+        + task.sumo_args
+    )
+    if task.end is not None:
+        sumo_args += ["--end", str(task.end)]
+    traci.end_time = task.end
+    start = traci.start
+
+    def start_headless(cmd, port=None, label="default", **kwargs):
+        port = port if port is not None else task.port
+        label = f"{task.scenario}-{task.agent}-{task.seed}"
+        return start(list(cmd) + sumo_args, port=port, label=label, **kwargs)
+
+    traci.start = start_headless
+
+
+def load_agent(task):
+    # Imports the task's agent module and points it at the scenario, headless
+    scenario = SCENARIOS[task.scenario]
+    agent = importlib.import_module(AGENTS[task.agent].module)
+    agent.sumoBinary = "sumo"
+    agent.sumoConfig = scenario.config
+    if hasattr(agent, "log_file"):
+        # baseline_agent logs to ../Logs; keep every log inside the run directory
+        agent.log_file = os.path.join("Logs", os.path.basename(agent.log_file))
+    for name, value in (task.params or {}).items():
+        if not hasattr(agent, name):
+            raise ValueError(f"Agent {task.agent} has no parameter {name!r}")
+        setattr(agent, name, value)
+    return agent
+
+
+def active_backend():
+    # Returns "libsumo" or "traci", whichever ran the last simulation in this process
+    import traci
+
+    return getattr(traci, "active_backend", "traci")
+
+
+def close_traci():
+    # Closes the run's TraCI connection if the agent left it open
+    import traci
+
+    if traci.isLoaded():
+        with contextlib.suppress(Exception):
+            traci.close()
+
+
+def run_task(task):
+    """
+    Runs one agent on one scenario headless and returns its row of the results table.
+    Runs in a fresh worker process, so agent and tester module state never leaks between runs.
+
+    Parameters:
+    - task: The RunTask to run.
+
+    Returns:
+    - Dict of run metadata, SUMO statistics and tester metrics. SUMO's trip statistics of a run
+      resumed from a snapshot are prefixed with "post_fork.", as they leave out the warm-up.
+    """
+    row = {
+        "scenario": task.scenario,
+        "agent": task.agent,
+        "seed": task.seed,
+        "backend": task.backend,
+        "status": "ok",
+        "error": "",
+    }
+    row.update({f"param.{name}": value for name, value in (task.params or {}).items()})
+    statistics_file = os.path.join(task.run_dir, "statistics.xml")
+    spec = AGENTS[task.agent]
+
+    prepare_run_dir(task)
+    patch_traci_start(task, ["--statistic-output", statistics_file, "--duration-log.statistics", "true"])
+
+    started = time.perf_counter()
+    try:
+        agent = load_agent(task)
+        result = getattr(agent, spec.entry_point)()
+        if hasattr(agent, "write_data_to_csv"):
+            agent.write_data_to_csv(result if result is not None else agent.rt_traffic_data)
+    except Exception as e:
+        traceback.print_exc()
+        row["status"] = "error"
+        row["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        row["backend"] = active_backend()
+        close_traci()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    row["wall_time"] = time.perf_counter() - started
+
+    # The agents report most errors by printing them; SUMO only fills in statistics after a completed run
+    statistics = read_statistics(statistics_file)
+    if row["status"] == "ok" and not statistics:
+        row["status"] = "error"
+        row["error"] = "SUMO wrote no statistics, see run.log"
+    if (task.params or {}).get("resume_snapshot"):
+        statistics = {
+            (post_fork_prefix + name if name.split(".")[0] in TRIP_STATISTICS else name): value
+            for name, value in statistics.items()
+        }
+
+    if spec.metrics_module is not None and row["status"] == "ok":
+        row.update(importlib.import_module(spec.metrics_module).engine.summary())
+    row.update(statistics)
+    return row
+
+
+def error_row(task, error):
+    # Results row of a run that produced no row of its own
+    return {"scenario": task.scenario, "agent": task.agent, "seed": task.seed, "status": "error", "error": error}
+
+
+def run_task_in_worker(task, pipe):
+    # Worker process entry point: sends the task's results row back through the pipe
+    try:
+        row = run_task(task)
+    except Exception as e:
+        row = error_row(task, f"{type(e).__name__}: {e}")
+    pipe.send(row)
+    pipe.close()
+
+
+def run_batch(tasks, workers=None, output_dir="BatchRuns", timeout=TASK_TIMEOUT):
+    """
+    Runs tasks in worker processes and collects one results table.
+
+    Parameters:
+    - tasks: RunTasks from build_tasks().
+    - workers: Worker processes. Defaults to the number of cores.
+    - output_dir: Directory the results table is written to.
+    - timeout: Seconds a run may take before its worker is terminated and the run recorded as
+      an error, so one stuck simulation cannot hold up the batch. None waits forever.
+
+    Returns:
+    - A DataFrame with one row per run.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    pending = list(tasks)
+    running = []  # (task, process, pipe, start time)
+    workers = workers or os.cpu_count()
+    while pending or running:
+        # One task per worker process: the agents keep their state in module globals
+        while pending and len(running) < workers:
+            task = pending.pop(0)
+            parent_pipe, worker_pipe = mp.Pipe(duplex=False)
+            process = mp.Process(target=run_task_in_worker, args=(task, worker_pipe))
+            process.start()
+            worker_pipe.close()
+            running.append((task, process, parent_pipe, time.monotonic()))
+
+        # Wake up when a worker reports or exits, or at least every second to check the timeouts
+        wait([pipe for _, _, pipe, _ in running] + [process.sentinel for _, process, _, _ in running], 1)
+        still_running = []
+        for task, process, pipe, started in running:
+            row = None
+            if pipe.poll():
+                try:
+                    row = pipe.recv()
+                except EOFError:
+                    row = error_row(task, f"Worker exited with code {process.exitcode} without a result")
+            elif not process.is_alive():
+                row = error_row(task, f"Worker exited with code {process.exitcode} without a result")
+            elif timeout is not None and time.monotonic() - started > timeout:
+                process.terminate()
+                row = error_row(task, f"TimeoutError: run took longer than {timeout} s")
+            if row is None:
+                still_running.append((task, process, pipe, started))
+                continue
+            process.join()
+            pipe.close()
+            print(f"[{len(rows) + 1}/{len(tasks)}] {task.scenario} {task.agent} seed {task.seed}: {row['status']}")
+            rows.append(row)
+        running = still_running
+
+    results = pd.DataFrame(rows)
+    if not results.empty:
+        param_columns = [column for column in results.columns if column.startswith("param.")]
+        results = results.sort_values(["scenario", "agent", "seed"] + param_columns, ignore_index=True)
+    results.to_csv(os.path.join(output_dir, results_file), index=False)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run agents headless over a scenario and seed matrix.")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--agents", nargs="+", default=list(AGENTS), choices=list(AGENTS))
+    parser.add_argument("--seeds", nargs="+", type=int, default=[42])
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--end", type=float, default=None, help="Simulation time each run ends at")
+    parser.add_argument(
+        "--timeout", type=float, default=TASK_TIMEOUT, help="Seconds before a run is stopped and recorded as an error"
+    )
+    parser.add_argument("--base-port", type=int, default=None, help="First TraCI port (default: free ports)")
+    parser.add_argument("--output", default="BatchRuns", help="Output directory")
+    parser.add_argument(
+        "--backend", default="auto", choices=["auto", "traci"], help="auto uses libsumo in-process when installed"
+    )
+    args = parser.parse_args(argv)
+
+    tasks = build_tasks(
+        args.scenarios, args.agents, args.seeds, args.output, args.base_port, args.end, backend=args.backend
+    )
+    results = run_batch(tasks, args.workers, args.output, args.timeout)
+    print(f"Results for {len(results)} runs written to {os.path.join(args.output, results_file)}")
+
+
+if __name__ == "__main__":
+    main()
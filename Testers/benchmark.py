@@ -0,0 +1,320 @@
+import argparse
+import functools
+import importlib
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_dir)
+import numpy as np
+from Testers.batch_runner import (
+    AGENTS,
+    SCENARIOS,
+    active_backend,
+    build_tasks,
+    close_traci,
+    load_agent,
+    patch_traci_start,
+    prepare_run_dir,
+)
+
+BENCHMARK_STEPS = 1000  # Simulation steps timed per agent
+PERCENTILES = (50, 95, 99)
+REGRESSION_TOLERANCE = 0.10  # Relative slowdown reported as a regression by --compare
+
+# Where each step's time goes; "controller" is whatever the other sections do not cover
+SECTIONS = ("traci", "metrics", "logging")
+
+
+class BenchmarkComplete(BaseException):
+    # Raised from simulationStep() after the benchmarked steps; BaseException gets past the agents' handlers
+    pass
+
+
+class StepProfiler:
+    """
+    Times simulation steps and the sections of each step inside one agent run.
+
+    Step latency is the time between consecutive simulationStep() calls, so it covers
+    TraCI I/O, controller logic, metrics and logging. Section times are exclusive: time
+    spent in TraCI calls made by the metrics counts as TraCI, not metrics. Over TraCI each
+    socket round trip counts as a call; with libsumo each call into a libsumo function does.
+
+    Parameters:
+    - max_steps: Steps to time before the run is stopped.
+    """
+
+    def __init__(self, max_steps=BENCHMARK_STEPS):
+        self.max_steps = max_steps
+        self.step_starts = []
+        self.section_times = dict.fromkeys(SECTIONS, 0.0)
+        self.traci_calls = 0
+        self._nested = []  # Time spent in nested sections, per open section
+
+    def timed(self, section, function):
+        # Wraps function so its exclusive run time is added to section
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            self._nested.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.section_times[section] += elapsed - self._nested.pop()
+                if self._nested:
+                    self._nested[-1] += elapsed
+
+        return wrapper
+
+    def counted(self, function):
+        # Wraps a TraCI round trip or libsumo call so it is counted and timed
+        timed = self.timed("traci", function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            self.traci_calls += 1
+            return timed(*args, **kwargs)
+
+        return wrapper
+
+    def stepped(self, function):
+        # Wraps simulationStep() to timestamp each step and stop the run after max_steps
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if len(self.step_starts) >= self.max_steps:
+                self.step_starts.append(time.perf_counter())  # Closes the last timed step
+                raise BenchmarkComplete()
+            self.step_starts.append(time.perf_counter())
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    def instrument(self, metrics_module=None):
+        """
+        Installs the timing wrappers in this process.
+
+        Parameters:
+        - metrics_module: The tester module whose engine the agent reports to, if any.
+        """
+        import traci
+        import traci.connection
+        from Agents.backend import wrap_libsumo_calls
+        from Agents.traffic_recorder import StreamingTrafficWriter, TrafficRecorder
+
+        traci.simulationStep = self.stepped(traci.simulationStep)
+        connection = traci.connection.Connection
+        connection._sendExact = self.counted(connection._sendExact)
+        # In-process libsumo calls skip the connection, so they are counted at libsumo itself
+        wrap_libsumo_calls(self.counted)
+
+        if metrics_module is not None:
+            engine = importlib.import_module(metrics_module).engine
+            engine.gather_performance_data = self.timed("metrics", engine.gather_performance_data)
+            engine.flush_metrics = self.timed("logging", engine.flush_metrics)
+
+        TrafficRecorder.record_queues = self.timed("logging", TrafficRecorder.record_queues)
+        TrafficRecorder.record_queue_rows = self.timed("logging", TrafficRecorder.record_queue_rows)
+        TrafficRecorder.record_speeds = self.timed("logging", TrafficRecorder.record_speeds)
+        StreamingTrafficWriter.flush = self.timed("logging", StreamingTrafficWriter.flush)
+
+    def report(self):
+        """
+        Summarizes the timed steps.
+
+        Returns:
+        - Dict with step latency percentiles in milliseconds, steps per second, TraCI calls
+          (or libsumo calls) per step and the mean time per step spent in each section.
+        """
+        # The last start only closes the final step when the run was stopped by the profiler
+        latencies = np.diff(self.step_starts) * 1000.0
+        steps = len(latencies)
+        if not steps:
+            return {"steps": 0}
+        total_ms = float(latencies.sum())
+        section_ms = {section: seconds * 1000.0 / steps for section, seconds in self.section_times.items()}
+        section_ms["controller"] = max(0.0, total_ms / steps - sum(section_ms.values()))
+
+        report = {"steps": steps}
+        report["step_latency_ms"] = {f"p{p}": float(np.percentile(latencies, p)) for p in PERCENTILES}
+        report["step_latency_ms"]["mean"] = float(latencies.mean())
+        report["step_latency_ms"]["max"] = float(latencies.max())
+        report["steps_per_second"] = steps / (total_ms / 1000.0) if total_ms else None
+        report["traci_calls_per_step"] = self.traci_calls / steps
+        report["time_per_step_ms"] = section_ms
+        return report
+
+
+def benchmark_task(task, max_steps=BENCHMARK_STEPS):
+    """
+    Runs one agent headless for max_steps steps and profiles it.
+    Runs in a fresh worker process, so the instrumentation never outlives the run.
+
+    Parameters:
+    - task: The RunTask to run.
+    - max_steps: Steps to time.
+
+    Returns:
+    - Dict of run metadata, the profiler report and peak RSS.
+    """
+    spec = AGENTS[task.agent]
+    result = {
+        "agent": task.agent,
+        "scenario": task.scenario,
+        "seed": task.seed,
+        "backend": task.backend,
+        "status": "ok",
+        "error": "",
+    }
+
+    prepare_run_dir(task, "benchmark.log")
+    patch_traci_start(task)
+    profiler = StepProfiler(max_steps)
+    profiler.instrument(spec.metrics_module)
+
+    try:
+        agent = load_agent(task)
+        getattr(agent, spec.entry_point)()
+    except BenchmarkComplete:
+        pass
+    except Exception as e:
+        traceback.print_exc()
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        result["backend"] = active_backend()
+        close_traci()  # Waits for SUMO, so its peak RSS is counted below
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    result.update(profiler.report())
+    if result["steps"] == 0 and result["status"] == "ok":
+        result["status"] = "error"
+        result["error"] = "No simulation steps were run, see benchmark.log"
+
+    # ru_maxrss is in kilobytes on Linux
+    result["peak_rss_mb"] = {
+        "agent": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "sumo": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0,
+    }
+    return result
+
+
+def run_benchmarks(tasks, max_steps=BENCHMARK_STEPS):
+    """
+    Benchmarks tasks one at a time, each in its own process, so runs do not compete for cores.
+
+    Parameters:
+    - tasks: RunTasks from build_tasks().
+    - max_steps: Steps to time per run.
+
+    Returns:
+    - A list of per-run results.
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+        for task in tasks:
+            try:
+                result = pool.submit(benchmark_task, task, max_steps).result()
+            except Exception as e:
+                result = {
+                    "agent": task.agent,
+                    "scenario": task.scenario,
+                    "seed": task.seed,
+                    "backend": task.backend,
+                    "status": "error",
+                    "error": f"{type(e).__name__}: {e}",
+                }
+            results.append(result)
+            latency = result.get("step_latency_ms", {})
+            print(
+                f"{task.scenario} {task.agent} ({result['backend']}): {result['status']}, "
+                f"p50 {latency.get('p50', float('nan')):.2f} ms, "
+                f"p99 {latency.get('p99', float('nan')):.2f} ms, "
+                f"{result.get('traci_calls_per_step', float('nan')):.1f} TraCI calls/step"
+            )
+    return results
+
+
+def compare_results(previous, current, tolerance=REGRESSION_TOLERANCE):
+    """
+    Lists runs whose p95 latency or throughput got worse by more than tolerance.
+
+    Parameters:
+    - previous: A benchmark JSON document to compare against.
+    - current: The new benchmark JSON document.
+    - tolerance: Relative change reported as a regression.
+
+    Returns:
+    - A list of human-readable regression descriptions.
+    """
+    # Runs are matched by scenario, agent and backend; results from before backends were recorded ran over TraCI
+    def key(run):
+        return run["scenario"], run["agent"], run.get("backend", "traci")
+
+    previous_runs = {key(run): run for run in previous["runs"] if run["status"] == "ok"}
+    regressions = []
+    for run in current["runs"]:
+        before = previous_runs.get(key(run))
+        if before is None or run["status"] != "ok":
+            continue
+        old_p95, new_p95 = before["step_latency_ms"]["p95"], run["step_latency_ms"]["p95"]
+        if new_p95 > old_p95 * (1 + tolerance):
+            regressions.append(
+                f"{run['scenario']} {run['agent']}: p95 step latency {old_p95:.2f} -> {new_p95:.2f} ms"
+            )
+        old_rate, new_rate = before["steps_per_second"], run["steps_per_second"]
+        if old_rate and new_rate and new_rate < old_rate * (1 - tolerance):
+            regressions.append(
+                f"{run['scenario']} {run['agent']}: {old_rate:.1f} -> {new_rate:.1f} steps/s"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-step latency of the agents headless.")
+    parser.add_argument("--scenarios", nargs="+", default=["twoLane"], choices=list(SCENARIOS))
+    parser.add_argument("--agents", nargs="+", default=list(AGENTS), choices=list(AGENTS))
+    parser.add_argument("--steps", type=int, default=BENCHMARK_STEPS, help="Simulation steps timed per agent")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=os.path.join("Benchmarks", "benchmark.json"), help="JSON results file")
+    parser.add_argument("--compare", default=None, help="Earlier JSON results to check for regressions")
+    parser.add_argument(
+        "--backend", default="auto", choices=["auto", "traci"], help="auto uses libsumo in-process when installed"
+    )
+    args = parser.parse_args(argv)
+
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    tasks = build_tasks(args.scenarios, args.agents, [args.seed], os.path.join(output_dir, "runs"), backend=args.backend)
+    runs = run_benchmarks(tasks, args.steps)
+
+    document = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "steps": args.steps,
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": runs,
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"Benchmark results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare_results(json.load(f), document)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import ast
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_dir)
+# Agents modules are only imported in the worker processes, after the run's traci backend is installed
+from Testers.batch_runner import AGENTS, SCENARIOS, RunTask, results_file, run_batch, run_task
+
+snapshot_dir_name = "snapshot"  # Created in the sweep output directory
+warm_up_dir_name = "warm_up"
+
+
+def warm_up(scenario, seed, checkpoint_step, output_dir, agent="V6", backend="auto", params=None):
+    """
+    Runs an agent up to a step once and snapshots the simulation and the agent there.
+
+    Parameters:
+    - scenario: Scenario name from SCENARIOS.
+    - seed: SUMO random seed.
+    - checkpoint_step: Step to snapshot at. The warm-up run stops there.
+    - output_dir: Sweep output directory; the snapshot goes to its snapshot/ directory.
+    - agent: Agent name from AGENTS. Must support checkpoint_step and resume_snapshot, like V6.
+    - backend: "auto" or "traci".
+    - params: Agent parameters for the warm-up, e.g. the baseline controller settings.
+
+    Returns:
+    - The snapshot directory.
+    """
+    snapshot_dir = os.path.abspath(os.path.join(output_dir, snapshot_dir_name))
+    task = RunTask(
+        scenario=scenario,
+        agent=agent,
+        seed=seed,
+        run_dir=os.path.abspath(os.path.join(output_dir, warm_up_dir_name)),
+        port=None,
+        end=None,
+        sumo_args=[],
+        backend=backend,
+        params=dict(
+            params or {}, checkpoint_step=checkpoint_step, checkpoint_dir=snapshot_dir, stop_at_checkpoint=True
+        ),
+    )
+    # A worker process of its own: the agents keep their state in module globals
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+        row = pool.submit(run_task, task).result()
+    if not os.path.isdir(snapshot_dir) or not os.listdir(snapshot_dir):
+        raise RuntimeError(f"Warm-up wrote no snapshot ({row['error'] or 'see warm_up/run.log'})")
+    return snapshot_dir
+
+
+def build_fork_tasks(snapshot_dir, scenario, seed, variants, output_dir, agent="V6", end=None, backend="auto"):
+    """
+    Creates one run task per parameter variant, each continuing from the same snapshot.
+
+    Parameters:
+    - snapshot_dir: Directory written by warm_up().
+    - scenario, seed, agent: The scenario, seed and agent the snapshot was taken with.
+    - variants: Dicts of agent parameters, one per fork.
+    - output_dir: Directory the per-fork directories are created in.
+    - end: Simulation time each fork ends at. Defaults to running until no vehicles are expected.
+    - backend: "auto" or "traci".
+
+    Returns:
+    - A list of RunTask.
+    """
+    return [
+        RunTask(
+            scenario=scenario,
+            agent=agent,
+            seed=seed,
+            run_dir=os.path.abspath(os.path.join(output_dir, f"variant_{index}")),
+            port=None,
+            end=end,
+            sumo_args=[],
+            backend=backend,
+            params=dict(variant, resume_snapshot=snapshot_dir),
+        )
+        for index, variant in enumerate(variants)
+    ]
+
+
+def run_sweep(
+    scenario, seed, checkpoint_step, variants, output_dir="Sweeps", agent="V6", end=None, workers=None, backend="auto"
+):
+    """
+    Warms up once and runs every parameter variant from the snapshot in a process pool.
+
+    The forks share the simulation up to checkpoint_step, so the sweep pays for the warm-up
+    once instead of once per variant. The tester metrics and SUMO's vehicle counts of each fork
+    include the warm-up; SUMO's trip statistics only cover trips that ended after the fork and
+    are prefixed with "post_fork.", e.g. post_fork.vehicleTripStatistics.duration.
+
+    Parameters:
+    - scenario: Scenario name from SCENARIOS.
+    - seed: SUMO random seed.
+    - checkpoint_step: Step the forks continue from.
+    - variants: Dicts of agent parameters, one per fork.
+    - output_dir: Directory the snapshot, the runs and the results table are written to.
+    - agent: Agent name from AGENTS.
+    - end: Simulation time each fork ends at. Defaults to running until no vehicles are expected.
+    - workers: Worker processes. Defaults to the number of cores.
+    - backend: "auto" or "traci".
+
+    Returns:
+    - A DataFrame with one row per variant.
+    """
+    snapshot_dir = warm_up(scenario, seed, checkpoint_step, output_dir, agent, backend)
+    tasks = build_fork_tasks(snapshot_dir, scenario, seed, variants, output_dir, agent, end, backend)
+    return run_batch(tasks, workers, output_dir)
+
+
+def parse_variants(grid):
+    """
+    Expands NAME=V1,V2,... arguments into the parameter grid.
+
+    Parameters:
+    - grid: Strings such as "MIN_GREEN=5,10". Values are Python literals, or strings otherwise.
+
+    Returns:
+    - A list of parameter dicts, one per combination.
+    """
+    names, value_lists = [], []
+    for argument in grid:
+        name, _, values = argument.partition("=")
+        if not values:
+            raise ValueError(f"Expected NAME=V1,V2,... but got {argument!r}")
+        parsed = []
+        for value in values.split(","):
+            try:
+                parsed.append(ast.literal_eval(value))
+            except (ValueError, SyntaxError):
+                parsed.append(value)
+        names.append(name)
+        value_lists.append(parsed)
+    return [dict(zip(names, values)) for values in itertools.product(*value_lists)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Warm up once, snapshot, and run controller parameter variants from the snapshot."
+    )
+    parser.add_argument("--scenario", default="twoLane", choices=list(SCENARIOS))
+    parser.add_argument("--agent", default="V6", choices=list(AGENTS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--checkpoint-step", type=int, required=True, help="Step the variants continue from")
+    parser.add_argument(
+        "--vary", nargs="+", required=True, metavar="NAME=V1,V2", help="Agent parameters to sweep, e.g. MIN_GREEN=5,10"
+    )
+    parser.add_argument("--end", type=float, default=None, help="Simulation time each fork ends at")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--output", default="Sweeps", help="Output directory")
+    parser.add_argument(
+        "--backend", default="auto", choices=["auto", "traci"], help="auto uses libsumo in-process when installed"
+    )
+    args = parser.parse_args(argv)
+
+    variants = parse_variants(args.vary)
+    results = run_sweep(
+        args.scenario,
+        args.seed,
+        args.checkpoint_step,
+        variants,
+        args.output,
+        args.agent,
+        args.end,
+        args.workers,
+        args.backend,
+    )
+    print(f"Results for {len(results)} variants written to {os.path.join(args.output, results_file)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import copy
+
+import traci
+import traci.constants as tc
+import pandas as pd
+from Agents.log_store import check_log_format, new_run_id, write_partition
+from Agents.sensors import TrafficSensors
+from Agents.topology import IntersectionTopology
+from Testers.trip_outputs import is_unfinished, read_last_summary_step, read_trips
+from Testers.vehicle_registry import DISAPPEARED, RUNNING, VehicleRegistry
+
+FLUSH_INTERVAL = 100  # Steps between report flushes; 0 writes reports only at shutdown
+
+# Variables the engine needs from SUMO every step, on top of the sensors' defaults
+SIMULATION_METRIC_VARIABLES = [
+    tc.VAR_TIME,
+    tc.VAR_DEPARTED_VEHICLES_IDS,
+    tc.VAR_ARRIVED_VEHICLES_IDS,
+    tc.VAR_TELEPORT_STARTING_VEHICLES_IDS,
+    tc.VAR_TELEPORT_ENDING_VEHICLES_IDS,
+]
+TLS_METRIC_VARIABLES = [tc.TL_CURRENT_PHASE, tc.TL_CURRENT_PROGRAM, tc.TL_PHASE_DURATION]
+VEHICLE_METRIC_VARIABLES = [tc.VAR_WAITING_TIME]
+
+CSV_COLUMNS = [
+    "id",
+    "traffic_demand",
+    "green_phase_duration",
+    "red_phase_duration",
+    "total_waiting_time",
+    "avg_travel_time",
+    "throughput",
+    "queue_length",
+]
+
+
+class MetricsEngine:
+    """
+    Collects traffic control performance metrics for one simulation.
+
+    All state lives on the instance, so several engines can run in one process. Phase,
+    program and waiting time readings come from TraCI subscriptions, and each traffic
+    light's program logic is fetched once and refreshed only when its program changes.
+    Per-vehicle trip data is kept in a VehicleRegistry, updated from the departed, arrived
+    and teleport lists SUMO sends each step.
+
+    With trip outputs, the vehicle metrics are instead read after the run from SUMO's
+    tripinfo and summary files, so no vehicle data crosses TraCI while the simulation runs.
+    Waiting time is then each trip's total time spent halted, as SUMO accounts it, rather
+    than the sum of every vehicle's current waiting time over all steps.
+
+    Parameters:
+    - title: Heading of the metrics log file.
+    - output_file: Path of the per-TLS CSV report.
+    - metrics_file: Path of the metrics log file.
+    - report_vehicle_status: Whether the log lists non-arrived and disappeared vehicles.
+    - verbose: Whether to print a confirmation after each flush.
+    - connection: The traci module or a labelled traci connection.
+    - log_format: "csv" rewrites output_file on every flush; "parquet" or "arrow" add one
+      snapshot partition per flush under <output name>/run=<run ID>/.
+    - run_id: The run the partitions belong to. Defaults to the time metrics are initialized.
+    """
+
+    def __init__(
+        self,
+        title,
+        output_file="Logs/performance_data.csv",
+        metrics_file="Logs/baseline_metrics.txt",
+        report_vehicle_status=True,
+        verbose=False,
+        connection=traci,
+        log_format="csv",
+        run_id=None,
+    ):
+        self.title = title
+        self.output_file = output_file
+        self.metrics_file = metrics_file
+        self.report_vehicle_status = report_vehicle_status
+        self.verbose = verbose
+        self.connection = connection
+        self.log_format = check_log_format(log_format)
+        self.run_id = run_id
+        self.flush_interval = FLUSH_INTERVAL
+        self.trip_outputs = None  # TripOutputs the vehicle metrics are read from after the run, if any
+        self.topology = None
+        self.sensors = None
+        self.tls_ids = []
+        self.reset()
+
+    def reset(self):
+        # Clears the collected metrics
+        self.vehicles = VehicleRegistry()  # Departure, arrival, waiting time and status per vehicle
+        self.queue_lengths = {}  # Queue lengths at traffic lights
+        self.green_phase_durations = {}  # Tracks green light durations for each traffic light
+        self.red_phase_durations = {}  # Tracks red light durations for each traffic light
+        self.program_logics = {}  # TLS ID -> (program ID, cached program logic)
+        self.total_waiting_time = 0  # Total waiting time for all vehicles
+        self.travel_time_sum = 0  # Running sum of travel times of arrived vehicles
+        self.travel_time_count = 0  # Number of arrived vehicles with a known travel time
+        self.throughput = 0  # Total number of vehicles that have arrived
+        self.num_cars_entered = 0  # Number of cars that entered the network
+        self.teleports = 0  # Teleports started, e.g. by vehicles stuck longer than SUMO's time-to-teleport
+        self.traffic_demand = "low"  # Demand level derived from the number of cars entered
+        self.steps_since_flush = 0  # Steps gathered since the reports were last written
+        self.steps_gathered = 0  # Steps gathered since the metrics were initialized
+
+    # Running totals that make up a run's metrics; the program logic cache is refetched instead
+    STATE_ATTRIBUTES = (
+        "vehicles",
+        "queue_lengths",
+        "green_phase_durations",
+        "red_phase_durations",
+        "total_waiting_time",
+        "travel_time_sum",
+        "travel_time_count",
+        "throughput",
+        "num_cars_entered",
+        "teleports",
+        "traffic_demand",
+        "steps_since_flush",
+        "steps_gathered",
+    )
+
+    def get_state(self):
+        # Returns a copy of the running totals, e.g. for a snapshot
+        return copy.deepcopy({name: getattr(self, name) for name in self.STATE_ATTRIBUTES})
+
+    def set_state(self, state):
+        # Continues from running totals returned by get_state(). Call after initialize_metrics()
+        for name in self.STATE_ATTRIBUTES:
+            setattr(self, name, copy.deepcopy(state[name]))
+
+    def initialize_metrics(
+        self, topology=None, interval=FLUSH_INTERVAL, sensors=None, log_format=None, run_id=None, trip_outputs=None
+    ):
+        """
+        Resets the metrics and registers the subscriptions they are read from. Call once after traci.start().
+
+        Parameters:
+        - topology: The IntersectionTopology already built by the agent, if any.
+        - interval: Steps between report flushes. 0 writes the reports only in flush_metrics().
+        - sensors: The agent's TrafficSensors, if any. Sharing them keeps one subscription per object.
+        - log_format: Overrides the engine's log format for this run.
+        - run_id: Overrides the run ID partitions are written under.
+        - trip_outputs: TripOutputs SUMO was started with, from trip_output_args(). Vehicles are
+          then not tracked per step, and the reports are written only by flush_metrics(), which
+          must run after SUMO has closed and finished writing the files.
+        """
+        try:
+            if log_format is not None:
+                self.log_format = check_log_format(log_format)
+            if run_id is not None:
+                self.run_id = run_id
+            elif self.run_id is None:
+                self.run_id = new_run_id()
+            # Retrieve traffic light IDs dynamically from the simulation
+            self.tls_ids = self.connection.trafficlight.getIDList()
+            # Reuse the agent's intersection layout, or build it once here
+            if topology is None:
+                topology = (
+                    sensors.topology
+                    if sensors is not None
+                    else IntersectionTopology.from_traci(self.tls_ids, self.connection)
+                )
+            self.topology = topology
+            self.trip_outputs = trip_outputs
+            # The trip outputs are complete only once SUMO closes, so there is nothing to flush before
+            self.flush_interval = interval if trip_outputs is None else 0
+            self.reset()
+
+            if sensors is None:
+                sensors = TrafficSensors(topology, connection=self.connection)
+                sensors.subscribe()
+            self.sensors = sensors
+            if trip_outputs is None:
+                sensors.add_subscription("simulation", "", SIMULATION_METRIC_VARIABLES)
+            for tls_id in self.tls_ids:
+                sensors.add_subscription("trafficlight", tls_id, TLS_METRIC_VARIABLES)
+            if trip_outputs is None:
+                sensors.track_vehicles(VEHICLE_METRIC_VARIABLES)
+        except Exception as e:
+            print(f"Error initializing metrics: {e}")
+
+    def invalidate_program_logics(self, tls_id=None):
+        """
+        Drops cached program logics. Call after setProgramLogic() replaces a program under the same ID.
+
+        Parameters:
+        - tls_id: The traffic light to refresh. Defaults to all traffic lights.
+        """
+        if tls_id is None:
+            self.program_logics.clear()
+        else:
+            self.program_logics.pop(tls_id, None)
+
+    def get_program_logic(self, tls_id, program_id):
+        # Returns the program logic the metrics read phase states from, fetching it when the program changed
+        cached = self.program_logics.get(tls_id)
+        if cached is None or cached[0] != program_id:
+            cached = (program_id, self.connection.trafficlight.getAllProgramLogics(tls_id)[0])
+            self.program_logics[tls_id] = cached
+        return cached[1]
+
+    def gather_performance_data(self):
+        """
+        Collects performance metrics for the current simulation step.
+        Running totals are updated every step; the CSV and log files are rewritten every
+        flush_interval steps and by flush_metrics() at shutdown.
+        """
+        try:
+            sensors = self.sensors
+
+            # Vehicle Metrics, unless they are read from the trip outputs after the run
+            if self.trip_outputs is None:
+                self.gather_vehicle_data()
+
+            # Track data for each traffic light system
+            for tls_id in self.tls_ids:
+                tls_results = sensors.tls_results[tls_id]
+                program_logic = self.get_program_logic(tls_id, tls_results[tc.TL_CURRENT_PROGRAM])
+                current_state = program_logic.phases[tls_results[tc.TL_CURRENT_PHASE]].state
+                phase_duration = tls_results[tc.TL_PHASE_DURATION]
+
+                # Track Green Phase Durations
+                if "G" in current_state:
+                    self.green_phase_durations[tls_id] = (
+                        self.green_phase_durations.get(tls_id, 0) + phase_duration
+                    )
+
+                # Track Red Phase Durations
+                if "r" in current_state:
+                    self.red_phase_durations[tls_id] = (
+                        self.red_phase_durations.get(tls_id, 0) + phase_duration
+                    )
+
+                # Track Queue Lengths, counting a lane once per signal it feeds
+                self.queue_lengths[tls_id] = max(
+                    self.queue_lengths.get(tls_id, 0),
+                    sum(
+                        sensors.get_halting_number(lane)
+                        for lane in self.topology.get_controlled_lanes(tls_id)
+                    ),
+                )
+
+            # Write the reports only every flush_interval steps
+            self.steps_gathered += 1
+            self.steps_since_flush += 1
+            if self.flush_interval and self.steps_since_flush >= self.flush_interval:
+                self.flush_metrics()
+
+        except Exception as e:
+            print(f"Error in performance testing: {e}")
+
+    def update_traffic_demand(self):
+        # Determine traffic demand dynamically from the number of cars entered
+        if self.num_cars_entered <= 300:
+            self.traffic_demand = "low"
+        elif self.num_cars_entered <= 600:
+            self.traffic_demand = "mid"
+        else:
+            self.traffic_demand = "high"
+
+    def gather_vehicle_data(self):
+        """
+        Updates the vehicle metrics from this step's departed, arrived and teleport lists and
+        the tracked vehicles' waiting times.
+        """
+        sensors = self.sensors
+        now = sensors.get_simulation_value(tc.VAR_TIME)
+        if now is None:
+            now = self.connection.simulation.getTime()
+        departed = sensors.get_simulation_value(tc.VAR_DEPARTED_VEHICLES_IDS, ())
+        arrived = sensors.get_simulation_value(tc.VAR_ARRIVED_VEHICLES_IDS, ())
+        teleport_starting = sensors.get_simulation_value(tc.VAR_TELEPORT_STARTING_VEHICLES_IDS, ())
+
+        # Count vehicles entered dynamically
+        self.num_cars_entered += len(departed)
+        self.update_traffic_demand()
+
+        vehicles = self.vehicles
+        vehicles.depart(departed, now)
+        self.throughput += len(arrived)  # Increment throughput for each vehicle that arrives
+        for travel_time in vehicles.arrive(arrived, now):
+            self.travel_time_sum += travel_time
+            self.travel_time_count += 1
+        self.teleports += len(teleport_starting)
+        vehicles.teleport(
+            teleport_starting, sensors.get_simulation_value(tc.VAR_TELEPORT_ENDING_VEHICLES_IDS, ())
+        )
+
+        # Teleporting vehicles stay in the network, and vehicles removed through TraCI are in
+        # no event list, so look for disappeared vehicles only when fewer are present than running
+        vehicle_results = sensors.vehicle_results
+        if len(vehicle_results) < vehicles.running:
+            vehicles.find_disappeared(vehicle_results)
+
+        vehicle_ids = []
+        waiting_times = []
+        for vehicle_id, results in vehicle_results.items():
+            waiting_time = results.get(tc.VAR_WAITING_TIME)
+            if waiting_time is None:
+                print(f"Warning: Failed to get waiting time for vehicle {vehicle_id}.")
+                continue
+            self.total_waiting_time += waiting_time
+            vehicle_ids.append(vehicle_id)
+            waiting_times.append(waiting_time)
+        vehicles.add_waiting_times(vehicle_ids, waiting_times)
+
+    def read_trip_outputs(self):
+        """
+        Rebuilds the vehicle metrics from the trip outputs. Call once SUMO has closed.
+
+        Arrived trips give the travel times and throughput, and trips SUMO ended early are
+        reported as not arrived if they were still running, or as disappeared otherwise.
+        The summary's last step gives the vehicles entered and the teleports.
+        """
+        vehicles = VehicleRegistry()
+        total_waiting_time = 0
+        travel_time_sum = 0
+        throughput = 0
+        for trip in read_trips(self.trip_outputs.tripinfo_file):
+            vehicles.depart([trip.vehicle_id], trip.depart)
+            vehicles.add_waiting_times([trip.vehicle_id], [trip.waiting_time])
+            total_waiting_time += trip.waiting_time
+            if is_unfinished(trip):
+                continue
+            if trip.vaporized:
+                vehicles.disappear([trip.vehicle_id])
+            else:
+                for travel_time in vehicles.arrive([trip.vehicle_id], trip.arrival):
+                    travel_time_sum += travel_time
+                    throughput += 1
+        totals = read_last_summary_step(self.trip_outputs.summary_file)
+
+        self.vehicles = vehicles
+        self.total_waiting_time = total_waiting_time
+        self.travel_time_sum = travel_time_sum
+        self.travel_time_count = throughput
+        self.throughput = throughput
+        self.num_cars_entered = int(totals.get("inserted", len(vehicles)))
+        self.teleports = int(totals.get("teleports", 0))
+        self.update_traffic_demand()
+
+    def summary(self):
+        """
+        Returns the run's headline metrics, e.g. for a batch results table.
+
+        Returns:
+        - Dict with the average travel time, total waiting time, throughput, vehicles entered,
+          non-arrived and disappeared vehicle counts, teleports, and the largest queue at any traffic light.
+        """
+        return {
+            "avg_travel_time": self.travel_time_sum / self.travel_time_count if self.travel_time_count else 0,
+            "total_waiting_time": self.total_waiting_time,
+            "throughput": self.throughput,
+            "vehicles_entered": self.num_cars_entered,
+            "non_arrived_vehicles": self.vehicles.count(RUNNING),
+            "disappeared_vehicles": self.vehicles.count(DISAPPEARED),
+            "teleports": self.teleports,
+            "max_queue_length": max(self.queue_lengths.values(), default=0),
+        }
+
+    def flush_metrics(self):
+        """
+        Writes the running metrics to the CSV and log files.
+        Call once at shutdown so the reports reflect the final simulation step.
+        """
+        if self.trip_outputs is not None:
+            try:
+                self.read_trip_outputs()
+            except Exception as e:
+                print(f"Error reading trip outputs: {e}")
+
+        first_step = self.steps_gathered - self.steps_since_flush + 1
+        self.steps_since_flush = 0
+
+        avg_travel_time = (
+            self.travel_time_sum / self.travel_time_count if self.travel_time_count else 0
+        )
+
+        # Write metrics to CSV file
+        data = []
+        for tls_id in self.tls_ids:
+            data.append(
+                [
+                    tls_id,
+                    self.traffic_demand,
+                    self.green_phase_durations.get(tls_id, 0),
+                    self.red_phase_durations.get(tls_id, 0),
+                    self.total_waiting_time,
+                    avg_travel_time,
+                    self.throughput,
+                    self.queue_lengths.get(tls_id, 0),
+                ]
+            )
+
+        # Save to CSV file, or as a typed snapshot partition
+        try:
+            df = pd.DataFrame(data, columns=CSV_COLUMNS)
+            if self.log_format == "csv":
+                df.to_csv(self.output_file, index=False)
+            else:
+                df = df.astype({"id": "category", "traffic_demand": "category"})
+                df.insert(0, "Step", self.steps_gathered)
+                write_partition(
+                    df, self.output_file, self.log_format, self.run_id, first_step, self.steps_gathered
+                )
+        except Exception as e:
+            print(f"Error writing {self.log_format} metrics: {e}")
+
+        # Write metrics log file
+        try:
+            with open(self.metrics_file, "w") as file:
+                file.write(f"{self.title}\n")
+                file.write("=" * 40 + "\n")
+                file.write(f"-Average Vehicle Travel Time: {avg_travel_time:.2f} seconds\n")
+                file.write(f"-Total Waiting Time: {self.total_waiting_time:.2f} seconds\n")
+                if self.report_vehicle_status:
+                    file.write(f"Vehicles that have entered the network: {self.num_cars_entered}\n")
+                    non_arrived_vehicles = set(self.vehicles.ids_with(RUNNING))
+                    disappeared_vehicles = set(self.vehicles.ids_with(DISAPPEARED))
+                    file.write(f"Vehicles that didn't arrive: {non_arrived_vehicles}\n")
+                    file.write(f"Count of Vehicles that didn't arrive: {len(non_arrived_vehicles)}\n")
+                    file.write(f"Vehicles that disappeared: {disappeared_vehicles}\n")
+                    file.write(f"Count of Vehicles that disappeared: {len(disappeared_vehicles)}\n")
+
+                file.write(f"-Queue Lengths at Traffic Lights:\n")
+                for tls_id, queue_length in self.queue_lengths.items():
+                    file.write(f" {tls_id}: {queue_length} vehicles\n")
+        except Exception as e:
+            print(f"Error writing metrics file: {e}")
+
+        if self.verbose:
+            print(f"Metrics successfully written to {self.output_file}")
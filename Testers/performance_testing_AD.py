@@ -1,180 +1,77 @@
-import traci
-import pandas as pd
-
-# Metrics for tracking simulation performance
-vehicle_travel_times = {}  # Tracks travel times for each vehicle
-vehicle_departure_times = {}  # Tracks departure times for each vehicle
-queue_lengths = {}  # Queue lengths at traffic lights
-green_phase_durations = {}  # Tracks green light durations for each traffic light
-red_phase_durations = {}  # Tracks red light durations for each traffic light
-disappeared_vehicles = set()  # Set to store IDs of vehicles that disappeared
-
-# Global variables
-output_file = "Logs/performance_data.csv"
-metrics_file = "Logs/baseline_metrics.txt"
-total_waiting_time = 0  # Total waiting time for all vehicles
-throughput = 0  # Total number of vehicles that have arrived
-num_cars_entered = 0  # Number of cars that entered the network
-tls_ids = []  # List of traffic light IDs
-non_arrived_vehicles = set()  # Set to store IDs of vehicles that didn't arrive
+from Testers.metrics_engine import FLUSH_INTERVAL, MetricsEngine
+
+# Metrics engine behind the adaptive agents' module-level entry points
+engine = MetricsEngine(
+    "Adaptive Traffic Control Metrics",
+    output_file="Logs/performance_data.csv",
+    metrics_file="Logs/baseline_metrics.txt",
+    report_vehicle_status=True,
+)
 
 
 # Initializes metrics before simulation begins
-def initialize_metrics():
+def initialize_metrics(
+    intersection_topology=None, interval=FLUSH_INTERVAL, sensors=None, log_format=None, run_id=None, trip_outputs=None
+):
     """
     Initializes traffic light IDs and metrics for the adaptive traffic control system.
+
+    Args:
+        intersection_topology (IntersectionTopology): Layout already built by the agent, if any.
+        interval (int): Steps between report flushes. 0 writes the reports only in flush_metrics().
+        sensors (TrafficSensors): The agent's sensor layer, if any, so subscriptions are shared.
+        log_format (str): "csv", "parquet" or "arrow". Defaults to the engine's current format.
+        run_id (str): Run ID the parquet / arrow partitions are written under.
+        trip_outputs (TripOutputs): SUMO tripinfo and summary files to read the vehicle metrics
+            from after the run instead of every step. flush_metrics() must then follow traci.close().
     """
-    global tls_ids, total_waiting_time, throughput, num_cars_entered
-    try:
-        # Retrieve traffic light IDs dynamically from the simulation
-        tls_ids = traci.trafficlight.getIDList()
-        # Reset metrics
-        total_waiting_time = 0
-        throughput = 0
-        num_cars_entered = 0
-        # print("Metrics initialized successfully.")
-    except Exception as e:
-        print(f"Error initializing metrics: {e}")
+    engine.initialize_metrics(intersection_topology, interval, sensors, log_format, run_id, trip_outputs)
 
 
 # Gathers and processes performance data during each simulation step
 def gather_performance_data():
     """
     Collects performance metrics dynamically based on adaptive traffic control inputs.
-    Also writes results to CSV and log files.
+    Running totals are updated every step; the CSV and log files are rewritten every
+    flush_interval steps and by flush_metrics() at shutdown.
+    """
+    engine.gather_performance_data()
+
+
+# Writes the current metrics to the CSV and log files
+def flush_metrics():
+    """
+    Writes the running metrics to the CSV and log files.
+    Call once at shutdown so the reports reflect the final simulation step.
+    """
+    engine.flush_metrics()
+
+
+# Drops cached program logics after a controller replaces a program
+def invalidate_program_logics(tls_id=None):
+    """
+    Refreshes the program logics the phase metrics are read from.
+
+    Args:
+        tls_id (str): Traffic light whose program was replaced. Defaults to all traffic lights.
+    """
+    engine.invalidate_program_logics(tls_id)
+
+
+# Returns the running metrics, e.g. for a snapshot
+def get_metrics_state():
+    """
+    Returns a copy of the running metrics totals.
+    """
+    return engine.get_state()
+
+
+# Continues the metrics from a snapshot
+def set_metrics_state(state):
+    """
+    Restores running metrics totals returned by get_metrics_state(). Call after initialize_metrics().
+
+    Args:
+        state (dict): The saved totals.
     """
-    global tls_ids, total_waiting_time, throughput, num_cars_entered, non_arrived_vehicles, disappeared_vehicles
-    try:
-        # Count vehicles entered dynamically
-        num_cars_entered += len(traci.simulation.getDepartedIDList())
-
-        # Determine traffic demand dynamically
-        if num_cars_entered <= 300:
-            traffic_demand = "low"
-        elif num_cars_entered <= 600:
-            traffic_demand = "mid"
-        else:
-            traffic_demand = "high"
-
-        # Track data for each traffic light system
-        for tls_id in tls_ids:
-            # Get the current phase index and state dynamically
-            current_phase_index = traci.trafficlight.getPhase(tls_id)
-            current_phase = traci.trafficlight.getAllProgramLogics(tls_id)[0].phases[ 
-                current_phase_index
-            ]
-
-            # Track Green Phase Durations
-            if "G" in current_phase.state:
-                if tls_id not in green_phase_durations:
-                    green_phase_durations[tls_id] = 0
-                green_phase_durations[tls_id] += traci.trafficlight.getPhaseDuration(
-                    tls_id
-                )
-
-            # Track Red Phase Durations
-            if "r" in current_phase.state:
-                if tls_id not in red_phase_durations:
-                    red_phase_durations[tls_id] = 0
-                red_phase_durations[tls_id] += traci.trafficlight.getPhaseDuration(
-                    tls_id
-                )
-
-            # Track Queue Lengths dynamically
-            if tls_id not in queue_lengths:
-                queue_lengths[tls_id] = 0
-            queue_lengths[tls_id] = max(
-                queue_lengths[tls_id],
-                sum(
-                    traci.lane.getLastStepHaltingNumber(lane)
-                    for lane in traci.trafficlight.getControlledLanes(tls_id)
-                ),
-            )
-
-        # Vehicle Metrics
-        for vehicle_id in traci.simulation.getDepartedIDList():
-            vehicle_departure_times[vehicle_id] = traci.simulation.getTime()
-            non_arrived_vehicles.add(vehicle_id)  # Add to non-arrived set
-
-        for vehicle_id in traci.simulation.getArrivedIDList():
-            throughput += 1  # Increment throughput for each vehicle that arrives
-            if vehicle_id in vehicle_departure_times:
-                travel_time = (
-                    traci.simulation.getTime() - vehicle_departure_times[vehicle_id]
-                )
-                vehicle_travel_times[vehicle_id] = travel_time
-            non_arrived_vehicles.discard(vehicle_id)  # Remove from non-arrived set
-
-        # Identify disappeared vehicles
-        current_vehicle_ids = set(traci.vehicle.getIDList())
-        disappeared_vehicles.update(non_arrived_vehicles - current_vehicle_ids)
-        non_arrived_vehicles.intersection_update(current_vehicle_ids)
-
-        for vehicle_id in traci.vehicle.getIDList():
-            try:
-                total_waiting_time += traci.vehicle.getWaitingTime(vehicle_id)
-            except traci.exceptions.TraCIException as e:
-                print(
-                    f"Warning: Failed to get waiting time for vehicle {vehicle_id}. {e}"
-                )
-
-        # Write metrics to CSV file dynamically
-        data = []
-        for tls_id in tls_ids:
-            avg_travel_time = (
-                sum(vehicle_travel_times.values()) / len(vehicle_travel_times)
-                if vehicle_travel_times
-                else 0
-            )
-            data.append(
-                [
-                    tls_id,
-                    traffic_demand,
-                    green_phase_durations.get(tls_id, 0),
-                    red_phase_durations.get(tls_id, 0),
-                    total_waiting_time,
-                    avg_travel_time,
-                    throughput,  # Ensure throughput is correctly included
-                    queue_lengths.get(tls_id, 0),
-                ]
-            )
-
-        # Save to CSV file
-        try:
-            df = pd.DataFrame(
-                data,
-                columns=[
-                    "id",
-                    "traffic_demand",
-                    "green_phase_duration",
-                    "red_phase_duration",
-                    "total_waiting_time",
-                    "avg_travel_time",
-                    "throughput",
-                    "queue_length",
-                ],
-            )
-            df.to_csv(output_file, index=False)
-        except Exception as e:
-            print(f"Error writing CSV file: {e}")
-
-        # Write metrics log file
-        with open(metrics_file, "w") as file:
-            file.write("Adaptive Traffic Control Metrics\n")
-            file.write("=" * 40 + "\n")
-            file.write(f"-Average Vehicle Travel Time: {avg_travel_time:.2f} seconds\n")
-            file.write(f"-Total Waiting Time: {total_waiting_time:.2f} seconds\n")
-            file.write(f"Vehicles that have entered the network: {num_cars_entered}\n")
-            file.write(f"Vehicles that didn't arrive: {non_arrived_vehicles}\n")
-            file.write(f"Count of Vehicles that didn't arrive: {len(non_arrived_vehicles)}\n")
-            file.write(f"Vehicles that disappeared: {disappeared_vehicles}\n")
-            file.write(f"Count of Vehicles that disappeared: {len(disappeared_vehicles)}\n")
-            
-            file.write(f"-Queue Lengths at Traffic Lights:\n")
-            for tls_id, queue_length in queue_lengths.items():
-                file.write(f" {tls_id}: {queue_length} vehicles\n")
-
-        # print(f"Metrics successfully written to {output_file}")
-
-    except Exception as e:
-        print(f"Error in performance testing: {e}")
+    engine.set_state(state)
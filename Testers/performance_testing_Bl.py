@@ -1,157 +1,45 @@
-import traci
-import pandas as pd
+from Testers.metrics_engine import FLUSH_INTERVAL, MetricsEngine
 
-# Metrics for tracking simulation performance
-vehicle_travel_times = {}  # Tracks travel times for each vehicle
-vehicle_departure_times = {}  # Tracks departure times for each vehicle
-queue_lengths = {}  # Queue lengths at traffic lights
-green_phase_durations = {}  # Tracks green light durations for each traffic light
-red_phase_durations = {}  # Tracks red light durations for each traffic light
+# Metrics engine behind the baseline agent's module-level entry points
+engine = MetricsEngine(
+    "Baseline Traffic Control Metrics",
+    output_file="Logs/performance_data.csv",
+    metrics_file="Logs/baseline_metrics.txt",
+    report_vehicle_status=False,
+    verbose=True,
+)
 
-# Global variables
-output_file = "Logs/performance_data.csv"
-metrics_file = "Logs/baseline_metrics.txt"
-total_waiting_time = 0  # Total waiting time for all vehicles
-throughput = 0  # Total number of vehicles that have arrived
-num_cars_entered = 0  # Number of cars that entered the network
-tls_ids = []  # List of traffic light IDs
 
 # Initializes metrics before simulation begins
-def initialize_metrics():
+def initialize_metrics(
+    intersection_topology=None, interval=FLUSH_INTERVAL, sensors=None, log_format=None, run_id=None
+):
     """
     Initializes traffic light IDs and metrics.
+
+    Args:
+        intersection_topology (IntersectionTopology): Layout already built by the agent, if any.
+        interval (int): Steps between report flushes. 0 writes the reports only in flush_metrics().
+        sensors (TrafficSensors): The agent's sensor layer, if any, so subscriptions are shared.
+        log_format (str): "csv", "parquet" or "arrow". Defaults to the engine's current format.
+        run_id (str): Run ID the parquet / arrow partitions are written under.
     """
-    global tls_ids, total_waiting_time, throughput, num_cars_entered
-    try:
-        # Retrieve traffic light IDs in the simulation
-        tls_ids = traci.trafficlight.getIDList()
-        # Initialize metrics
-        total_waiting_time = 0
-        throughput = 0
-        num_cars_entered = 0
-    except Exception as e:
-        print(f"Error initializing metrics: {e}")
+    engine.initialize_metrics(intersection_topology, interval, sensors, log_format, run_id)
 
 
 # Gathers and processes performance data during each simulation step
 def gather_performance_data():
     """
     Collects performance metrics such as phase durations, queue lengths, travel times, and waiting times.
-    Also determines traffic demand and writes results to CSV and log files.
+    Also determines traffic demand and writes results to CSV and log files every flush interval.
     """
-    global tls_ids, total_waiting_time, throughput, num_cars_entered
-    try:
-        # Count the number of cars entered dynamically
-        num_cars_entered += len(traci.simulation.getDepartedIDList())
-
-        # Determine traffic demand based on the number of cars entered
-        if num_cars_entered <= 300:
-            traffic_demand = "low"
-        elif num_cars_entered <= 600:
-            traffic_demand = "mid"
-        else:
-            traffic_demand = "high"
-
-        # Track data for each traffic light system
-        for tls_id in tls_ids:
-            # Get the current phase index and state
-            current_phase_index = traci.trafficlight.getPhase(tls_id)
-            current_phase = traci.trafficlight.getAllProgramLogics(tls_id)[0].phases[
-                current_phase_index
-            ]
-
-            # Green Phase Tracking
-            if "G" in current_phase.state:
-                if tls_id not in green_phase_durations:
-                    green_phase_durations[tls_id] = 0
-                green_phase_durations[tls_id] += traci.trafficlight.getPhaseDuration(tls_id)
-
-            # Red Phase Tracking
-            if "r" in current_phase.state:
-                if tls_id not in red_phase_durations:
-                    red_phase_durations[tls_id] = 0
-                red_phase_durations[tls_id] += traci.trafficlight.getPhaseDuration(tls_id)
-
-            # Queue Lengths
-            if tls_id not in queue_lengths:
-                queue_lengths[tls_id] = 0
-            queue_lengths[tls_id] = max(
-                queue_lengths[tls_id],
-                sum(
-                    traci.lane.getLastStepHaltingNumber(lane)
-                    for lane in traci.trafficlight.getControlledLanes(tls_id)
-                ),
-            )
-
-        # Vehicle Metrics
-        for vehicle_id in traci.simulation.getDepartedIDList():
-            vehicle_departure_times[vehicle_id] = traci.simulation.getTime()
+    engine.gather_performance_data()
 
-        for vehicle_id in traci.simulation.getArrivedIDList():
-            throughput += 1
-            if vehicle_id in vehicle_departure_times:
-                travel_time = (
-                    traci.simulation.getTime() - vehicle_departure_times[vehicle_id]
-                )
-                vehicle_travel_times[vehicle_id] = travel_time
 
-        for vehicle_id in traci.vehicle.getIDList():
-            try:
-                total_waiting_time += traci.vehicle.getWaitingTime(vehicle_id)
-            except traci.exceptions.TraCIException as e:
-                print(
-                    f"Warning: Failed to get waiting time for vehicle {vehicle_id}. {e}"
-                )
-
-        # Write metrics to CSV file
-        data = []
-        for tls_id in tls_ids:
-            avg_travel_time = (
-                sum(vehicle_travel_times.values()) / len(vehicle_travel_times)
-                if vehicle_travel_times
-                else 0
-            )
-            data.append([
-                tls_id,
-                traffic_demand,
-                green_phase_durations.get(tls_id, 0),
-                red_phase_durations.get(tls_id, 0),
-                total_waiting_time,
-                avg_travel_time,
-                throughput,
-                queue_lengths.get(tls_id, 0)
-            ])
-
-        # Save to CSV file
-        try:
-            df = pd.DataFrame(
-                data,
-                columns=[
-                    "id",
-                    "traffic_demand",
-                    "green_phase_duration",
-                    "red_phase_duration",
-                    "total_waiting_time",
-                    "avg_travel_time",
-                    "throughput",
-                    "queue_length",
-                ],
-            )
-            df.to_csv(output_file, index=False)
-        except Exception as e:
-            print(f"Error writing CSV file: {e}")
-
-        # Write metrics log file
-        with open(metrics_file, "w") as file:
-            file.write("Baseline Traffic Control Metrics\n")
-            file.write("=" * 40 + "\n")
-            file.write(f"-Average Vehicle Travel Time: {avg_travel_time:.2f} seconds\n")
-            file.write(f"-Total Waiting Time: {total_waiting_time:.2f} seconds\n")
-            file.write(f"-Queue Lengths at Traffic Lights:\n")
-            for tls_id, queue_length in queue_lengths.items():
-                file.write(f" {tls_id}: {queue_length} vehicles\n")
-
-        print(f"Metrics successfully written to {output_file}")
-
-    except Exception as e:
-        print(f"Error in performance testing: {e}")
+# Writes the current metrics to the CSV and log files
+def flush_metrics():
+    """
+    Writes the running metrics to the CSV and log files.
+    Call once at shutdown so the reports reflect the final simulation step.
+    """
+    engine.flush_metrics()
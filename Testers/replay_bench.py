@@ -0,0 +1,117 @@
+import argparse
+import os
+import sys
+import time
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_dir)
+import pandas as pd
+
+from Agents import V6adaptive_agent as V6
+from Agents.control_scheduler import ControlScheduler
+from Agents.decision_kernel import DecisionKernel
+from Agents.phase_plan import PhasePlan
+from Agents.replay import ReplayConnection
+from Agents.sensors import TrafficSensors
+from Agents.topology import IntersectionTopology
+
+ACTION_COLUMNS = ["Time", "Action", "TLS ID", "Value"]
+
+
+def replay_v6(trace_file, phases_file=V6.adaptive_phases_file, params=None):
+    """
+    Runs the V6 controller open loop over a recorded trace, without SUMO.
+
+    The sensors, decision kernel, scheduler and adjust_due_phases() are V6's own; only the
+    connection is a ReplayConnection. Phases follow the recording, so the decisions are
+    those V6 makes for the recorded observations.
+
+    Parameters:
+    - trace_file: A trace recorded with V6's trace_file option or a TraceRecorder.
+    - phases_file: The fixed phases JSON the kernel is built from.
+    - params: Overrides of V6's control parameters, e.g. {"MIN_GREEN": 10}.
+
+    Returns:
+    - actions: DataFrame of the actions V6 took, in order.
+    - steps: Replayed steps.
+    - seconds: Wall time of the replay loop.
+    """
+    params = dict(params or {})
+
+    def setting(name):
+        # Returns a V6 control parameter, overridden by params
+        return params.get(name, getattr(V6, name))
+
+    replay = ReplayConnection(trace_file)
+    replay.start()
+    tls_ids = replay.trafficlight.getIDList()
+    topology = IntersectionTopology.from_traci(tls_ids, replay)
+    phase_plan = PhasePlan.from_file(phases_file, topology)
+
+    sensors = TrafficSensors(topology, replay.edge.getIDList(), connection=replay)
+    sensors.subscribe()
+    decision_kernel = DecisionKernel(
+        tls_ids,
+        topology,
+        phase_plan,
+        setting("MIN_GREEN"),
+        setting("MAX_GREEN"),
+        setting("MIN_GREEN_ADDED"),
+        setting("MAX_GREEN_ADDED"),
+    )
+    scheduler = ControlScheduler(
+        decision_kernel.tls_ids,
+        sensors,
+        interval=setting("CONTROL_INTERVAL"),
+        lookahead=setting("CONTROL_LOOKAHEAD"),
+        connection=replay,
+    )
+    scheduler.subscribe()
+
+    steps = 0
+    started = time.perf_counter()
+    while replay.simulation.getMinExpectedNumber() > 0:
+        replay.simulationStep()
+        steps += 1
+        total_vehicles = replay.vehicle.getIDCount()
+        queue_lengths = decision_kernel.read_queues(sensors)
+        V6.adjust_due_phases(decision_kernel, scheduler, sensors, queue_lengths, total_vehicles, replay)
+        # Edge speeds are read as V6 logs them, so profiles include the sensing cost; they are not logged here
+        for edge_id in sensors.edge_ids:
+            V6.get_average_speed(edge_id, sensors)
+    seconds = time.perf_counter() - started
+
+    return pd.DataFrame(replay.actions, columns=ACTION_COLUMNS), steps, seconds
+
+
+def compare_actions(actions, expected_file):
+    # Returns the rows where a replay's actions differ from a saved action table
+    expected = pd.read_csv(expected_file, dtype={"TLS ID": str})
+    merged = actions.merge(expected, how="outer", on=["Time", "Action", "TLS ID"], suffixes=("", " expected"))
+    return merged[~(merged["Value"] == merged["Value expected"])]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded trace through the V6 controller without SUMO.")
+    parser.add_argument("trace", help="Trace recorded with V6's trace_file option")
+    parser.add_argument("--phases", default=V6.adaptive_phases_file, help="Fixed phases JSON")
+    parser.add_argument("--output", default=None, help="Write the actions to this CSV")
+    parser.add_argument("--expected", default=None, help="Action CSV of a previous replay to compare against")
+    args = parser.parse_args(argv)
+
+    actions, steps, seconds = replay_v6(args.trace, args.phases)
+    steps_per_second = steps / max(seconds, 1e-9)
+    print(f"Replayed {steps} steps in {seconds:.3f} s ({steps_per_second:.0f} steps/s), {len(actions)} actions")
+    if args.output is not None:
+        actions.to_csv(args.output, index=False)
+    if args.expected is not None:
+        differences = compare_actions(actions, args.expected)
+        if len(differences):
+            print(f"{len(differences)} actions differ from {args.expected}:")
+            print(differences.to_string(index=False))
+            sys.exit(1)
+        print(f"Actions match {args.expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+# SUMO output files a post-run metrics mode reads instead of polling vehicles every step
+TripOutputs = namedtuple("TripOutputs", ["tripinfo_file", "summary_file"])
+
+# One vehicle's trip as SUMO writes it to --tripinfo-output
+Trip = namedtuple(
+    "Trip",
+    [
+        "vehicle_id",
+        "depart",  # Time the vehicle was inserted
+        "arrival",  # Arrival time, or -1 if it was still running when the simulation ended
+        "waiting_time",  # Seconds spent at a speed below 0.1 m/s over the whole trip
+        "vaporized",  # Why SUMO ended the trip early, e.g. "end" or "traci" if removed through TraCI; else ""
+    ],
+)
+
+
+def is_unfinished(trip):
+    # Trips of vehicles still in the network at the end, including teleporting ones, have no arrival
+    return trip.arrival < 0
+
+
+def trip_output_files(output_dir="Logs", prefix=""):
+    """
+    Names the tripinfo and summary files of one run.
+
+    Parameters:
+    - output_dir: Directory the files are written to.
+    - prefix: Prepended to the file names, e.g. the run ID.
+
+    Returns:
+    - A TripOutputs.
+    """
+    return TripOutputs(
+        os.path.join(output_dir, f"{prefix}tripinfo.xml"), os.path.join(output_dir, f"{prefix}summary.xml")
+    )
+
+
+def trip_output_args(outputs):
+    """
+    Returns the SUMO options that write the trip outputs.
+
+    Unfinished trips are written too, so vehicles still running at the end and vehicles
+    removed through TraCI can be told apart from arrived ones.
+
+    Parameters:
+    - outputs: A TripOutputs.
+    """
+    return [
+        "--tripinfo-output",
+        outputs.tripinfo_file,
+        "--tripinfo-output.write-unfinished",
+        "true",
+        "--summary-output",
+        outputs.summary_file,
+    ]
+
+
+def read_trips(tripinfo_file):
+    """
+    Streams the trips of a --tripinfo-output file. SUMO writes the unfinished trips when it closes.
+
+    Parameters:
+    - tripinfo_file: Path of the tripinfo file.
+
+    Yields:
+    - One Trip per vehicle, in the order SUMO wrote them.
+    """
+    for _, element in ET.iterparse(tripinfo_file, events=("end",)):
+        if element.tag != "tripinfo":
+            continue
+        yield Trip(
+            element.get("id"),
+            float(element.get("depart")),
+            float(element.get("arrival")),
+            float(element.get("waitingTime", 0)),
+            element.get("vaporized", ""),
+        )
+        # Drop the parsed trip and its children so memory stays flat on long runs
+        element.clear()
+
+
+def read_last_summary_step(summary_file):
+    """
+    Streams a --summary-output file and returns its last step, which holds the run's totals.
+
+    Parameters:
+    - summary_file: Path of the summary file.
+
+    Returns:
+    - Dict of the last step's attributes as floats, e.g. "inserted", "arrived" and "teleports".
+      Empty if the file has no steps.
+    """
+    last_step = {}
+    for _, element in ET.iterparse(summary_file, events=("end",)):
+        if element.tag != "step":
+            continue
+        last_step = dict(element.attrib)
+        element.clear()
+
+    totals = {}
+    for name, value in last_step.items():
+        try:
+            totals[name] = float(value)
+        except ValueError:
+            pass
+    return totals
@@ -0,0 +1,171 @@
+import numpy as np
+
+# Vehicle status flags
+RUNNING = 1  # Departed and still in the network
+ARRIVED = 2  # Reached its destination
+DISAPPEARED = 4  # Left the network without arriving, e.g. removed through TraCI
+TELEPORTING = 8  # Between the start and the end of a teleport
+
+INITIAL_CAPACITY = 1024  # Vehicle slots allocated up front; the arrays double when full
+
+
+class VehicleRegistry:
+    """
+    Per-vehicle trip data of one run in parallel typed arrays, indexed by an integer slot.
+
+    Each vehicle ID is interned to a slot when it departs. Departure and arrival times,
+    accumulated waiting time and status flags live in NumPy arrays instead of dicts and
+    sets keyed by ID strings, and the number of running vehicles is kept as a counter,
+    so the engine can tell without a set difference whether any vehicle left the network.
+
+    Parameters:
+    - capacity: Initial number of slots.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.slots = {}  # Vehicle ID -> slot
+        self.ids = []  # Slot -> vehicle ID
+        self.running = 0  # Vehicles with the RUNNING flag
+        self.capacity = max(1, capacity)
+        self.departure_times = np.full(self.capacity, np.nan)
+        self.arrival_times = np.full(self.capacity, np.nan)
+        self.waiting_times = np.zeros(self.capacity)
+        self.status = np.zeros(self.capacity, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def reserve(self, count):
+        # Grows every array geometrically until count more vehicles fit
+        needed = len(self.ids) + count
+        if needed <= self.capacity:
+            return
+        while self.capacity < needed:
+            self.capacity *= 2
+        for name, fill in (("departure_times", np.nan), ("arrival_times", np.nan), ("waiting_times", 0)):
+            grown = np.full(self.capacity, fill)
+            grown[: len(self.ids)] = getattr(self, name)[: len(self.ids)]
+            setattr(self, name, grown)
+        status = np.zeros(self.capacity, dtype=np.uint8)
+        status[: len(self.ids)] = self.status[: len(self.ids)]
+        self.status = status
+
+    def depart(self, vehicle_ids, now):
+        """
+        Registers departed vehicles as running.
+
+        Parameters:
+        - vehicle_ids: IDs of the vehicles that departed this step.
+        - now: The simulation time.
+        """
+        self.reserve(len(vehicle_ids))
+        for vehicle_id in vehicle_ids:
+            slot = self.slots.get(vehicle_id)
+            if slot is None:
+                slot = len(self.ids)
+                self.slots[vehicle_id] = slot
+                self.ids.append(vehicle_id)
+            elif self.status[slot] & RUNNING:
+                self.running -= 1
+            # A reused ID starts a new trip
+            self.departure_times[slot] = now
+            self.arrival_times[slot] = np.nan
+            self.waiting_times[slot] = 0
+            self.status[slot] = RUNNING
+            self.running += 1
+
+    def arrive(self, vehicle_ids, now):
+        """
+        Marks arrived vehicles.
+
+        Parameters:
+        - vehicle_ids: IDs of the vehicles that arrived this step.
+        - now: The simulation time.
+
+        Returns:
+        - The travel times of the arrived vehicles whose departure was registered, in order.
+        """
+        travel_times = []
+        for vehicle_id in vehicle_ids:
+            slot = self.slots.get(vehicle_id)
+            if slot is None:
+                continue
+            status = int(self.status[slot])
+            if status & ARRIVED:
+                continue
+            travel_times.append(now - float(self.departure_times[slot]))
+            self.arrival_times[slot] = now
+            if status & RUNNING:
+                self.running -= 1
+            self.status[slot] = (status | ARRIVED) & ~(RUNNING | TELEPORTING)
+        return travel_times
+
+    def teleport(self, starting, ending):
+        """
+        Flags vehicles that started a teleport and clears the flag of those that ended one.
+
+        Parameters:
+        - starting: IDs of the vehicles whose teleport started this step.
+        - ending: IDs of the vehicles whose teleport ended this step.
+        """
+        for vehicle_id in starting:
+            slot = self.slots.get(vehicle_id)
+            if slot is not None:
+                self.status[slot] |= TELEPORTING
+        for vehicle_id in ending:
+            slot = self.slots.get(vehicle_id)
+            if slot is not None:
+                self.status[slot] &= ~TELEPORTING & 0xFF
+
+    def disappear(self, vehicle_ids):
+        """
+        Marks running vehicles that are known to have left the network without arriving.
+
+        Parameters:
+        - vehicle_ids: IDs of the vehicles, e.g. those SUMO reports as removed through TraCI.
+        """
+        for vehicle_id in vehicle_ids:
+            slot = self.slots.get(vehicle_id)
+            if slot is not None and self.status[slot] & RUNNING:
+                self.status[slot] = DISAPPEARED
+                self.running -= 1
+
+    def find_disappeared(self, present):
+        """
+        Marks running vehicles that are no longer in the network as disappeared.
+
+        Parameters:
+        - present: Container of the IDs of the vehicles in the network.
+
+        Returns:
+        - The number of vehicles that disappeared.
+        """
+        missing = [
+            slot for slot in np.flatnonzero(self.status[: len(self.ids)] & RUNNING) if self.ids[slot] not in present
+        ]
+        if missing:
+            self.status[missing] = DISAPPEARED
+            self.running -= len(missing)
+        return len(missing)
+
+    def add_waiting_times(self, vehicle_ids, waiting_times):
+        """
+        Adds this step's waiting times to the vehicles' accumulated waiting time.
+
+        Parameters:
+        - vehicle_ids: IDs of the vehicles read this step. Unregistered IDs are skipped.
+        - waiting_times: Their waiting times, in the same order.
+        """
+        slots = np.fromiter((self.slots.get(vehicle_id, -1) for vehicle_id in vehicle_ids), np.int64, len(vehicle_ids))
+        known = slots >= 0
+        self.waiting_times[slots[known]] += np.asarray(waiting_times, dtype=np.float64)[known]
+
+    def count(self, flag):
+        # Returns the number of vehicles with a status flag
+        if flag == RUNNING:
+            return self.running
+        return int(np.count_nonzero(self.status[: len(self.ids)] & flag))
+
+    def ids_with(self, flag):
+        # Returns the IDs of the vehicles with a status flag, in departure order
+        return [self.ids[slot] for slot in np.flatnonzero(self.status[: len(self.ids)] & flag)]